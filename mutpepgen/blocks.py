@@ -0,0 +1,133 @@
+"""Split text files into line- or record-aligned byte blocks and parse them in worker processes"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+import multiprocessing
+import os
+
+# Largest block handed to one worker at a time
+DEFAULT_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def record_start(fp: BinaryIO, offset: int, marker: Optional[bytes] = None) -> int:
+    """
+    Offset of the first line starting at or after ``offset``
+
+    Args:
+        fp: File opened in binary mode
+        offset: Byte offset
+        marker: Only count lines starting with these bytes (``b">"`` for FASTA records)
+
+    Returns:
+        Offset of that line, or the file size when there is none
+    """
+    if offset <= 0:
+        fp.seek(0)
+    else:
+        # Starting one byte early keeps a line that begins exactly at offset
+        fp.seek(offset - 1)
+        fp.readline()
+    while True:
+        position = fp.tell()
+        line = fp.readline()
+        if not line or marker is None or line.startswith(marker):
+            return position
+
+
+def block_range(fp: BinaryIO, number_of_blocks: int, block: int, start: int = 0,
+                marker: Optional[bytes] = None) -> Tuple[int, int]:
+    """
+    Byte range of one of ``number_of_blocks`` blocks of a file
+
+    The file from ``start`` is cut into equal parts and each cut moved to the
+    next line (or ``marker``) start, so consecutive blocks share their edge.
+
+    Returns:
+        (begin, end) offsets; empty when the block holds no line start
+    """
+    assert 0 <= block < number_of_blocks
+
+    fp.seek(0, 2)
+    size = fp.tell()
+    span = size - start
+    begin = start if block == 0 else record_start(fp, start + span * block // number_of_blocks, marker)
+    end = size if block == number_of_blocks - 1 else \
+        record_start(fp, start + span * (block + 1) // number_of_blocks, marker)
+    return begin, max(begin, end)
+
+
+def block_ranges(path: str, number_of_blocks: Optional[int] = None, start: int = 0,
+                 marker: Optional[bytes] = None, block_bytes: int = DEFAULT_BLOCK_BYTES) -> List[Tuple[int, int]]:
+    """
+    Non-empty byte ranges covering a file from ``start``, in file order
+
+    Args:
+        path: File to split
+        number_of_blocks: Number of blocks (default: enough to keep each under ``block_bytes``)
+        start: Offset of the first byte to cover, e.g. after a header line
+        marker: Align blocks on lines starting with these bytes
+        block_bytes: Target block size when ``number_of_blocks`` is not given
+    """
+    with open(path, 'rb') as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if number_of_blocks is None:
+            number_of_blocks = max(1, -(-(size - start) // block_bytes))
+        ranges = [block_range(fp, number_of_blocks, block, start, marker) for block in range(number_of_blocks)]
+    return [(begin, end) for begin, end in ranges if end > begin]
+
+
+def read_block(path: str, begin: int, end: int) -> bytes:
+    """Bytes ``begin`` to ``end`` of a file"""
+    with open(path, 'rb') as fp:
+        fp.seek(begin)
+        return fp.read(end - begin)
+
+
+def map_blocks(parse: Callable, path: str, processes: int, *args, start: int = 0,
+               marker: Optional[bytes] = None, block_bytes: int = DEFAULT_BLOCK_BYTES) -> Iterator:
+    """
+    Parse the blocks of a file in worker processes, yielding results in file order
+
+    Args:
+        parse: Top-level function called as ``parse(path, begin, end, *args)``
+        path: File to read
+        processes: Worker processes; 1 parses in this process
+        args: Extra arguments for ``parse`` (must pickle)
+        start: Offset of the first byte to parse
+        marker: Align blocks on lines starting with these bytes
+        block_bytes: Largest block parsed at once
+
+    Yields:
+        ``parse``'s result for each block
+    """
+    number_of_blocks = None
+    if processes > 1:
+        # At least one block per worker, even for files smaller than block_bytes
+        size = os.path.getsize(path) - start
+        number_of_blocks = max(processes, -(-size // block_bytes))
+    ranges = block_ranges(path, number_of_blocks, start, marker, block_bytes)
+
+    if processes <= 1 or len(ranges) <= 1:
+        for begin, end in ranges:
+            yield parse(path, begin, end, *args)
+        return
+
+    # "spawn" keeps workers from inheriting the GUI's Tk state through fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        pending = deque()
+        blocks = iter(ranges)
+        try:
+            while True:
+                while len(pending) < 2 * processes:
+                    block = next(blocks, None)
+                    if block is None:
+                        break
+                    pending.append(pool.submit(parse, path, block[0], block[1], *args))
+                if not pending:
+                    break
+                yield pending.popleft().result()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
@@ -0,0 +1,168 @@
+"""Mutant peptides from ``c.`` changes applied to transcript coding sequences"""
+from functools import lru_cache
+from typing import List, Mapping, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+
+from hgvs_parser import DELETION, DELINS, DUPLICATION, INSERTION, SUBSTITUTION, CdnaChange
+
+# Base -> 2-bit code (T, C, A, G); any other byte -> 4
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _base in enumerate(b"TCAG"):
+    _BASE_CODES[_base] = _code
+
+
+class CdsPeptide(NamedTuple):
+    """Mutant peptide derived from a ``c.`` change"""
+    peptide: str
+    position: int       # 0-based index of the first changed residue
+    original: str       # reference residue(s) replaced
+    mutant: str         # new residues (the whole novel tail for a frameshift)
+    frameshift: bool
+    offset: int = 0     # index of the first new residue in peptide
+
+
+@lru_cache(maxsize=None)
+def codon_table() -> np.ndarray:
+    """
+    Translation lookup for the standard genetic code
+
+    Returns:
+        uint8 array of 65 one-letter codes indexed by 16*b1 + 4*b2 + b3 with
+        T=0, C=1, A=2, G=3; index 64 (any non-ACGT base) translates to X
+    """
+    # Imported here so the protein-only workflow does not need Biopython
+    from Bio.Data import CodonTable
+
+    standard = CodonTable.unambiguous_dna_by_id[1]
+    table = np.full(65, ord("X"), dtype=np.uint8)
+    for i, b1 in enumerate("TCAG"):
+        for j, b2 in enumerate("TCAG"):
+            for k, b3 in enumerate("TCAG"):
+                codon = b1 + b2 + b3
+                residue = "*" if codon in standard.stop_codons else standard.forward_table[codon]
+                table[16 * i + 4 * j + k] = ord(residue)
+    return table
+
+
+def translate_batch(sequences: Sequence[str]) -> List[str]:
+    """
+    Translate in-frame nucleotide sequences, each up to (not including) its first stop
+
+    Trailing bases that do not fill a codon are ignored.
+    """
+    trimmed = [sequence[:len(sequence) - len(sequence) % 3] for sequence in sequences]
+    bases = np.frombuffer("".join(trimmed).upper().encode("ascii"), dtype=np.uint8)
+    if len(bases) == 0:
+        return ["" for _ in sequences]
+
+    codes = _BASE_CODES[bases].reshape(-1, 3).astype(np.uint16)
+    index = codes[:, 0] * 16 + codes[:, 1] * 4 + codes[:, 2]
+    index[(codes >= 4).any(axis=1)] = 64
+    residues = codon_table()[index].tobytes()
+
+    proteins = []
+    offset = 0
+    for sequence in trimmed:
+        codons = len(sequence) // 3
+        protein = residues[offset:offset + codons]
+        offset += codons
+        stop = protein.find(b"*")
+        proteins.append((protein if stop < 0 else protein[:stop]).decode("ascii"))
+    return proteins
+
+
+def apply_cdna_change(cds: str, change: CdnaChange) -> Tuple[str, int]:
+    """
+    Apply a ``c.`` change to a coding sequence
+
+    Returns:
+        Tuple of (mutant CDS, 0-based index of the first changed base)
+
+    Raises:
+        ValueError: The change lies outside the CDS or its reference bases do not match
+    """
+    start, end = change.start, change.end
+    if end >= len(cds):
+        raise ValueError(f"Position {end+1} is out of range for CDS length {len(cds)}")
+    if change.reference and cds[start:start + len(change.reference)].upper() != change.reference:
+        raise ValueError(f"Reference {change.reference} does not match CDS "
+                         f"{cds[start:start + len(change.reference)]} at position {start+1}")
+
+    if change.kind == SUBSTITUTION or change.kind == DELINS:
+        return cds[:start] + change.inserted + cds[end + 1:], start
+    if change.kind == DELETION:
+        return cds[:start] + cds[end + 1:], start
+    if change.kind == INSERTION:
+        return cds[:start + 1] + change.inserted + cds[start + 1:], start + 1
+    if change.kind == DUPLICATION:
+        return cds[:end + 1] + cds[start:end + 1] + cds[end + 1:], end + 1
+    raise ValueError(f"Unsupported cDNA change {change.kind}")
+
+
+def _common_prefix(a: str, b: str) -> int:
+    length = min(len(a), len(b))
+    i = 0
+    while i < length and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def cds_peptides(cds_db: Mapping[str, str], items: Sequence[Tuple[str, CdnaChange]],
+                 half_window: int) -> List[Union[CdsPeptide, str]]:
+    """
+    Build mutant peptides for a batch of ``c.`` changes
+
+    Args:
+        cds_db: Mapping of ENST IDs to coding sequences (start codon to stop codon)
+        items: (transcript ID, parsed change) pairs; every transcript must be in ``cds_db``
+        half_window: Residues of unchanged flank kept on each side
+
+    Returns:
+        One entry per item, in order: a CdsPeptide, or an error message
+    """
+    results: List[Union[CdsPeptide, str]] = [""] * len(items)
+    pending = []
+    segments: List[str] = []
+    for n, (transcript_id, change) in enumerate(items):
+        cds = cds_db[transcript_id]
+        try:
+            mutant, first_base = apply_cdna_change(cds, change)
+        except ValueError as e:
+            results[n] = str(e)
+            continue
+        codon = first_base // 3
+        left_start = max(0, codon - half_window)
+        # Left flank, reference tail and mutant tail, all translated together
+        segments.extend((cds[left_start * 3:codon * 3], cds[codon * 3:], mutant[codon * 3:]))
+        pending.append((n, codon, (len(mutant) - len(cds)) % 3 != 0))
+
+    proteins = translate_batch(segments)
+    for k, (n, codon, frameshift) in enumerate(pending):
+        left, reference, mutant = proteins[3 * k:3 * k + 3]
+        same = _common_prefix(reference, mutant)
+        if same == len(reference) == len(mutant):
+            results[n] = "cDNA change does not alter the protein"
+            continue
+        left = left + reference[:same]
+        left = left[max(0, len(left) - half_window):]
+
+        if frameshift:
+            novel = mutant[same:]
+            original = reference[same:same + 1]
+            peptide = left + novel
+        else:
+            # In-frame: the change ends where the two tails agree again
+            tail = _common_prefix(reference[same:][::-1], mutant[same:][::-1])
+            novel = mutant[same:len(mutant) - tail]
+            original = reference[same:len(reference) - tail]
+            peptide = left + novel + mutant[len(mutant) - tail:][:half_window]
+        if not novel and same == len(mutant):
+            # The mutant ends where the change starts, e.g. a stop gain
+            results[n] = "Stop gained: no mutant residues"
+            continue
+        if not peptide:
+            results[n] = "Mutant peptide is empty"
+            continue
+        results[n] = CdsPeptide(peptide, codon + same, original, novel, frameshift, len(left))
+    return results
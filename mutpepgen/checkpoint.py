@@ -0,0 +1,58 @@
+"""Run checkpoints for resuming interrupted peptide generation"""
+from typing import Dict, Optional
+import json
+import os
+
+CHECKPOINT_FILENAME = "run_checkpoint.json"
+
+# Seconds between two checkpoints while a run is going
+CHECKPOINT_INTERVAL = 10.0
+
+
+def checkpoint_path(output_dir: str) -> str:
+    return os.path.join(output_dir, CHECKPOINT_FILENAME)
+
+
+def load_checkpoint(output_dir: str) -> Optional[Dict[str, object]]:
+    """
+    Read the checkpoint of an unfinished run
+
+    Returns:
+        The checkpoint dictionary, or None if there is no readable checkpoint
+    """
+    try:
+        with open(checkpoint_path(output_dir), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(output_dir: str, state: Dict[str, object]) -> None:
+    """Write a checkpoint so that it is never seen half-written"""
+    path = checkpoint_path(output_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def remove_checkpoint(output_dir: str) -> None:
+    try:
+        os.remove(checkpoint_path(output_dir))
+    except FileNotFoundError:
+        pass
+
+
+def truncate_output(path: str, size: int) -> None:
+    """
+    Cut an output file back to the length recorded in a checkpoint
+
+    Raises:
+        ValueError: The file is shorter than the checkpoint says (it was replaced or damaged)
+    """
+    if os.path.getsize(path) < size:
+        raise ValueError(f"{path} is shorter than its checkpoint ({size} bytes)")
+    with open(path, 'r+b') as f:
+        f.truncate(size)
@@ -0,0 +1,422 @@
+"""
+Command-line batch entry point for MutPepGen
+
+Example::
+
+    python mutpepgen/cli.py samples/*.maf -d database/ensembl_sequences.fasta -w 15 -j 32
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Mapping, Optional
+import argparse
+import logging
+import os
+import sys
+
+from dedup import PROVENANCE_FILENAME, UNIQUE_FASTA_FILENAME, PeptideDeduplicator
+from engine import (
+    DEFAULT_REFERENCE_OFFSET,
+    SELF_FILTER_MODES,
+    MutationSource,
+    PeptideConfig,
+    PeptideGenerator,
+    detect_columns,
+    load_sequence_database,
+    read_mutation_table,
+)
+from genome import TranscriptIndex, detect_genomic_columns, iter_coding_changes, load_gtf
+from isoforms import GeneIndex, build_gene_index
+from metrics import METRICS_FILENAME, PROMETHEUS_FILENAME, MetricsRegistry, add_counters, input_counters, load_metrics
+from progress import JsonEventWriter
+from tiling import parse_tile_lengths
+from selfindex import DEFAULT_SELF_LENGTHS, SelfKmerIndex, open_self_index
+from readers import DEFAULT_STREAM_CHUNKSIZE, SUPPORTED_EXTENSIONS, iter_mutation_file, iter_variant_file, read_columns
+from seqdb import INDEX_EXTENSION, open_cached
+from vcf import is_vcf_path, iter_vcf_mutations, iter_vcf_variants, read_vcf_annotation
+from writers import PARQUET_RECORDS_FILENAME, RECORD_FORMATS, RECORDS_FILENAME, iter_records, pq
+
+logger = logging.getLogger("mutpepgen")
+
+DEFAULT_DATABASE = os.path.join(os.getcwd(), "database", "ensembl_sequences.fasta")
+DEFAULT_OUTPUT_DIR = os.path.join(os.getcwd(), "results")
+
+# Per-process sequence databases, loaded once by the pool initializer
+_worker_sequence_db: Optional[Mapping[str, str]] = None
+_worker_cds_db: Optional[Mapping[str, str]] = None
+_worker_transcript_index: Optional[TranscriptIndex] = None
+_worker_gene_index: Optional[GeneIndex] = None
+_worker_self_index: Optional[SelfKmerIndex] = None
+
+
+def _init_worker(database_path: str, log_level: int, use_cache: bool = True,
+                 cds_database_path: Optional[str] = None, gtf_path: Optional[str] = None,
+                 gene_index: Optional[GeneIndex] = None, self_index: Optional[SelfKmerIndex] = None) -> None:
+    """Load the sequence databases (and transcript model) once per worker process"""
+    global _worker_sequence_db, _worker_cds_db, _worker_transcript_index, _worker_gene_index, _worker_self_index
+    logging.basicConfig(format="%(asctime)s - %(processName)s - %(levelname)s - %(message)s")
+    logging.getLogger().setLevel(log_level)
+    _worker_sequence_db = load_sequence_database(database_path, use_cache=use_cache)
+    if cds_database_path:
+        _worker_cds_db = load_sequence_database(cds_database_path, use_cache=use_cache)
+    if gtf_path:
+        _worker_transcript_index = load_gtf(gtf_path)
+    _worker_gene_index = gene_index
+    _worker_self_index = self_index
+
+
+def _prepare_database(path: str, use_cache: bool, processes: int = 1) -> str:
+    """
+    Build or validate the FASTA cache once, before the workers start
+
+    Returns:
+        The ``.mpdb`` cache to load, or ``path`` itself when the cache is off or cannot be written
+
+    Raises:
+        ValueError: The FASTA cannot be read (e.g. a non-ASCII residue)
+    """
+    if not use_cache or os.path.splitext(path)[1].lower() == INDEX_EXTENSION:
+        return path
+    try:
+        cached = open_cached(path, processes=processes)
+    except OSError as e:
+        logger.warning(f"Could not use sequence cache for {path}, reading the FASTA instead: {str(e)}")
+        return path
+    except ValueError as e:
+        raise ValueError(f"Cannot read {path}: {str(e)}") from e
+    cached.close()
+    return cached.path
+
+
+def _table_mutations(input_path: str, enst_column: Optional[str], mutation_column: Optional[str],
+                     stream_chunksize: Optional[int], mapping_stats: Dict[str, int], log,
+                     read_processes: int = 1) -> MutationSource:
+    """Mutation source for a CSV/TSV/MAF file: its transcript/mutation columns, or its mapped genomic columns"""
+    df = None
+    if read_processes > 1:
+        # Block-parallel reading streams the file whatever --stream says
+        stream_chunksize = stream_chunksize or DEFAULT_STREAM_CHUNKSIZE
+    if stream_chunksize:
+        columns = read_columns(input_path)
+    else:
+        df = read_mutation_table(input_path)
+        columns = list(df.columns)
+
+    genomic_columns = list(detect_genomic_columns(columns).values())
+    if _worker_transcript_index is not None and None not in genomic_columns:
+        log(f"Mapping {', '.join(genomic_columns)} to coding changes with the GTF transcript model")
+        if stream_chunksize:
+            variants = iter_variant_file(input_path, genomic_columns, chunksize=stream_chunksize,
+                                         processes=read_processes)
+        else:
+            variants = [df[genomic_columns]]
+        return iter_coding_changes(variants, _worker_transcript_index, mapping_stats)
+
+    detected = detect_columns(columns)
+    enst_column = enst_column or detected["enst_id"]
+    mutation_column = mutation_column or detected["mutation"]
+    if enst_column not in columns or mutation_column not in columns:
+        raise ValueError(f"Could not find transcript/mutation columns in {os.path.basename(input_path)} "
+                         f"(got {enst_column!r} and {mutation_column!r})")
+
+    if stream_chunksize:
+        return iter_mutation_file(input_path, enst_column, mutation_column, chunksize=stream_chunksize,
+                                  processes=read_processes)
+    return df[[enst_column, mutation_column]]
+
+
+def _vcf_mutations(input_path: str, chunksize: int, coding: bool, pass_only: bool,
+                   mapping_stats: Dict[str, int], log) -> MutationSource:
+    """Mutation source for a VCF: its CSQ/ANN changes, or its alleles mapped with the GTF"""
+    layout = read_vcf_annotation(input_path)
+    if layout is not None:
+        log(f"Reading transcript changes from the {layout[0]} annotation")
+        return iter_vcf_mutations(input_path, chunksize=chunksize, coding=coding, pass_only=pass_only,
+                                  stats=mapping_stats)
+    if _worker_transcript_index is None:
+        raise ValueError(f"{os.path.basename(input_path)} has no CSQ/ANN annotation; "
+                         "map its variants with --gtf and --cds-database")
+    log("No CSQ/ANN annotation; mapping the VCF alleles with the GTF transcript model")
+    variants = iter_vcf_variants(input_path, chunksize=chunksize, pass_only=pass_only, stats=mapping_stats)
+    return iter_coding_changes(variants, _worker_transcript_index, mapping_stats)
+
+
+def process_file(input_path: str, output_dir: str, config: PeptideConfig,
+                 enst_column: Optional[str] = None, mutation_column: Optional[str] = None,
+                 stream_chunksize: Optional[int] = None, record_format: str = "jsonl",
+                 progress_path: Optional[str] = None, resume: bool = False,
+                 vcf_coding: bool = False, pass_only: bool = False, read_processes: int = 1) -> Dict[str, object]:
+    """
+    Generate peptides for a single mutation file
+
+    Args:
+        input_path: CSV, TSV, MAF or VCF mutation file
+        output_dir: Directory that receives this file's FASTA and summary
+        config: Peptide generation parameters
+        enst_column: Transcript ID column (auto-detected when None)
+        mutation_column: Mutation column (auto-detected when None)
+        stream_chunksize: Stream the file in chunks of this many rows instead of loading it
+        record_format: Peptide record sidecar format, ``jsonl`` or ``parquet``
+        progress_path: Append JSON progress events to this file (``-`` for stderr)
+        resume: Continue from the checkpoint left in output_dir by an interrupted run
+        vcf_coding: Take the ``c.`` rather than the ``p.`` change from VCF annotations
+        pass_only: Skip VCF records whose FILTER is not PASS
+        read_processes: Processes parsing blocks of a CSV/TSV/MAF file side by side
+
+    Returns:
+        The statistics dictionary for this file
+    """
+    name = os.path.basename(input_path)
+
+    def log(message, tag=None):
+        message = f"{name}: {message}"
+        if tag == "error":
+            logger.error(message)
+        elif tag == "warning":
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+    mapping_stats: Dict[str, int] = {}
+    if is_vcf_path(input_path):
+        mutations = _vcf_mutations(input_path, stream_chunksize or DEFAULT_STREAM_CHUNKSIZE,
+                                   vcf_coding, pass_only, mapping_stats, log)
+    else:
+        mutations = _table_mutations(input_path, enst_column, mutation_column, stream_chunksize,
+                                     mapping_stats, log, read_processes)
+
+    progress_file = None
+    progress_callback = None
+    if progress_path == "-":
+        progress_callback = JsonEventWriter(sys.stderr, file=name)
+    elif progress_path:
+        # Appends of single short lines do not interleave between worker processes
+        progress_file = open(progress_path, 'a', buffering=1)
+        progress_callback = JsonEventWriter(progress_file, file=name)
+
+    try:
+        generator = PeptideGenerator(_worker_sequence_db, config, log_callback=log,
+                                     progress_callback=progress_callback, cds_db=_worker_cds_db,
+                                     gene_index=_worker_gene_index, self_index=_worker_self_index)
+        results = generator.run(mutations, output_dir, record_format=record_format,
+                                resume=resume, source=os.path.abspath(input_path))
+    finally:
+        if progress_file is not None:
+            progress_file.close()
+    if mapping_stats:
+        # The readers count the whole file, including rows skipped on resume
+        add_counters(output_dir, input_counters(mapping_stats))
+    if "variants" in mapping_stats:
+        log(f"{mapping_stats['variants']} variants, {mapping_stats['coding_variants']} in a CDS, "
+            f"{mapping_stats['not_in_cds']} outside every CDS")
+    return results["stats"]
+
+
+def output_dir_for(input_path: str, output_root: str) -> str:
+    """Results directory for one input file: <output_root>/<file name without extension>"""
+    name = os.path.basename(input_path)
+    stem = name[:name.lower().rindex(".vcf")] if is_vcf_path(name) else os.path.splitext(name)[0]
+    return os.path.join(output_root, stem)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="mutpepgen",
+        description="Generate mutation-centred peptides from CSV/TSV/MAF mutation files."
+    )
+    parser.add_argument("inputs", nargs="+", help="Mutation files (.csv, .tsv, .maf, .vcf or .vcf.gz)")
+    parser.add_argument("-d", "--database", default=DEFAULT_DATABASE,
+                        help="FASTA file or .mpdb index of ENST protein sequences (default: %(default)s)")
+    parser.add_argument("--cds-database",
+                        help="FASTA file or .mpdb index of ENST coding sequences; enables c. mutations "
+                             "and full frameshift tails")
+    parser.add_argument("--gtf",
+                        help="GTF transcript model (plain or .gz, same assembly as the inputs); maps "
+                             "Chromosome/Position/Ref/Alt columns to c. changes, needs --cds-database")
+    parser.add_argument("-o", "--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help="Directory for results; one sub-directory per input (default: %(default)s)")
+    parser.add_argument("-w", "--window", type=int, default=25,
+                        help="Peptide window size in amino acids (default: %(default)s)")
+    parser.add_argument("--header-style", choices=["full", "short"], default="full",
+                        help="'full' adds position and window to FASTA headers, 'short' uses ID_mutation_mutant")
+    parser.add_argument("--tile-lengths", type=parse_tile_lengths, metavar="LENGTHS",
+                        help="Also write every k-mer of these lengths containing the mutation to "
+                             "mutation_tiles.fasta, e.g. 8-11 or 8,9,10,15")
+    parser.add_argument("--tile-wildtype", action="store_true",
+                        help="Pair each tile with its wild-type k-mer when the change keeps the length")
+    parser.add_argument("--self-filter", choices=SELF_FILTER_MODES,
+                        help="Look mutant k-mers up in the self proteome (the sequence database): 'flag' "
+                             "counts them in headers and records, 'drop' also removes peptides that are entirely self")
+    parser.add_argument("--self-lengths", type=parse_tile_lengths, default=DEFAULT_SELF_LENGTHS, metavar="LENGTHS",
+                        help="k-mer lengths of the self-proteome index, at most 12 (default: 8-11)")
+    parser.add_argument("--no-reference-check", action="store_true",
+                        help="Apply p. changes without checking that the reference residue is at the position")
+    parser.add_argument("--reference-offset", type=int, default=DEFAULT_REFERENCE_OFFSET,
+                        help="Residues either side searched when the reference does not match (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse the FASTA directly instead of using the binary cache next to it")
+    parser.add_argument("--records-format", choices=RECORD_FORMATS, default="jsonl",
+                        help="Format of the per-peptide record file; parquet needs pyarrow (default: %(default)s)")
+    parser.add_argument("--enst-column", help="Transcript ID column (auto-detected by default)")
+    parser.add_argument("--mutation-column", help="Mutation column (auto-detected by default)")
+    parser.add_argument("--vcf-change", choices=["protein", "coding"], default="protein",
+                        help="VCF annotation field to use: HGVSp, or HGVSc for --cds-database (default: %(default)s)")
+    parser.add_argument("--pass-only", action="store_true", help="Skip VCF records whose FILTER is not PASS")
+    parser.add_argument("--dedup", action="store_true",
+                        help=f"Also write every distinct peptide of all inputs once to {UNIQUE_FASTA_FILENAME}, "
+                             f"with its samples, transcripts and mutations in {PROVENANCE_FILENAME}")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream each file in chunks, reading only the two mapped columns")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_STREAM_CHUNKSIZE,
+                        help="Rows per chunk in --stream mode (default: %(default)s)")
+    parser.add_argument("--read-processes", type=int, default=1, metavar="N",
+                        help="Parse CSV/TSV/MAF inputs and the database FASTA in N processes, block by block "
+                             "(default: %(default)s)")
+    parser.add_argument("--progress-events", metavar="PATH",
+                        help="Write JSON progress events (rows/s, ETA, stage timings) to PATH, or '-' for stderr")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue interrupted runs from the checkpoint in each results directory")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of files processed concurrently (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log per-mutation progress")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command-line interface and return a process exit code"""
+    args = build_parser().parse_args(argv)
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    logging.basicConfig(level=log_level, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    inputs = []
+    output_dirs = set()
+    for path in args.inputs:
+        if os.path.splitext(path)[1].lower() not in SUPPORTED_EXTENSIONS and not is_vcf_path(path):
+            logger.error(f"Skipping {path}: not a CSV, TSV, MAF or VCF file")
+        elif not os.path.exists(path):
+            logger.error(f"Skipping {path}: file not found")
+        elif output_dir_for(path, args.output_dir) in output_dirs:
+            logger.error(f"Skipping {path}: another input already writes to {output_dir_for(path, args.output_dir)}")
+        else:
+            inputs.append(path)
+            output_dirs.add(output_dir_for(path, args.output_dir))
+    if not inputs:
+        logger.error("No valid input files")
+        return 2
+
+    if not os.path.exists(args.database):
+        logger.error(f"Sequence database not found: {args.database}")
+        return 2
+
+    if args.cds_database and not os.path.exists(args.cds_database):
+        logger.error(f"CDS database not found: {args.cds_database}")
+        return 2
+
+    if args.gtf and not args.cds_database:
+        logger.error("--gtf needs --cds-database to translate the mapped coding changes")
+        return 2
+
+    if args.gtf and not os.path.exists(args.gtf):
+        logger.error(f"GTF file not found: {args.gtf}")
+        return 2
+
+    metrics = MetricsRegistry()
+    with metrics.timer("load_database"):
+        try:
+            database = _prepare_database(args.database, not args.no_cache, args.read_processes)
+            cds_database = _prepare_database(args.cds_database, not args.no_cache, args.read_processes) \
+                if args.cds_database else None
+        except ValueError as e:
+            logger.error(str(e))
+            return 2
+
+    gene_index = None
+    if not args.no_reference_check:
+        try:
+            # The sequence cache stores the genes of the FASTA headers, so this only reads the FASTA without it
+            gene_index = build_gene_index(database)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No isoform fallback: {str(e)}")
+
+    self_index = None
+    if args.self_filter:
+        try:
+            # Kept next to (and checked against) the database as given, like the sequence cache
+            self_index = open_self_index(args.database, load_sequence_database(database, use_cache=False),
+                                         args.self_lengths)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot build the self-proteome k-mer index: {str(e)}")
+            return 2
+        logger.info(f"Self-proteome index {self_index.path}: "
+                    + ", ".join(f"{count} {k}-mers" for k, count in self_index.counts().items()))
+
+    if args.records_format == "parquet" and pq is None:
+        logger.error("--records-format parquet requires the 'pyarrow' package")
+        return 2
+
+    if args.progress_events and args.progress_events != "-":
+        # Workers append to it, so start each run from an empty file
+        open(args.progress_events, 'w').close()
+
+    config = PeptideConfig(window_size=args.window, include_sequence_info=args.header_style == "full",
+                           check_reference=not args.no_reference_check, reference_offset=args.reference_offset,
+                           tile_lengths=args.tile_lengths, tile_wildtype=args.tile_wildtype,
+                           self_filter=args.self_filter)
+    jobs = max(1, min(args.jobs, len(inputs)))
+    logger.info(f"Processing {len(inputs)} files with {jobs} workers")
+
+    failures = 0
+    succeeded = []
+    # The databases are already their caches where those could be built, so no worker retries a failed build
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(database, log_level, False, cds_database, args.gtf, gene_index,
+                                       self_index)) as pool:
+        futures = {
+            pool.submit(process_file, path, output_dir_for(path, args.output_dir), config,
+                        args.enst_column, args.mutation_column,
+                        args.chunk_size if args.stream else None, args.records_format,
+                        args.progress_events, args.resume, args.vcf_change == "coding",
+                        args.pass_only, args.read_processes): path
+            for path in inputs
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                failures += 1
+                logger.error(f"{os.path.basename(path)}: {str(e)}")
+                continue
+            succeeded.append(path)
+            logger.info(f"{os.path.basename(path)}: {stats['successful_peptides']} peptides from "
+                        f"{stats['total_mutations']} mutations ({stats['failed_peptides']} failed)")
+
+    if args.dedup and succeeded:
+        records_name = PARQUET_RECORDS_FILENAME if args.records_format == "parquet" else RECORDS_FILENAME
+        # Input order, so peptide IDs do not depend on which worker finished first
+        succeeded.sort(key=inputs.index)
+        with PeptideDeduplicator(work_dir=args.output_dir) as dedup:
+            for path in succeeded:
+                output_dir = output_dir_for(path, args.output_dir)
+                dedup.add_records(iter_records(os.path.join(output_dir, records_name)), os.path.basename(output_dir))
+            counts = dedup.write(args.output_dir)
+        metrics.increment("DEDUP_ROW_counter", counts["rows"])
+        metrics.increment("DEDUP_UNIQUE_counter", counts["unique_peptides"])
+        logger.info(f"{counts['unique_peptides']} unique peptides from {counts['rows']} peptide records "
+                    f"written to {os.path.join(args.output_dir, UNIQUE_FASTA_FILENAME)}")
+
+    # Per-file metrics in input order, plus the files that failed
+    for path in sorted(succeeded, key=inputs.index):
+        file_metrics = load_metrics(output_dir_for(path, args.output_dir))
+        if file_metrics is not None:
+            metrics.merge(file_metrics)
+    metrics.increment("FILE_ERROR_counter", failures)
+    os.makedirs(args.output_dir, exist_ok=True)
+    metrics.write(args.output_dir)
+    logger.info(f"Run metrics written to {os.path.join(args.output_dir, METRICS_FILENAME)} "
+                f"and {PROMETHEUS_FILENAME}")
+
+    logger.info(f"Done: {len(inputs) - failures}/{len(inputs)} files succeeded, results in {args.output_dir}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
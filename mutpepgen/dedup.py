@@ -0,0 +1,167 @@
+"""Collapse identical peptides across samples, keeping the rows that produced each"""
+from array import array
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+import os
+import shutil
+import tempfile
+import zlib
+
+UNIQUE_FASTA_FILENAME = "unique_peptides.fasta"
+PROVENANCE_FILENAME = "unique_peptides_provenance.tsv"
+
+# Unique peptides held in memory before the table is spilled to disk
+DEFAULT_MAX_PEPTIDES = 2000000
+
+# Spill files; each is deduplicated in memory on its own
+DEFAULT_PARTITIONS = 64
+
+# (sample, transcript ID, mutation)
+Provenance = Tuple[str, str, str]
+
+
+class _PeptideTable:
+    """
+    Unique peptides with their provenance as linked lists in flat arrays
+
+    Each provenance entry stores its sample, transcript and mutation codes
+    and the index of the peptide's previous entry (-1 ends the list).
+    Strings are interned as their insertion order in a dictionary.
+    """
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}     # peptide -> index of its latest entry
+        self.samples: Dict[str, int] = {}
+        self.transcripts: Dict[str, int] = {}
+        self.mutations: Dict[str, int] = {}
+        self._sample = array('i')
+        self._transcript = array('i')
+        self._mutation = array('i')
+        self._previous = array('q')
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, peptide: str, sample: str, transcript_id: str, mutation: str) -> None:
+        entry = len(self._previous)
+        self._sample.append(self.samples.setdefault(sample, len(self.samples)))
+        self._transcript.append(self.transcripts.setdefault(transcript_id, len(self.transcripts)))
+        self._mutation.append(self.mutations.setdefault(mutation, len(self.mutations)))
+        self._previous.append(self.index.get(peptide, -1))
+        self.index[peptide] = entry
+
+    def items(self) -> Iterator[Tuple[str, List[Provenance]]]:
+        """Unique peptides with the rows that produced them, in the order they were added"""
+        samples, transcripts, mutations = list(self.samples), list(self.transcripts), list(self.mutations)
+        for peptide, entry in self.index.items():
+            rows = []
+            while entry >= 0:
+                rows.append((samples[self._sample[entry]], transcripts[self._transcript[entry]],
+                             mutations[self._mutation[entry]]))
+                entry = self._previous[entry]
+            rows.reverse()
+            yield peptide, rows
+
+
+class PeptideDeduplicator:
+    """Collect peptides from any number of samples and emit each sequence once"""
+
+    def __init__(self, max_peptides: int = DEFAULT_MAX_PEPTIDES, partitions: int = DEFAULT_PARTITIONS,
+                 work_dir: Optional[str] = None):
+        """
+        Args:
+            max_peptides: Unique peptides kept in memory before spilling to disk
+            partitions: Number of spill files
+            work_dir: Directory for the spill files (default: the system temporary directory)
+        """
+        self.max_peptides = max_peptides
+        self.partitions = partitions
+        self.work_dir = work_dir
+        self.rows = 0
+        self._table = _PeptideTable()
+        self._spill_dir: Optional[str] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill_dir is not None
+
+    def add(self, peptide: str, sample: str, transcript_id: str, mutation: str) -> None:
+        """Record one peptide and the row that produced it"""
+        self._table.add(peptide, sample, transcript_id, mutation)
+        self.rows += 1
+        if len(self._table) > self.max_peptides:
+            self._spill()
+
+    def add_records(self, records: Iterable[Mapping[str, object]], sample: str) -> None:
+        """Add peptide record dictionaries (as read by ``writers.iter_records``) from one sample"""
+        for record in records:
+            self.add(record["peptide"], sample, record["transcript_id"], record["mutation"])
+
+    def _spill(self) -> None:
+        """Append the in-memory table to the partition files and clear it"""
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="mutpepgen-dedup-", dir=self.work_dir)
+        outputs = [open(self._partition_path(i), 'a') for i in range(self.partitions)]
+        try:
+            for peptide, provenance in self._table.items():
+                out = outputs[zlib.crc32(peptide.encode("ascii")) % self.partitions]
+                for sample, transcript_id, mutation in provenance:
+                    out.write(f"{peptide}\t{sample}\t{transcript_id}\t{mutation}\n")
+        finally:
+            for out in outputs:
+                out.close()
+        self._table = _PeptideTable()
+
+    def _partition_path(self, partition: int) -> str:
+        return os.path.join(self._spill_dir, f"partition_{partition:04d}.tsv")
+
+    def __iter__(self) -> Iterator[Tuple[str, List[Provenance]]]:
+        """Unique peptides with their provenance lists"""
+        if self._spill_dir is None:
+            yield from self._table.items()
+            return
+
+        if len(self._table):
+            self._spill()
+        for partition in range(self.partitions):
+            table = _PeptideTable()
+            with open(self._partition_path(partition), 'r') as f:
+                for line in f:
+                    table.add(*line.rstrip("\n").split("\t"))
+            yield from table.items()
+
+    def write(self, output_dir: str, prefix: str = "pep") -> Dict[str, int]:
+        """
+        Write the unique peptides to ``unique_peptides.fasta`` and their provenance to a TSV
+
+        FASTA headers are ``>pep1 occurrences:N samples:M``; the TSV has one
+        line per peptide with its ``sample|transcript|mutation`` rows joined by ``;``.
+
+        Returns:
+            Counts of input rows and unique peptides
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        unique = 0
+        with open(os.path.join(output_dir, UNIQUE_FASTA_FILENAME), 'w') as fasta_out, \
+                open(os.path.join(output_dir, PROVENANCE_FILENAME), 'w') as provenance_out:
+            provenance_out.write("peptide_id\tpeptide\toccurrences\tsamples\tprovenance\n")
+            for peptide, provenance in self:
+                unique += 1
+                peptide_id = f"{prefix}{unique}"
+                samples = len({sample for sample, _, _ in provenance})
+                fasta_out.write(f">{peptide_id} occurrences:{len(provenance)} samples:{samples}\n{peptide}\n")
+                provenance_out.write(f"{peptide_id}\t{peptide}\t{len(provenance)}\t{samples}\t"
+                                     f"{';'.join('|'.join(row) for row in provenance)}\n")
+        return {"rows": self.rows, "unique_peptides": unique}
+
+    def close(self) -> None:
+        """Remove the spill files"""
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._table = _PeptideTable()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,1211 @@
+"""Headless peptide-generation engine for MutPepGen"""
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cds import CdsPeptide, cds_peptides
+from checkpoint import CHECKPOINT_INTERVAL, load_checkpoint, remove_checkpoint, save_checkpoint, truncate_output
+from hgvs_parser import (
+    DELINS,
+    DUPLICATION,
+    FRAMESHIFT,
+    INSERTION,
+    NONSENSE,
+    STOP,
+    SYNONYMOUS,
+    ProteinChange,
+    parse_cdna_change,
+    parse_protein_change,
+)
+from isoforms import GeneIndex
+from metrics import METRICS_FILENAME, PROMETHEUS_FILENAME, MetricsRegistry
+from progress import ProgressCallback, ProgressTracker
+from tiling import TILES_FILENAME, mutant_span, tile_record, tiles_to_fasta
+from readers import read_options
+from selfindex import SelfKmerIndex, self_kmer_counts
+from seqdb import INDEX_EXTENSION, IndexedSequenceDB, header_aliases, iter_fasta_records, open_cached
+from writers import RECORDS_FILENAME, open_record_writer
+
+logger = logging.getLogger(__name__)
+
+# (message, tag) - the same signature as MutationPeptideApp.log_message
+LogCallback = Callable[[str, Optional[str]], None]
+
+# Iterable of (transcript ID, mutation) pairs, a DataFrame with those two
+# columns, or an iterable of such DataFrames (see readers.iter_mutation_file)
+MutationSource = Union[Iterable[Tuple[object, object]], pd.DataFrame, Iterable[pd.DataFrame]]
+
+# How often (in rows) a progress line is logged
+PROGRESS_INTERVAL = 100
+
+# Rows per work unit when generating peptides in a process pool
+DEFAULT_CHUNK_SIZE = 5000
+
+# Rows vectorised at once by generate; also how often it checks for cancel and checkpoints
+DEFAULT_BATCH_ROWS = 5000
+
+# Residues either side of the stated position searched when the reference does not match
+DEFAULT_REFERENCE_OFFSET = 5
+
+# What to do with peptides whose mutant k-mers all occur in the self proteome
+SELF_FILTER_MODES = ("flag", "drop")
+
+FASTA_FILENAME = "mutation_peptides.fasta"
+SUMMARY_FILENAME = "analysis_summary.json"
+
+
+class TranscriptNotFoundError(KeyError):
+    """Raised when a transcript ID is not present in the sequence database"""
+
+
+class UnrecognizedMutationError(ValueError):
+    """Raised when a mutation string is not in a supported notation"""
+
+
+class RunCancelled(Exception):
+    """Raised by ``PeptideGenerator.run`` when its cancel event is set"""
+
+    def __init__(self, rows: int):
+        super().__init__(f"Run cancelled after {rows} rows")
+        self.rows = rows
+
+
+@dataclass
+class PeptideConfig:
+    """
+    Parameters controlling peptide generation
+
+    Args:
+        window_size: Length of the peptide window centred on the mutation
+        include_sequence_info: Use the long ``id|mutation|pos|window`` FASTA header
+        check_reference: Require the residues named in a ``p.`` change to be at its
+            position, searching other isoforms and nearby offsets when they are not
+        reference_offset: How far (in residues) the offset search looks either side
+        tile_lengths: Also cut every k-mer of these lengths that contains the
+            mutation (see ``tiling.py``); the window is widened to fit the longest
+        tile_wildtype: Pair each k-mer with its wild-type k-mer where the change keeps the length
+        self_filter: Look the mutant k-mers up in a self-proteome ``SelfKmerIndex``:
+            ``flag`` records how many are self, ``drop`` also discards peptides
+            (and tiles) that are entirely self
+    """
+    window_size: int = 25
+    include_sequence_info: bool = True
+    check_reference: bool = True
+    reference_offset: int = DEFAULT_REFERENCE_OFFSET
+    tile_lengths: Optional[Tuple[int, ...]] = None
+    tile_wildtype: bool = False
+    self_filter: Optional[str] = None
+
+    def __post_init__(self):
+        if self.self_filter is not None and self.self_filter not in SELF_FILTER_MODES:
+            raise ValueError(f"Unknown self filter: {self.self_filter} (expected one of {', '.join(SELF_FILTER_MODES)})")
+        if self.tile_lengths:
+            self.tile_lengths = tuple(sorted(set(self.tile_lengths)))
+            # Every k-mer of the longest length must fit on both sides of the mutation
+            self.window_size = max(self.window_size, 2 * self.tile_lengths[-1] - 1)
+
+    @property
+    def half_window(self) -> int:
+        return self.window_size // 2
+
+
+@dataclass
+class PeptideRecord:
+    """A single mutant peptide produced from one mutation"""
+    transcript_id: str
+    mutation: str
+    position: int
+    peptide: str
+    original_aa: str
+    mutant_aa: str
+    # Index of the first mutant residue in peptide (used for tiling, not written out)
+    mutant_offset: int = 0
+    # Mutant k-mers found in the self proteome; None unless self filtering is on
+    self_kmers: Optional[int] = None
+
+    def fasta_header(self, config: PeptideConfig) -> str:
+        """Build the FASTA header line (including the leading '>')"""
+        if config.include_sequence_info:
+            self_info = f"|self:{self.self_kmers}" if self.self_kmers is not None else ""
+            return (f">{self.transcript_id}|{self.mutation}|pos:{self.position}|window:{config.window_size}"
+                    f"{self_info}|mutant")
+        return f">{self.transcript_id}_{self.mutation}_mutant"
+
+    def to_fasta(self, config: PeptideConfig) -> str:
+        """Format the record as a two-line FASTA entry"""
+        return f"{self.fasta_header(config)}\n{self.peptide}\n"
+
+    def to_dict(self) -> Dict[str, object]:
+        record = {
+            "transcript_id": self.transcript_id,
+            "mutation": self.mutation,
+            "position": self.position,
+            "peptide": self.peptide,
+            "original_aa": self.original_aa,
+            "mutant_aa": self.mutant_aa,
+        }
+        if self.self_kmers is not None:
+            record["self_kmers"] = self.self_kmers
+        return record
+
+
+def new_stats(total_mutations: int = 0) -> Dict[str, int]:
+    """Return an empty statistics dictionary in the analysis_summary.json layout"""
+    return {
+        "total_mutations": total_mutations,
+        "processed_mutations": 0,
+        "successful_peptides": 0,
+        "failed_peptides": 0,
+        "invalid_transcripts": 0,
+        "invalid_mutations": 0,
+        "reference_mismatches": 0,
+        "isoform_fallbacks": 0,
+        "multi_isoform_matches": 0,
+        "offset_fallbacks": 0,
+        "self_peptides": 0,
+    }
+
+
+def _default_log(message: str, tag: Optional[str] = None) -> None:
+    if tag == "error":
+        logger.error(message)
+    elif tag == "warning":
+        logger.warning(message)
+    else:
+        logger.info(message)
+
+
+def normalize_transcript_id(value) -> str:
+    """
+    Normalise a transcript identifier to an unversioned ENST ID
+
+    ``"ENST00000288602.11"`` -> ``"ENST00000288602"`` and ``"00000288602"`` -> ``"ENST00000288602"``.
+    """
+    transcript_id = str(value).strip()
+
+    # Ensure ENST format
+    if not transcript_id.startswith("ENST"):
+        transcript_id = f"ENST{transcript_id}" if transcript_id.isdigit() else transcript_id
+
+    # Remove version number if present
+    if "." in transcript_id:
+        transcript_id = transcript_id.split(".")[0]
+
+    return transcript_id
+
+
+def normalize_transcript_ids(values) -> np.ndarray:
+    """Vectorised ``normalize_transcript_id`` over an array-like of IDs"""
+    ids = pd.Series(values, dtype=object).astype(str).str.strip()
+    needs_prefix = ids.str.isdigit() & ~ids.str.startswith("ENST")
+    ids = ids.where(~needs_prefix, "ENST" + ids)
+    return ids.str.split(".", n=1).str[0].to_numpy(dtype=object)
+
+
+def sequence_length(sequence_db: Mapping[str, str], transcript_id: str) -> int:
+    """Length of one sequence, without decoding it when the database is indexed"""
+    length = getattr(sequence_db, "length", None)
+    if length is not None:
+        return length(transcript_id)
+    return len(sequence_db[transcript_id])
+
+
+def sequence_window(sequence_db: Mapping[str, str], transcript_id: str, start: int, end: int) -> str:
+    """Residues ``start:end`` of one sequence; indexed databases read only those bytes"""
+    window = getattr(sequence_db, "window", None)
+    if window is not None:
+        return bytes(window(transcript_id, int(start), int(end))).decode('ascii')
+    return sequence_db[transcript_id][start:end]
+
+
+class ReferenceMatch(NamedTuple):
+    """Where the reference residues of a change were found (see ``PeptideGenerator.resolve_reference``)"""
+    transcript_id: str
+    change: ProteinChange   # shifted to the matching position
+    length: int             # length of the matching sequence
+    attempt: int            # 1: as given, 2: another isoform, 3: a nearby offset
+    isoforms: int = 0       # isoforms that matched on attempt 2
+
+
+def reference_matches(sequence_db: Mapping[str, str], transcript_id: str, change: ProteinChange) -> bool:
+    """Whether the first and last residues named in a change are at its positions (X matches anything)"""
+    expected = change.reference
+    first = sequence_window(sequence_db, transcript_id, change.start, change.start + 1)
+    if expected[0] != first and expected[0] != "X":
+        return False
+    if change.end == change.start:
+        return True
+    last = sequence_window(sequence_db, transcript_id, change.end, change.end + 1)
+    return expected[-1] == last or expected[-1] == "X"
+
+
+def change_problem(change: ProteinChange) -> Optional[str]:
+    """Why a parsed change cannot give a mutant peptide, or None if it can"""
+    if change.kind == SYNONYMOUS:
+        return "Synonymous change has no mutant peptide"
+    if change.kind == NONSENSE:
+        return "Stop gained: no mutant residues"
+    if change.kind == FRAMESHIFT and change.inserted in ("", STOP, "X"):
+        return "Frameshift without a known new residue has no mutant peptide"
+    if change.kind in (INSERTION, DELINS) and change.inserted.startswith(STOP):
+        return "Stop gained: no mutant residues"
+    return None
+
+
+def apply_protein_change(sequence_db: Mapping[str, str], transcript_id: str, change: ProteinChange,
+                         length: int, half_window: int) -> Tuple[str, str, str, int]:
+    """
+    Build the mutant peptide for one parsed change
+
+    A frameshift ends at its first new residue and inserted residues end at a stop.
+
+    Args:
+        sequence_db: Mapping of ENST IDs to protein sequences
+        transcript_id: Normalised ENST ID present in ``sequence_db``
+        change: Parsed change whose residues are all within the sequence
+        length: Length of the sequence
+        half_window: Residues kept on each side of the change
+
+    Returns:
+        Tuple of (mutant peptide, replaced reference residues, new residues,
+        index of the first new residue in the peptide)
+    """
+    start, end, kind = change.start, change.end, change.kind
+    if kind == FRAMESHIFT:
+        window_start = max(0, start - half_window)
+        residues = sequence_window(sequence_db, transcript_id, window_start, start + 1)
+        return residues[:-1] + change.inserted, residues[-1], change.inserted, start - window_start
+
+    if kind == INSERTION:
+        cut_start = cut_end = start + 1
+    elif kind == DUPLICATION:
+        cut_start = cut_end = end + 1
+    else:
+        cut_start, cut_end = start, end + 1
+    window_start = max(0, cut_start - half_window)
+    window_end = min(length, cut_end + half_window)
+    residues = sequence_window(sequence_db, transcript_id, window_start, window_end)
+    if kind == DUPLICATION:
+        inserted = sequence_window(sequence_db, transcript_id, start, end + 1)
+    else:
+        inserted = change.inserted
+    left, right = cut_start - window_start, cut_end - window_start
+    if STOP in inserted:
+        # Nothing after a stop is translated
+        inserted = inserted[:inserted.index(STOP)]
+        return residues[:left] + inserted, residues[left:right], inserted, left
+    return residues[:left] + inserted + residues[right:], residues[left:right], inserted, left
+
+
+def cds_record(transcript_id: str, mutation: str, result: CdsPeptide) -> PeptideRecord:
+    """PeptideRecord for a ``c.`` change; the mutation keeps its ``c.`` prefix"""
+    return PeptideRecord(
+        transcript_id=transcript_id,
+        mutation=mutation,
+        position=result.position + 1,
+        peptide=result.peptide,
+        original_aa=result.original,
+        mutant_aa=result.mutant,
+        mutant_offset=result.offset,
+    )
+
+
+def iter_mutation_chunks(mutations: MutationSource, chunk_size: int) -> Iterator[Tuple[Sequence, Sequence]]:
+    """
+    Cut a mutation source into (transcripts, mutations) column chunks
+
+    DataFrames are sliced column-wise without building per-row tuples; a
+    stream of DataFrames is handled one frame at a time; any other iterable
+    of pairs is consumed lazily ``chunk_size`` pairs at a time.
+    """
+    if isinstance(mutations, pd.DataFrame):
+        for start in range(0, len(mutations), chunk_size):
+            part = mutations.iloc[start:start + chunk_size]
+            yield part.iloc[:, 0].to_numpy(dtype=object), part.iloc[:, 1].to_numpy(dtype=object)
+        return
+
+    iterator = iter(mutations)
+    first = next(iterator, None)
+    if first is None:
+        return
+    if isinstance(first, pd.DataFrame):
+        for frame in chain([first], iterator):
+            yield from iter_mutation_chunks(frame, chunk_size)
+        return
+
+    iterator = chain([first], iterator)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        transcripts, mutation_strings = zip(*chunk)
+        yield transcripts, mutation_strings
+
+
+def skip_mutation_chunks(chunks: Iterator[Tuple[Sequence, Sequence]], rows: int) -> Iterator[Tuple[Sequence, Sequence]]:
+    """Drop the first ``rows`` rows from a stream of (transcripts, mutations) chunks"""
+    for transcripts, mutation_strings in chunks:
+        if rows >= len(transcripts):
+            rows -= len(transcripts)
+            continue
+        if rows:
+            transcripts, mutation_strings = transcripts[rows:], mutation_strings[rows:]
+            rows = 0
+        yield transcripts, mutation_strings
+
+
+def read_mutation_table(filepath: str):
+    """
+    Read a CSV, TSV or MAF mutation file into a DataFrame
+
+    Args:
+        filepath: Path to a .csv, .tsv or .maf file
+
+    Returns:
+        pandas DataFrame with the file contents
+    """
+    return pd.read_csv(filepath, **read_options(filepath))
+
+
+def detect_columns(columns: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Guess the transcript ID and mutation columns from a list of column names
+
+    Uses the same keywords as the column mapping dialog, preferring the MAF
+    ``HGVSp_Short`` column when present.
+
+    Returns:
+        Dictionary with ``enst_id`` and ``mutation`` keys (None when no match)
+    """
+    mapping: Dict[str, Optional[str]] = {"enst_id": None, "mutation": None}
+    columns = list(columns)
+
+    # MAF files carry both HGVSc and HGVSp columns; peptides need the protein change
+    for col in columns:
+        if str(col).lower() == "hgvsp_short":
+            mapping["mutation"] = col
+
+    for col in columns:
+        col_lower = str(col).lower()
+        if mapping["enst_id"] is None and ("transcript" in col_lower or "enst" in col_lower or "feature" in col_lower):
+            mapping["enst_id"] = col
+        if mapping["mutation"] is None and ("hgvs" in col_lower or "mutation" in col_lower or "variant" in col_lower or "amino_acid" in col_lower):
+            mapping["mutation"] = col
+    return mapping
+
+
+def load_sequence_database(db_path: str, use_cache: bool = True, processes: int = 1) -> Mapping[str, str]:
+    """
+    Load a FASTA file of transcript protein sequences into an ENST -> sequence mapping
+
+    A ``.mpdb`` index is memory-mapped; a FASTA goes through the binary cache
+    next to it when ``use_cache`` is set.
+
+    Args:
+        db_path: FASTA file whose record IDs are (optionally versioned) ENST IDs, or a ``.mpdb`` index
+        use_cache: Load FASTA files through the persistent binary cache
+        processes: Worker processes parsing blocks of the FASTA (see ``seqdb.iter_fasta_records``)
+
+    Returns:
+        Mapping of unversioned ENST IDs to protein sequences
+    """
+    if os.path.splitext(db_path)[1].lower() == INDEX_EXTENSION:
+        return IndexedSequenceDB(db_path)
+
+    if use_cache:
+        try:
+            return open_cached(db_path, processes=processes)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not use sequence cache for {db_path}: {str(e)}")
+
+    if processes > 1:
+        sequence_db = {}
+        for record_ids, sequence in iter_fasta_records(db_path, processes):
+            for record_id in record_ids:
+                sequence_db[record_id.split('.')[0]] = sequence
+        return sequence_db
+
+    # Imported here so that callers who bring their own sequence mapping
+    # do not need Biopython installed
+    from Bio import SeqIO
+
+    sequence_db = {}
+    for record in SeqIO.parse(db_path, "fasta"):
+        # Extract ENST ID from the record ID (assuming format like "ENST00000123456.1")
+        enst_id = record.id.split('.')[0]
+        sequence = str(record.seq)
+        sequence_db[enst_id] = sequence
+        # IDs sharing the record's sequence (aliases=...) get the same string
+        for alias in header_aliases(record.description[len(record.id):]):
+            sequence_db[alias.split('.')[0]] = sequence
+    return sequence_db
+
+
+class PeptideGenerator:
+    """
+    Generate mutant peptides from (transcript ID, mutation) pairs
+
+    Progress and per-mutation problems are reported through
+    ``log_callback(message, tag)``; failures are counted in ``self.stats`` and
+    ``self.metrics``, never raised.
+    """
+
+    def __init__(self, sequence_db: Mapping[str, str], config: Optional[PeptideConfig] = None,
+                 log_callback: Optional[LogCallback] = None,
+                 progress_callback: Optional[ProgressCallback] = None,
+                 cds_db: Optional[Mapping[str, str]] = None,
+                 gene_index: Optional[GeneIndex] = None,
+                 self_index: Optional[SelfKmerIndex] = None):
+        """
+        Initialize the generator
+
+        Args:
+            sequence_db: Mapping of unversioned ENST IDs to protein sequences
+            config: Peptide generation parameters
+            log_callback: Function to call for logging messages
+            progress_callback: Function to call with progress events
+            cds_db: Optional mapping of unversioned ENST IDs to coding sequences
+            gene_index: Optional gene -> transcript index for the isoform fallback
+            self_index: k-mer index of the self proteome, required by ``config.self_filter``
+
+        Raises:
+            ValueError: ``config.self_filter`` is set without a ``self_index``
+        """
+        self.sequence_db = sequence_db
+        self.cds_db = cds_db
+        self.gene_index = gene_index
+        self.self_index = self_index
+        self.config = config if config else PeptideConfig()
+        if self.config.self_filter and self_index is None:
+            raise ValueError("Self filtering needs a self-proteome k-mer index")
+        self.log = log_callback if log_callback else _default_log
+        self.progress_callback = progress_callback
+        self.metrics = MetricsRegistry()
+        self.reset_stats()
+
+    def reset_stats(self, total_mutations: int = 0) -> None:
+        self.stats = new_stats(total_mutations)
+        self.metrics.reset()
+        self.progress = ProgressTracker(total_mutations, self.progress_callback, metrics=self.metrics)
+
+    def resolve_reference(self, transcript_id: str, change: ProteinChange, length: int) -> Optional[ReferenceMatch]:
+        """
+        Find the sequence and position whose residues match the reference of a change
+
+        Args:
+            transcript_id: Normalised ENST ID present in the sequence database
+            change: Parsed change whose residues are within the sequence
+            length: Length of the sequence
+
+        Returns:
+            The first match, trying the given position, the same position in the
+            other isoforms of the gene, then the closest offsets; None if none matches
+        """
+        sequence_db = self.sequence_db
+        if reference_matches(sequence_db, transcript_id, change):
+            return ReferenceMatch(transcript_id, change, length, 1)
+
+        if self.gene_index is not None:
+            matches = []
+            for isoform in self.gene_index.isoforms(transcript_id):
+                if isoform not in sequence_db:
+                    continue
+                isoform_length = sequence_length(sequence_db, isoform)
+                if change.end < isoform_length and reference_matches(sequence_db, isoform, change):
+                    matches.append((isoform, isoform_length))
+            if matches:
+                isoform, isoform_length = matches[0]
+                return ReferenceMatch(isoform, change, isoform_length, 2, len(matches))
+
+        for distance in range(1, self.config.reference_offset + 1):
+            for offset in (-distance, distance):
+                if change.start + offset < 0 or change.end + offset >= length:
+                    continue
+                shifted = change._replace(start=change.start + offset, end=change.end + offset)
+                if reference_matches(sequence_db, transcript_id, shifted):
+                    return ReferenceMatch(transcript_id, shifted, length, 3)
+        return None
+
+    def _reference_problem(self, transcript_id: str, change: ProteinChange) -> str:
+        actual = sequence_window(self.sequence_db, transcript_id, change.start, change.start + 1)
+        searched = "its isoforms or " if self.gene_index is not None and self.gene_index.isoforms(transcript_id) else ""
+        return (f"Reference {change.reference[0]}{change.start+1} does not match {actual} in {transcript_id}, "
+                f"{searched}within {self.config.reference_offset} residues")
+
+    def _count_reference(self, match: ReferenceMatch, transcript_id: str, mutation: str) -> None:
+        """Add a fallback match to the statistics and report it"""
+        stats = self.stats
+        stats["reference_mismatches"] += 1
+        if match.attempt == 2:
+            stats["isoform_fallbacks"] += 1
+            if match.isoforms > 1:
+                stats["multi_isoform_matches"] += 1
+            self.log(f"Reference of {mutation} not found in {transcript_id}; "
+                     f"using isoform {match.transcript_id}", "warning")
+        else:
+            stats["offset_fallbacks"] += 1
+            self.log(f"Reference of {mutation} not found at its position in {transcript_id}; "
+                     f"using position {match.change.start+1}", "warning")
+
+    def peptide_for(self, transcript_id: str, mutation: str) -> PeptideRecord:
+        """
+        Build the mutant peptide for one mutation
+
+        Args:
+            transcript_id: Normalised ENST ID
+            mutation: Mutation string, e.g. ``p.V600E`` (or ``c.358delA`` with a CDS database)
+
+        Returns:
+            The PeptideRecord for this mutation
+
+        Raises:
+            TranscriptNotFoundError: The transcript is not in the sequence (or CDS) database
+            UnrecognizedMutationError: The mutation is not in ``p.`` (or ``c.``) notation
+            ValueError: The mutation could not be applied to the sequence
+        """
+        if self.cds_db is not None and mutation.startswith("c."):
+            if transcript_id not in self.cds_db:
+                raise TranscriptNotFoundError(transcript_id)
+            result = cds_peptides(self.cds_db, [(transcript_id, parse_cdna_change(mutation[2:]))],
+                                  self.config.half_window)[0]
+            if not isinstance(result, CdsPeptide):
+                raise ValueError(result)
+            return cds_record(transcript_id, mutation, result)
+
+        if transcript_id not in self.sequence_db:
+            raise TranscriptNotFoundError(transcript_id)
+
+        length = sequence_length(self.sequence_db, transcript_id)
+
+        if not mutation.startswith("p."):
+            raise UnrecognizedMutationError(mutation)
+
+        # HGVS protein change (e.g., p.V600E, p.Gly12_Gly13insAla, p.K120fs*5)
+        mutation_info = mutation[2:]
+        change = parse_protein_change(mutation_info)
+        problem = change_problem(change)
+        if problem:
+            raise ValueError(problem)
+
+        # Validate position
+        if change.end >= length:
+            raise ValueError(f"Position {change.end+1} is out of range for sequence length {length}")
+
+        if self.config.check_reference:
+            match = self.resolve_reference(transcript_id, change, length)
+            if match is None:
+                raise ValueError(self._reference_problem(transcript_id, change))
+            if match.attempt > 1:
+                self._count_reference(match, transcript_id, mutation)
+            transcript_id, change, length = match.transcript_id, match.change, match.length
+
+        peptide, original, inserted, offset = apply_protein_change(
+            self.sequence_db, transcript_id, change, length, self.config.half_window)
+        return PeptideRecord(
+            transcript_id=transcript_id,
+            mutation=mutation_info,
+            position=change.start + 1,
+            peptide=peptide,
+            original_aa=original,
+            mutant_aa=inserted,
+            mutant_offset=offset,
+        )
+
+    def generate(self, mutations: MutationSource, total: Optional[int] = None,
+                 start_index: int = 0, skip_rows: int = 0,
+                 on_batch: Optional[Callable[[int], None]] = None) -> Iterator[PeptideRecord]:
+        """
+        Generate peptides for (transcript ID, mutation) pairs
+
+        Args:
+            mutations: Iterable of (transcript ID, mutation) pairs, a DataFrame
+                whose first two columns are transcript ID and mutation, or an
+                iterable of such DataFrames
+            total: Number of mutations, used for progress messages (0 if unknown)
+            start_index: Row number of the first mutation (for chunks of a larger table)
+            skip_rows: Leading mutations to skip, e.g. those done before a checkpoint
+            on_batch: Called with the number of rows done (including ``start_index``)
+                after the records of each batch but the last have been consumed
+
+        Yields:
+            PeptideRecord for every mutation that could be applied
+        """
+        if total is None:
+            total = len(mutations) if hasattr(mutations, "__len__") else 0
+        self.reset_stats(total)
+        self.progress.skip(skip_rows)
+        start_index += skip_rows
+
+        chunks = skip_mutation_chunks(iter_mutation_chunks(mutations, DEFAULT_BATCH_ROWS), skip_rows)
+        # Reading the input file happens lazily inside the chunk iterator
+        with self.progress.stage("parse"):
+            chunk = next(chunks, None)
+        while chunk is not None:
+            transcripts, mutation_strings = chunk
+            yield from self.generate_batch(transcripts, mutation_strings, total, start_index)
+            start_index += len(transcripts)
+            self.progress.advance(len(transcripts))
+            with self.progress.stage("parse"):
+                chunk = next(chunks, None)
+            # Once the input is used up the run finishes rather than stopping at a checkpoint
+            if on_batch is not None and chunk is not None:
+                on_batch(start_index)
+
+        # Streamed input: the row count is only known at the end
+        if not total:
+            self.stats["total_mutations"] = start_index
+
+    def generate_batch(self, transcripts, mutations, total: int, start_index: int = 0) -> Iterator[PeptideRecord]:
+        """
+        Vectorised peptide generation for aligned transcript and mutation columns
+
+        Statistics are added to ``self.stats`` (they are not reset).
+
+        Args:
+            transcripts: Array-like of transcript IDs
+            mutations: Array-like of mutation strings, same length as transcripts
+            total: Number of mutations in the whole run, used for progress messages
+            start_index: Row number of the first element of this batch
+
+        Yields:
+            PeptideRecord for every mutation that could be applied, in input order
+        """
+        stats = self.stats
+        progress = self.progress
+        with progress.stage("parse"):
+            transcript_ids = normalize_transcript_ids(transcripts)
+            mutation_strings = pd.Series(mutations, dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+            count = len(transcript_ids)
+            if count == 0:
+                return
+
+            # HGVS p. notation, parsed once per distinct change string
+            mutation_series = pd.Series(mutation_strings, dtype=object)
+            is_protein = mutation_series.str.startswith("p.").to_numpy(dtype=bool)
+            if self.cds_db is not None:
+                is_cdna = mutation_series.str.startswith("c.").to_numpy(dtype=bool)
+            else:
+                is_cdna = np.zeros(count, dtype=bool)
+            mutation_info = mutation_series.str[2:].to_numpy(dtype=object)
+            changes_by_info = {}
+            problems_by_info = {}
+            for info in pd.unique(mutation_info[is_protein]):
+                try:
+                    change = parse_protein_change(info)
+                except ValueError as e:
+                    problems_by_info[info] = str(e)
+                    continue
+                problem = change_problem(change)
+                if problem:
+                    problems_by_info[info] = problem
+                else:
+                    changes_by_info[info] = change
+            info_series = pd.Series(mutation_info, dtype=object)
+            changes = info_series.map(changes_by_info).to_numpy(dtype=object)
+            ends = info_series.map({info: change.end for info, change in changes_by_info.items()}).to_numpy(dtype=float)
+
+        # Join against the sequence database once per unique transcript
+        with progress.stage("lookup"):
+            lengths_by_id = {}
+            unique_ids = pd.unique(transcript_ids)
+            latencies = np.empty(len(unique_ids))
+            for j, transcript_id in enumerate(unique_ids):
+                lookup_start = time.perf_counter()
+                if transcript_id in self.sequence_db:
+                    lengths_by_id[transcript_id] = sequence_length(self.sequence_db, transcript_id)
+                latencies[j] = time.perf_counter() - lookup_start
+            lengths = pd.Series(transcript_ids, dtype=object).map(lengths_by_id).to_numpy(dtype=float)
+        self.metrics.observe_many("lookup_latency_seconds", latencies)
+
+        found = ~np.isnan(lengths)
+        parsed = ~np.isnan(ends)
+        in_range = parsed & (ends < np.nan_to_num(lengths))
+        ok = found & is_protein & in_range
+        positioned = ok.copy()
+
+        # Reference residues, resolved once per distinct transcript and change
+        matches: Dict[int, ReferenceMatch] = {}
+        reference_failed = np.zeros(count, dtype=bool)
+        if self.config.check_reference:
+            with progress.stage("lookup"):
+                resolved = {}
+                for i in np.flatnonzero(ok):
+                    key = (transcript_ids[i], mutation_info[i])
+                    if key not in resolved:
+                        resolved[key] = self.resolve_reference(key[0], changes[i], int(lengths[i]))
+                    match = resolved[key]
+                    if match is None:
+                        reference_failed[i] = True
+                    elif match.attempt > 1:
+                        matches[i] = match
+            ok &= ~reference_failed
+        fallback = np.zeros(count, dtype=bool)
+        fallback[list(matches)] = True
+
+        # c. changes go through the CDS, translated for the whole batch at once
+        cds_results = {}
+        cds_unparsed = np.zeros(count, dtype=bool)
+        if is_cdna.any():
+            with progress.stage("window"):
+                cds_results, unparsed_rows = self._cds_batch(transcript_ids, mutation_info, np.flatnonzero(is_cdna))
+            cds_unparsed[unparsed_rows] = True
+            # Rows without a result are c. changes whose transcript has no CDS
+            in_cds = np.zeros(count, dtype=bool)
+            cds_ok = np.zeros(count, dtype=bool)
+            for i, result in cds_results.items():
+                in_cds[i] = True
+                cds_ok[i] = isinstance(result, CdsPeptide)
+            found = np.where(is_cdna, in_cds, found)
+            ok = np.where(is_cdna, cds_ok, ok)
+
+        # Progress lines and failure messages, in input order
+        indices = np.arange(start_index, start_index + count)
+        progress_rows = (indices % PROGRESS_INTERVAL == 0) | (indices == total - 1)
+        for i in np.flatnonzero(progress_rows | ~ok | fallback):
+            if progress_rows[i]:
+                counter = f"{indices[i]+1}/{total}" if total else f"{indices[i]+1}"
+                self.log(f"Processing mutation {counter}: {transcript_ids[i]} {mutation_strings[i]}", "info")
+            if fallback[i]:
+                self._count_reference(matches[i], transcript_ids[i], mutation_strings[i])
+            if ok[i]:
+                continue
+            stats["failed_peptides"] += 1
+            if not found[i]:
+                database = "CDS database" if is_cdna[i] else "database"
+                self.log(f"Warning: Transcript {transcript_ids[i]} not found in {database}", "warning")
+                stats["invalid_transcripts"] += 1
+                continue
+            stats["invalid_mutations"] += 1
+            if is_cdna[i]:
+                self.log(f"Error processing mutation {mutation_strings[i]}: {cds_results[i]}", "error")
+            elif not is_protein[i]:
+                self.log(f"Unrecognized mutation format: {mutation_strings[i]}", "warning")
+            elif not parsed[i]:
+                self.log(f"Error processing mutation {mutation_strings[i]}: "
+                         f"{problems_by_info[mutation_info[i]]}", "error")
+            elif reference_failed[i]:
+                self.log(f"Error processing mutation {mutation_strings[i]}: "
+                         f"{self._reference_problem(transcript_ids[i], changes[i])}", "error")
+            else:
+                self.log(f"Error processing mutation {mutation_strings[i]}: Position {int(ends[i])+1} "
+                         f"is out of range for sequence length {int(lengths[i])}", "error")
+
+        succeeded = int(ok.sum())
+        stats["successful_peptides"] += succeeded
+        stats["processed_mutations"] += succeeded
+        self._count_batch(found, (is_protein & parsed) | (is_cdna & ~cds_unparsed), ok,
+                          found & is_protein & parsed, positioned, reference_failed, matches, transcript_ids)
+
+        # Only the peptide assembly is done per mutation; the batch is built
+        # before yielding so the window stage is not charged for the consumer
+        sequence_db = self.sequence_db
+        half_window = self.config.half_window
+        records = []
+        with progress.stage("window"):
+            for i in np.flatnonzero(ok):
+                if is_cdna[i]:
+                    records.append(cds_record(transcript_ids[i], mutation_strings[i], cds_results[i]))
+                    continue
+                match = matches.get(i)
+                if match is None:
+                    transcript_id, change, length = transcript_ids[i], changes[i], int(lengths[i])
+                else:
+                    transcript_id, change, length = match.transcript_id, match.change, match.length
+                peptide, original, inserted, offset = apply_protein_change(
+                    sequence_db, transcript_id, change, length, half_window)
+                records.append(PeptideRecord(
+                    transcript_id=transcript_id,
+                    mutation=mutation_info[i],
+                    position=change.start + 1,
+                    peptide=peptide,
+                    original_aa=original,
+                    mutant_aa=inserted,
+                    mutant_offset=offset,
+                ))
+        if self.config.self_filter and records:
+            with progress.stage("lookup"):
+                records = self._filter_self(records)
+        self.metrics.observe_many("peptide_length", [len(record.peptide) for record in records])
+        yield from records
+
+    def _count_batch(self, found, parsed, ok, protein, positioned, reference_failed,
+                     matches: Dict[int, ReferenceMatch], transcript_ids) -> None:
+        """
+        Add the outcome of every row of a batch to the metrics counters
+
+        Args:
+            found: Rows whose transcript is in the sequence (or CDS) database
+            parsed: Rows whose change is recognised and parses
+            ok: Rows whose peptide was built
+            protein: ``p.`` rows with a found transcript and a parsed change
+            positioned: Those whose change is within the sequence
+            reference_failed: Rows whose reference was not found anywhere
+            matches: Fallback reference matches by row
+            transcript_ids: Normalised transcript IDs of the batch
+        """
+        metrics = self.metrics
+        count = len(found)
+        attempts = Counter(match.attempt for match in matches.values())
+        substitution_found = int((found & parsed).sum())
+        succeeded = int(ok.sum())
+        metrics.increment("MAIN_counter", count)
+        metrics.increment("TRANSCRIPT_FOUND_counter", int(found.sum()))
+        metrics.increment("TRANSCRIPT_NOT_FOUND_counter", count - int(found.sum()))
+        metrics.increment("SUBSTITUTION_FOUND_counter", substitution_found)
+        metrics.increment("SUBSTITUTION_NOT_FOUND_counter", int(found.sum()) - substitution_found)
+        metrics.increment("SUBSTITUTION_SUCCESS_counter", succeeded)
+        metrics.increment("SUBSTITUTION_ERROR_counter", substitution_found - succeeded)
+        metrics.increment("POSITION_FOUND_counter",
+                          int((positioned & ~reference_failed).sum()) - len(matches))
+        metrics.increment("POSITION_2ND_ATTEMPT_FOUND_counter", attempts[2])
+        metrics.increment("POSITION_3RD_ATTEMPT_FOUND_counter", attempts[3])
+        metrics.increment("POSITION_NOT_FOUND_counter",
+                          int((protein & ~positioned).sum()) + int(reference_failed.sum()))
+        metrics.increment("MULTI_SEQ_POSITION_FOUND_counter",
+                          sum(1 for match in matches.values() if match.isoforms > 1))
+        metrics.increment("SUBSTITUTION_FOUND_2ND_ATTEMPT_counter",
+                          sum(1 for i, match in matches.items() if match.attempt == 2 and ok[i]))
+        metrics.increment("SUBSTITUTION_FOUND_3RD_ATTEMPT_counter",
+                          sum(1 for i, match in matches.items() if match.attempt == 3 and ok[i]))
+        if self.gene_index is not None:
+            with_isoforms = {transcript_id for transcript_id in pd.unique(transcript_ids[found])
+                             if self.gene_index.isoforms(transcript_id)}
+            metrics.increment("MULTI_SEQ_FOUND_counter",
+                              sum(1 for transcript_id in transcript_ids[found] if transcript_id in with_isoforms))
+
+    def _filter_self(self, records: List[PeptideRecord]) -> List[PeptideRecord]:
+        """Set ``self_kmers`` on a batch of records; in ``drop`` mode remove the entirely self ones"""
+        spans = np.array([mutant_span(record) for record in records], dtype=np.int64).reshape(-1, 2)
+        self_counts, kmer_counts = self_kmer_counts(self.self_index, [record.peptide for record in records],
+                                                    spans[:, 0], spans[:, 1])
+        for record, count in zip(records, self_counts.tolist()):
+            record.self_kmers = count
+        all_self = (self_counts == kmer_counts) & (kmer_counts > 0)
+        # An empty span at the end (C-terminal deletion) leaves only reference residues
+        lengths = np.array([len(record.peptide) for record in records], dtype=np.int64)
+        all_self |= (spans[:, 0] == spans[:, 1]) & (spans[:, 1] == lengths)
+        self.stats["self_peptides"] += int(all_self.sum())
+        self.metrics.increment("SELF_PEPTIDE_counter", int(all_self.sum()))
+        if self.config.self_filter == "drop" and all_self.any():
+            records = [record for record, is_self in zip(records, all_self.tolist()) if not is_self]
+            self.metrics.increment("SELF_PEPTIDE_DROPPED_counter", int(all_self.sum()))
+        return records
+
+    def _cds_batch(self, transcript_ids, mutation_info, rows) -> Tuple[Dict[int, object], List[int]]:
+        """
+        CdsPeptide or error message for each ``c.`` row whose transcript has a CDS
+
+        Returns:
+            (results by row, rows whose change does not parse)
+        """
+        results: Dict[int, object] = {}
+        unparsed = []
+        items = []
+        item_rows = []
+        for i in rows:
+            if transcript_ids[i] not in self.cds_db:
+                continue
+            try:
+                change = parse_cdna_change(mutation_info[i])
+            except ValueError as e:
+                results[i] = str(e)
+                unparsed.append(i)
+                continue
+            items.append((transcript_ids[i], change))
+            item_rows.append(i)
+        for i, result in zip(item_rows, cds_peptides(self.cds_db, items, self.config.half_window)):
+            results[i] = result
+        return results, unparsed
+
+    def generate_parallel(self, mutations: MutationSource, workers: int,
+                          total: Optional[int] = None,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE, skip_rows: int = 0,
+                          on_batch: Optional[Callable[[int], None]] = None) -> Iterator[PeptideRecord]:
+        """
+        Generate peptides in a process pool, yielding records in input order
+
+        Only ``2 * workers`` chunks are in flight, so the input can be a lazy iterator.
+
+        Args:
+            mutations: Iterable of (transcript ID, mutation) pairs, or a two-column DataFrame
+            workers: Number of worker processes
+            total: Number of mutations, used for progress messages
+            chunk_size: Rows per work unit
+            skip_rows: Leading mutations to skip, e.g. those done before a checkpoint
+            on_batch: Called with the number of rows done after the records of
+                each chunk but the last have been consumed
+
+        Yields:
+            PeptideRecord for every mutation that could be applied
+        """
+        if total is None:
+            total = len(mutations) if hasattr(mutations, "__len__") else 0
+        self.reset_stats(total)
+        self.progress.skip(skip_rows)
+
+        chunks = skip_mutation_chunks(iter_mutation_chunks(mutations, chunk_size), skip_rows)
+        # "spawn" keeps workers from inheriting the GUI's Tk state through fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_chunk_worker,
+                                 initargs=(self.sequence_db, self.config, self.cds_db, self.gene_index,
+                                           self.self_index)) as pool:
+            pending = deque()
+            start_index = done_index = skip_rows
+            exhausted = False
+            try:
+                while True:
+                    while not exhausted and len(pending) < 2 * workers:
+                        with self.progress.stage("parse"):
+                            chunk = next(chunks, None)
+                        if chunk is None:
+                            exhausted = True
+                            break
+                        transcripts, mutation_strings = chunk
+                        pending.append(pool.submit(_generate_chunk, transcripts, mutation_strings, total, start_index))
+                        start_index += len(transcripts)
+                    if not pending:
+                        break
+
+                    records, stats, messages, stage_seconds, metrics = pending.popleft().result()
+                    for message, tag in messages:
+                        self.log(message, tag)
+                    for key, value in stats.items():
+                        if key != "total_mutations":
+                            self.stats[key] += value
+                    self.progress.merge_stage_times(stage_seconds)
+                    self.metrics.merge(metrics)
+                    for record in records:
+                        yield record
+                    rows = stats["successful_peptides"] + stats["failed_peptides"]
+                    done_index += rows
+                    self.progress.advance(rows)
+                    if on_batch is not None and (pending or not exhausted):
+                        on_batch(done_index)
+            except BaseException:
+                # Stopped early (cancelled or consumer closed): drop queued chunks
+                for future in pending:
+                    future.cancel()
+                raise
+
+        if not total:
+            self.stats["total_mutations"] = start_index
+
+    def run(self, mutations: MutationSource, output_dir: str,
+            total: Optional[int] = None, workers: int = 1,
+            record_format: str = "jsonl", cancel_event: Optional[threading.Event] = None,
+            resume: bool = False, source: Optional[str] = None) -> Dict[str, object]:
+        """
+        Generate peptides and write the results to ``output_dir``
+
+        With the ``jsonl`` sidecar a checkpoint is saved every
+        ``CHECKPOINT_INTERVAL`` seconds and on cancel; ``resume`` continues from
+        it.
+
+        Args:
+            mutations: Iterable of (transcript ID, mutation) pairs, a two-column
+                DataFrame, or an iterable of two-column DataFrames
+            output_dir: Directory for the FASTA, record sidecar and summary
+            total: Number of mutations, used for progress messages
+            workers: Number of worker processes; 1 processes in the calling thread
+            record_format: Sidecar format for peptide records, ``jsonl`` or ``parquet``
+            cancel_event: Checked between batches; when set the run stops
+            resume: Continue from the checkpoint in ``output_dir``, if it matches this run
+            source: Identifies the input (e.g. its path) so a checkpoint is not
+                resumed against a different file
+
+        Returns:
+            The results dictionary that was written to analysis_summary.json
+
+        Raises:
+            RunCancelled: ``cancel_event`` was set before the run finished
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        fasta_path = os.path.join(output_dir, FASTA_FILENAME)
+        summary_path = os.path.join(output_dir, SUMMARY_FILENAME)
+        tiles_path = os.path.join(output_dir, TILES_FILENAME)
+        tiling = bool(self.config.tile_lengths)
+
+        if total is None:
+            total = len(mutations) if hasattr(mutations, "__len__") else 0
+        run_info = {
+            "source": source,
+            "total": total,
+            "window_size": self.config.window_size,
+            "include_sequence_info": self.config.include_sequence_info,
+            "check_reference": self.config.check_reference,
+            "reference_offset": self.config.reference_offset,
+            "tile_lengths": list(self.config.tile_lengths or ()),
+            "tile_wildtype": self.config.tile_wildtype,
+            "self_filter": self.config.self_filter,
+            "record_format": record_format,
+        }
+        checkpointing = record_format == "jsonl"
+
+        state = None
+        if resume and not checkpointing:
+            self.log("Resuming is only supported with jsonl records; starting from the first row", "warning")
+        elif resume:
+            state = load_checkpoint(output_dir)
+            if state is None:
+                self.log(f"No checkpoint found in {output_dir}; starting from the first row", "info")
+            elif state.get("run") != run_info:
+                self.log(f"Checkpoint in {output_dir} is for a different input or settings; "
+                         f"starting from the first row", "warning")
+                state = None
+            else:
+                try:
+                    truncate_output(fasta_path, state["fasta_bytes"])
+                    truncate_output(os.path.join(output_dir, RECORDS_FILENAME), state["records_bytes"])
+                    if tiling:
+                        truncate_output(tiles_path, state["tiles_bytes"])
+                except (OSError, ValueError) as e:
+                    self.log(f"Cannot resume from checkpoint: {str(e)}; starting from the first row", "warning")
+                    state = None
+        if state is not None:
+            self.log(f"Resuming after row {state['rows']} from checkpoint", "info")
+            skip_rows = state["rows"]
+            base_stats = state["stats"]
+            base_metrics = state.get("metrics", {})
+            peptide_lengths = Counter({int(length): count for length, count in state["peptide_lengths"].items()})
+            tile_count = state.get("tiles", 0)
+        else:
+            # A checkpoint left by an older run must not describe the new outputs
+            remove_checkpoint(output_dir)
+            skip_rows = 0
+            base_stats = new_stats()
+            base_metrics = {}
+            peptide_lengths = Counter()
+            tile_count = 0
+
+        def combined_stats() -> Dict[str, int]:
+            stats = {key: base_stats.get(key, 0) + value for key, value in self.stats.items()}
+            stats["total_mutations"] = self.stats["total_mutations"]
+            return stats
+
+        def combined_metrics() -> MetricsRegistry:
+            metrics = MetricsRegistry()
+            metrics.merge(base_metrics)
+            metrics.merge(self.metrics.snapshot())
+            return metrics
+
+        last_checkpoint = time.monotonic()
+
+        def on_batch(rows: int) -> None:
+            nonlocal last_checkpoint
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            if checkpointing and (cancelled or time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL):
+                with self.progress.stage("write"):
+                    fasta_out.flush()
+                    records_out.flush()
+                    os.fsync(fasta_out.fileno())
+                    checkpoint = {
+                        "run": run_info,
+                        "rows": rows,
+                        "fasta_bytes": fasta_out.tell(),
+                        "records_bytes": records_out.tell(),
+                        "stats": combined_stats(),
+                        "metrics": combined_metrics().snapshot(),
+                        "peptide_lengths": {str(length): count for length, count in peptide_lengths.items()},
+                    }
+                    if tiling:
+                        tiles_out.flush()
+                        checkpoint["tiles_bytes"] = tiles_out.tell()
+                        checkpoint["tiles"] = tile_count
+                    save_checkpoint(output_dir, checkpoint)
+                last_checkpoint = time.monotonic()
+            if cancelled:
+                raise RunCancelled(rows)
+
+        records_out, records_file = open_record_writer(output_dir, record_format, append=state is not None,
+                                                       self_kmers=bool(self.config.self_filter))
+        # Small tables are not worth starting a pool for; streamed input (total 0) always is
+        if workers > 1 and (total == 0 or total > DEFAULT_CHUNK_SIZE):
+            records = self.generate_parallel(mutations, workers, total=total, skip_rows=skip_rows, on_batch=on_batch)
+        else:
+            records = self.generate(mutations, total=total, skip_rows=skip_rows, on_batch=on_batch)
+
+        write_seconds = 0.0
+        mode = 'a' if state is not None else 'w'
+        tile_lengths, tile_wildtype = self.config.tile_lengths, self.config.tile_wildtype
+        self_filter = self.config.self_filter
+        with open(fasta_path, mode) as fasta_out, records_out, \
+                (open(tiles_path, mode) if tiling else nullcontext()) as tiles_out:
+            for record in records:
+                write_start = time.perf_counter()
+                fasta_out.write(record.to_fasta(self.config))
+                records_out.write(record)
+                peptide_lengths[len(record.peptide)] += 1
+                if tiling:
+                    tiles = list(tile_record(record, tile_lengths, tile_wildtype))
+                    self_tiles = None
+                    if self_filter and tiles:
+                        self_tiles = self.self_index.find([tile.peptide for tile in tiles])
+                        self.metrics.increment("TILE_SELF_counter", int(self_tiles.sum()))
+                        if self_filter == "drop":
+                            tiles = [tile for tile, is_self in zip(tiles, self_tiles.tolist()) if not is_self]
+                            self_tiles = None
+                    tiles_out.write(tiles_to_fasta(record, tiles, self_tiles))
+                    tile_count += len(tiles)
+                    self.metrics.increment("TILE_counter", len(tiles))
+                write_seconds += time.perf_counter() - write_start
+            # Flushing the last buffers and row group on close also counts as writing
+            write_start = time.perf_counter()
+        write_seconds += time.perf_counter() - write_start
+        self.progress.add_stage_time("write", write_seconds)
+        final = self.progress.finish()
+        self.metrics.increment("FILE_SUCCESS_counter")
+        combined_metrics().write(output_dir)
+
+        results = {
+            "stats": combined_stats(),
+            "peptide_lengths": {str(length): count for length, count in sorted(peptide_lengths.items())},
+            "files": {"fasta": FASTA_FILENAME, "records": records_file,
+                      "metrics": METRICS_FILENAME, "prometheus": PROMETHEUS_FILENAME},
+            "timings": {key: final[key] for key in ("elapsed_seconds", "rows_per_second", "stage_seconds")},
+        }
+
+        if tiling:
+            results["files"]["tiles"] = TILES_FILENAME
+            results["tiles"] = tile_count
+
+        with open(summary_path, 'w') as json_out:
+            json.dump(results, json_out, indent=2)
+        remove_checkpoint(output_dir)
+
+        return results
+
+
+# Per-process state for generate_parallel workers, set by _init_chunk_worker
+_chunk_generator: Optional[PeptideGenerator] = None
+
+
+def _init_chunk_worker(sequence_db: Mapping[str, str], config: PeptideConfig,
+                       cds_db: Optional[Mapping[str, str]] = None,
+                       gene_index: Optional[GeneIndex] = None,
+                       self_index: Optional[SelfKmerIndex] = None) -> None:
+    global _chunk_generator
+    _chunk_generator = PeptideGenerator(sequence_db, config, cds_db=cds_db, gene_index=gene_index,
+                                        self_index=self_index)
+
+
+def _generate_chunk(transcripts, mutations, total: int, start_index: int):
+    """Process one chunk in a worker; returns (records, stats, log messages, stage timings, metrics)"""
+    messages: List[Tuple[str, Optional[str]]] = []
+    _chunk_generator.log = lambda message, tag=None: messages.append((message, tag))
+    _chunk_generator.reset_stats(total)
+    records = list(_chunk_generator.generate_batch(transcripts, mutations, total, start_index))
+    return (records, _chunk_generator.stats, messages, _chunk_generator.progress.stage_seconds,
+            _chunk_generator.metrics.snapshot())
@@ -0,0 +1,275 @@
+"""Map genomic variants to transcript ``c.`` changes with a GTF transcript model"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import re
+
+import numpy as np
+import pandas as pd
+
+# GTF feature types that make up the coding sequence, stop codon included
+CDS_FEATURES = ("CDS", "stop_codon")
+
+_TRANSCRIPT_ID_PATTERN = re.compile(r'transcript_id "([^".]+)')
+_COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
+# Column names (lower case) recognised by detect_genomic_columns, in order of preference
+_GENOMIC_KEYWORDS = {
+    "chromosome": ("chromosome", "chrom", "#chrom", "chr"),
+    "position": ("position", "start_position", "pos", "start"),
+    "reference": ("ref", "reference_allele", "reference"),
+    "alternate": ("alt", "tumor_seq_allele2", "alternate", "alt_allele"),
+}
+
+
+def normalize_chromosome(value) -> str:
+    """Chromosome name without a ``chr`` prefix, with ``M`` spelled ``MT``"""
+    name = str(value).strip()
+    if name[:3].lower() == "chr":
+        name = name[3:]
+    return "MT" if name == "M" else name
+
+
+def reverse_complement(bases: str) -> str:
+    return bases.translate(_COMPLEMENT)[::-1]
+
+
+def normalize_alleles(position: int, reference: str, alternate: str) -> Tuple[int, str, str]:
+    """
+    Trim the bases shared by two alleles
+
+    Returns:
+        (position of the first reference base, reference, alternate) with the
+        common prefix and suffix removed; an empty reference is an insertion
+        before ``position``
+    """
+    reference = "" if reference in ("-", ".") else reference.upper()
+    alternate = "" if alternate in ("-", ".") else alternate.upper()
+    suffix = 0
+    while (suffix < len(reference) and suffix < len(alternate)
+           and reference[-1 - suffix] == alternate[-1 - suffix]):
+        suffix += 1
+    if suffix:
+        reference, alternate = reference[:-suffix], alternate[:-suffix]
+    prefix = 0
+    while prefix < len(reference) and prefix < len(alternate) and reference[prefix] == alternate[prefix]:
+        prefix += 1
+    return position + prefix, reference[prefix:], alternate[prefix:]
+
+
+def detect_genomic_columns(columns: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Guess the chromosome, position, reference and alternate allele columns
+
+    Returns:
+        Dictionary with ``chromosome``, ``position``, ``reference`` and
+        ``alternate`` keys (None when no match)
+    """
+    by_name = {str(col).lower(): col for col in columns}
+    return {key: next((by_name[name] for name in names if name in by_name), None)
+            for key, names in _GENOMIC_KEYWORDS.items()}
+
+
+def read_gtf_segments(gtf_path: str) -> pd.DataFrame:
+    """
+    Read the coding segments of a GTF (plain or gzip)
+
+    Returns:
+        DataFrame with chromosome, start, end, strand and transcript_id
+        columns, one row per CDS/stop codon feature
+    """
+    gtf = pd.read_csv(gtf_path, sep="\t", comment="#", header=None, usecols=[0, 2, 3, 4, 6, 8],
+                      names=["chromosome", "feature", "start", "end", "strand", "attributes"],
+                      dtype={"chromosome": str, "feature": str, "strand": str, "attributes": str})
+    gtf = gtf[gtf["feature"].isin(CDS_FEATURES)]
+    return pd.DataFrame({
+        "chromosome": gtf["chromosome"].map(normalize_chromosome),
+        "start": gtf["start"].astype(np.int64),
+        "end": gtf["end"].astype(np.int64),
+        "strand": gtf["strand"],
+        "transcript_id": gtf["attributes"].str.extract(_TRANSCRIPT_ID_PATTERN, expand=False),
+    }).dropna(subset=["transcript_id"])
+
+
+class TranscriptIndex:
+    """
+    Interval index of transcript coding segments
+
+    A segment's ``offset`` is the 0-based CDS position of its first base in
+    transcription order.
+    """
+
+    def __init__(self, segments: pd.DataFrame):
+        """
+        Args:
+            segments: chromosome, start, end, strand and transcript_id columns
+                (see ``read_gtf_segments``); abutting segments of a transcript
+                (a CDS and its stop codon) are merged
+        """
+        segments = segments.sort_values(["transcript_id", "start"], ignore_index=True)
+        same = segments["transcript_id"].eq(segments["transcript_id"].shift())
+        abuts = same & segments["start"].eq(segments["end"].shift() + 1)
+        segments = segments.groupby((~abuts).cumsum(), sort=False).agg(
+            chromosome=("chromosome", "first"), start=("start", "min"), end=("end", "max"),
+            strand=("strand", "first"), transcript_id=("transcript_id", "first"))
+
+        # CDS offsets: cumulative length in transcription order (descending start on - strand)
+        minus = segments["strand"].eq("-").to_numpy()
+        order_key = np.where(minus, -segments["start"].to_numpy(), segments["start"].to_numpy())
+        segments = segments.assign(order_key=order_key).sort_values(["transcript_id", "order_key"],
+                                                                    ignore_index=True)
+        lengths = segments["end"] - segments["start"] + 1
+        segments["offset"] = lengths.groupby(segments["transcript_id"]).cumsum() - lengths
+
+        transcript_ids, transcript_codes = np.unique(segments["transcript_id"].to_numpy(dtype=str),
+                                                     return_inverse=True)
+        self.transcript_ids = transcript_ids.astype(object)
+        segments["transcript"] = transcript_codes
+        self._chromosomes: Dict[str, Tuple[np.ndarray, ...]] = {}
+        for chromosome, part in segments.sort_values("start").groupby("chromosome", sort=False):
+            ends = part["end"].to_numpy(np.int64)
+            self._chromosomes[chromosome] = (
+                part["start"].to_numpy(np.int64),
+                ends,
+                np.maximum.accumulate(ends),
+                part["transcript"].to_numpy(np.int64),
+                part["offset"].to_numpy(np.int64),
+                part["strand"].eq("-").to_numpy(),
+            )
+
+    def __len__(self) -> int:
+        return len(self.transcript_ids)
+
+    @property
+    def chromosomes(self) -> List[str]:
+        return list(self._chromosomes)
+
+    def containing(self, chromosome: str, start: int, end: int) -> np.ndarray:
+        """Indices (into this chromosome's arrays) of the segments that contain start..end"""
+        starts, ends, max_ends = self._chromosomes[chromosome][:3]
+        # max_ends is non-decreasing: segments before lo all end before ``end``
+        lo = np.searchsorted(max_ends, end, side="left")
+        hi = np.searchsorted(starts, start, side="right")
+        candidates = np.arange(lo, max(lo, hi))
+        return candidates[ends[candidates] >= end]
+
+    def _coding_change(self, chromosome: str, segment: int, position: int,
+                       reference: str, alternate: str) -> str:
+        """``c.`` notation of a trimmed change that lies inside one segment"""
+        starts, ends, _, _, offsets, minus = self._chromosomes[chromosome]
+        if minus[segment]:
+            first = offsets[segment] + ends[segment] - (position + max(len(reference), 1) - 1) + 1
+            reference, alternate = reverse_complement(reference), reverse_complement(alternate)
+        else:
+            first = offsets[segment] + position - starts[segment] + 1
+
+        if not reference:
+            # Insertion between first-1 and first (plus) or first and first+1 (minus, after the flip)
+            left = first if minus[segment] else first - 1
+            return f"{left}_{left + 1}ins{alternate}"
+        last = first + len(reference) - 1
+        span = f"{first}" if first == last else f"{first}_{last}"
+        if not alternate:
+            return f"{span}del{reference}"
+        if len(reference) == len(alternate) == 1:
+            return f"{first}{reference}>{alternate}"
+        return f"{span}delins{alternate}"
+
+    def map_variants(self, chromosomes: Sequence, positions: Sequence, references: Sequence,
+                     alternates: Sequence) -> Tuple[np.ndarray, List[str], List[str]]:
+        """
+        Map a batch of genomic variants to coding changes
+
+        Args:
+            chromosomes: Chromosome names (``chr`` prefixes are ignored)
+            positions: 1-based positions of the first reference base (VCF
+                POS, MAF Start_Position)
+            references: Reference allele strings (``-`` or empty for insertions)
+            alternates: Alternate allele strings (``-`` or empty for deletions)
+
+        Returns:
+            (row indices, transcript IDs, ``c.`` changes): one entry per
+            variant and overlapping transcript, in input order. Variants
+            outside every CDS have no entry.
+        """
+        # Normalise each distinct chromosome name once
+        codes, names = pd.factorize(np.asarray(chromosomes, dtype=object))
+        names = [normalize_chromosome(name) for name in names]
+        positions = np.asarray(positions, dtype=np.int64)
+        references = np.asarray(references, dtype=object)
+        alternates = np.asarray(alternates, dtype=object)
+        spans = np.fromiter(map(len, references), dtype=np.int64, count=len(references))
+
+        found = []
+        for code, chromosome in enumerate(names):
+            if chromosome not in self._chromosomes:
+                continue
+            starts, ends, max_ends, segment_transcripts = self._chromosomes[chromosome][:4]
+            selected = np.flatnonzero(codes == code)
+            # Raw span widened by a base on each side: covers the anchor base, and
+            # MAF insertions, which sit after Start_Position
+            first = positions[selected] - 1
+            last = positions[selected] + np.maximum(spans[selected], 1)
+            hi = np.searchsorted(starts, last, side="right")
+            overlaps = (hi > 0) & (max_ends[np.maximum(hi - 1, 0)] >= first)
+
+            variants = []
+            for row in selected[overlaps]:
+                reference = str(references[row])
+                position = int(positions[row]) + (reference == "-")
+                position, reference, alternate = normalize_alleles(position, reference, str(alternates[row]))
+                if reference or alternate:
+                    variants.append((row, position, reference, alternate))
+            if not variants:
+                continue
+
+            # An insertion needs both bases around it in the same segment
+            lefts = np.asarray([p if ref else p - 1 for _, p, ref, _ in variants], dtype=np.int64)
+            rights = np.asarray([p + len(ref) - 1 if ref else p for _, p, ref, _ in variants], dtype=np.int64)
+            # max_ends is non-decreasing: segments before lo all end before the change
+            los = np.searchsorted(max_ends, rights, side="left")
+            his = np.searchsorted(starts, lefts, side="right")
+            for (row, position, reference, alternate), lo, hi, right in zip(variants, los, his, rights):
+                for segment in range(lo, hi):
+                    if ends[segment] >= right:
+                        found.append((row, self.transcript_ids[segment_transcripts[segment]],
+                                      "c." + self._coding_change(chromosome, segment, position,
+                                                                 reference, alternate)))
+
+        found.sort(key=lambda item: item[0])
+        rows = np.asarray([item[0] for item in found], dtype=np.int64)
+        transcripts = [item[1] for item in found]
+        changes = [item[2] for item in found]
+        return rows, transcripts, changes
+
+
+def load_gtf(gtf_path: str) -> TranscriptIndex:
+    """Build a TranscriptIndex from the CDS features of a GTF file"""
+    return TranscriptIndex(read_gtf_segments(gtf_path))
+
+
+def iter_coding_changes(frames: Iterable[pd.DataFrame], index: TranscriptIndex,
+                        stats: Optional[Dict[str, int]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Turn chunks of genomic variants into (transcript ID, mutation) chunks
+
+    Args:
+        frames: DataFrames whose first four columns are chromosome, position,
+            reference and alternate allele
+        index: Transcript model to map against
+        stats: Optional dictionary whose ``variants``, ``coding_variants`` and
+            ``not_in_cds`` counts are updated as chunks are mapped
+
+    Yields:
+        DataFrames with transcript_id and mutation columns, ready for
+        ``PeptideGenerator.run``/``generate``
+    """
+    for frame in frames:
+        frame = frame.dropna(subset=list(frame.columns[:4]))
+        rows, transcripts, changes = index.map_variants(
+            frame.iloc[:, 0].to_numpy(dtype=object), frame.iloc[:, 1].to_numpy(dtype=np.int64),
+            frame.iloc[:, 2].astype(str).to_numpy(dtype=object), frame.iloc[:, 3].astype(str).to_numpy(dtype=object))
+        if stats is not None:
+            coding = len(np.unique(rows))
+            stats["variants"] = stats.get("variants", 0) + len(frame)
+            stats["coding_variants"] = stats.get("coding_variants", 0) + coding
+            stats["not_in_cds"] = stats.get("not_in_cds", 0) + len(frame) - coding
+        yield pd.DataFrame({"transcript_id": transcripts, "mutation": changes})
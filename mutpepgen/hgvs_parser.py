@@ -0,0 +1,200 @@
+"""HGVS protein (``p.``) and coding DNA (``c.``) change parsers"""
+from functools import lru_cache
+from typing import NamedTuple, Optional
+import re
+
+THREE_TO_ONE = {
+    "Ala": "A", "Arg": "R", "Asn": "N", "Asp": "D", "Cys": "C",
+    "Gln": "Q", "Glu": "E", "Gly": "G", "His": "H", "Ile": "I",
+    "Leu": "L", "Lys": "K", "Met": "M", "Phe": "F", "Pro": "P",
+    "Ser": "S", "Thr": "T", "Trp": "W", "Tyr": "Y", "Val": "V",
+    "Sec": "U", "Pyl": "O", "Asx": "B", "Glx": "Z", "Xle": "J",
+    "Xaa": "X", "Ter": "*",
+}
+
+STOP = "*"
+
+# Change kinds, in the order of the class docstring
+SUBSTITUTION = "substitution"
+NONSENSE = "nonsense"
+SYNONYMOUS = "synonymous"
+DELETION = "deletion"
+INSERTION = "insertion"
+DUPLICATION = "duplication"
+DELINS = "delins"
+FRAMESHIFT = "frameshift"
+
+# Three-letter codes first so "Glu" is not read as G + "lu"
+_AA = r"(?:[A-Z][a-z]{2}|[A-Z*])"
+_CHANGE_PATTERN = re.compile(
+    rf"^(?P<ref1>{_AA})(?P<pos1>\d+)"
+    rf"(?:_(?P<ref2>{_AA})(?P<pos2>\d+))?"
+    r"(?:"
+    rf"(?P<delins>delins(?P<delins_seq>{_AA}+))"
+    rf"|(?P<ins>ins(?P<ins_seq>{_AA}+))"
+    r"|(?P<del>del)"
+    r"|(?P<dup>dup)"
+    rf"|(?P<fs>(?P<fs_aa>{_AA})?fs(?:(?:\*|Ter|X)(?P<fs_stop>\d+|\?))?)"
+    r"|(?P<syn>=)"
+    rf"|(?P<alt>{_AA})"
+    r")$"
+)
+_AA_TOKEN = re.compile(_AA)
+
+# Positions inside the CDS only: intronic (+/-) and UTR (-N, *N) offsets do not match
+_NT = "[ACGTN]"
+_CDNA_PATTERN = re.compile(
+    r"^(?P<pos1>\d+)(?:_(?P<pos2>\d+))?"
+    r"(?:"
+    rf"(?P<sub_ref>{_NT})>(?P<sub_alt>{_NT})"
+    rf"|(?P<delins>delins(?P<delins_seq>{_NT}+))"
+    rf"|(?P<ins>ins(?P<ins_seq>{_NT}+))"
+    rf"|(?P<del>del(?P<del_seq>{_NT}*))"
+    rf"|(?P<dup>dup(?P<dup_seq>{_NT}*))"
+    r")$"
+)
+
+
+class ProteinChange(NamedTuple):
+    """
+    A parsed protein change
+
+    ``start`` and ``end`` are 0-based and inclusive. ``stop_offset`` is a
+    frameshift's ``*N``/``TerN`` when known.
+    """
+    kind: str
+    start: int
+    end: int
+    reference: str
+    inserted: str
+    stop_offset: Optional[int] = None
+
+
+def to_one_letter(residues: str) -> str:
+    """
+    Convert a run of one- or three-letter amino acid codes to one-letter codes
+
+    Raises:
+        ValueError: A three-letter code is not an amino acid (e.g. ``Foo``)
+    """
+    codes = []
+    for token in _AA_TOKEN.findall(residues):
+        if len(token) == 3:
+            if token not in THREE_TO_ONE:
+                raise ValueError(f"Unknown amino acid code {token}")
+            codes.append(THREE_TO_ONE[token])
+        else:
+            # A bare X is the legacy stop code (p.R1450X); Xaa is an unknown residue
+            codes.append(STOP if token == "X" else token)
+    return "".join(codes)
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_protein_change(mutation_info: str) -> ProteinChange:
+    """
+    Parse an HGVS protein change
+
+    Args:
+        mutation_info: Change without the ``p.`` prefix (e.g. ``V600E`` or ``Gly12_Gly13insAla``)
+
+    Returns:
+        ProteinChange describing the change
+
+    Raises:
+        ValueError: The change is not in a supported HGVS form
+    """
+    change = mutation_info.strip()
+    if change.startswith("(") and change.endswith(")"):
+        change = change[1:-1]
+
+    match = _CHANGE_PATTERN.match(change)
+    if match is None:
+        raise ValueError(f"Could not parse protein change {mutation_info}")
+
+    start = int(match["pos1"]) - 1
+    end = int(match["pos2"]) - 1 if match["pos2"] else start
+    reference = to_one_letter(match["ref1"])
+    if match["ref2"]:
+        reference += to_one_letter(match["ref2"])
+    if start < 0 or end < start:
+        raise ValueError(f"Invalid residue range in protein change {mutation_info}")
+
+    is_range = match["pos2"] is not None
+    if match["delins"]:
+        return ProteinChange(DELINS, start, end, reference, to_one_letter(match["delins_seq"]))
+    if match["ins"]:
+        if end != start + 1:
+            raise ValueError(f"Insertion {mutation_info} must be between two adjacent residues")
+        return ProteinChange(INSERTION, start, end, reference, to_one_letter(match["ins_seq"]))
+    if match["del"]:
+        return ProteinChange(DELETION, start, end, reference, "")
+    if match["dup"]:
+        return ProteinChange(DUPLICATION, start, end, reference, "")
+
+    if is_range:
+        raise ValueError(f"Could not parse protein change {mutation_info}")
+    if match["fs"]:
+        stop = match["fs_stop"]
+        first = to_one_letter(match["fs_aa"]) if match["fs_aa"] else ""
+        return ProteinChange(FRAMESHIFT, start, end, reference, first,
+                             int(stop) if stop and stop != "?" else None)
+    if match["syn"]:
+        return ProteinChange(SYNONYMOUS, start, end, reference, reference)
+
+    alt = to_one_letter(match["alt"])
+    if alt == STOP:
+        return ProteinChange(NONSENSE, start, end, reference, STOP)
+    return ProteinChange(SUBSTITUTION, start, end, reference, alt)
+
+
+class CdnaChange(NamedTuple):
+    """
+    A parsed coding DNA change
+
+    ``start`` and ``end`` are 0-based, inclusive CDS positions. ``reference``
+    is the reference sequence given in the notation (may be empty) and
+    ``inserted`` the new bases (empty for deletions and duplications).
+    """
+    kind: str
+    start: int
+    end: int
+    reference: str
+    inserted: str
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_cdna_change(change_info: str) -> CdnaChange:
+    """
+    Parse an HGVS coding DNA change
+
+    Args:
+        change_info: Change without the ``c.`` prefix (e.g. ``358delA``)
+
+    Returns:
+        CdnaChange describing the change
+
+    Raises:
+        ValueError: The change is not a supported change inside the CDS
+    """
+    match = _CDNA_PATTERN.match(change_info.strip())
+    if match is None:
+        raise ValueError(f"Could not parse cDNA change {change_info}")
+
+    start = int(match["pos1"]) - 1
+    end = int(match["pos2"]) - 1 if match["pos2"] else start
+    if start < 0 or end < start:
+        raise ValueError(f"Invalid base range in cDNA change {change_info}")
+
+    if match["sub_ref"]:
+        if end != start:
+            raise ValueError(f"Could not parse cDNA change {change_info}")
+        return CdnaChange(SUBSTITUTION, start, end, match["sub_ref"], match["sub_alt"])
+    if match["delins"]:
+        return CdnaChange(DELINS, start, end, "", match["delins_seq"])
+    if match["ins"]:
+        if end != start + 1:
+            raise ValueError(f"Insertion {change_info} must be between two adjacent bases")
+        return CdnaChange(INSERTION, start, end, "", match["ins_seq"])
+    if match["del"]:
+        return CdnaChange(DELETION, start, end, match["del_seq"], "")
+    return CdnaChange(DUPLICATION, start, end, match["dup_seq"], "")
@@ -0,0 +1,66 @@
+"""Gene -> transcript index for the reference-residue isoform fallback"""
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from seqdb import INDEX_EXTENSION, IndexedSequenceDB, header_gene
+
+
+class GeneIndex:
+    """Transcripts grouped by gene, with each transcript's sibling isoforms precomputed"""
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]]):
+        """
+        Args:
+            pairs: (unversioned ENST ID, gene) pairs
+        """
+        transcripts_by_gene: Dict[str, dict] = defaultdict(dict)
+        for transcript_id, gene in pairs:
+            transcripts_by_gene[gene][transcript_id] = None
+        self.genes = {gene: tuple(transcripts) for gene, transcripts in transcripts_by_gene.items()}
+        self._isoforms: Dict[str, Tuple[str, ...]] = {}
+        self._gene_of: Dict[str, str] = {}
+        for gene, transcripts in self.genes.items():
+            for transcript_id in transcripts:
+                self._gene_of[transcript_id] = gene
+                self._isoforms[transcript_id] = tuple(t for t in transcripts if t != transcript_id)
+
+    def __len__(self) -> int:
+        return len(self._gene_of)
+
+    def gene(self, transcript_id: str) -> Optional[str]:
+        return self._gene_of.get(transcript_id)
+
+    def isoforms(self, transcript_id: str) -> Tuple[str, ...]:
+        """Other transcripts of the same gene, in database order (empty if the gene is unknown)"""
+        return self._isoforms.get(transcript_id, ())
+
+
+def build_gene_index(path: str) -> GeneIndex:
+    """
+    Transcript -> gene assignments of a sequence database
+
+    A ``.mpdb`` index (e.g. the FASTA cache) keeps the assignments read when
+    it was built; a FASTA's headers are read here. Transcripts are keyed like
+    ``load_sequence_database`` keys them (the unversioned record ID); records
+    whose header names no gene are left out.
+    """
+    if path.lower().endswith(INDEX_EXTENSION):
+        db = IndexedSequenceDB(path)
+        try:
+            return GeneIndex(db.genes())
+        finally:
+            db.close()
+
+    pairs = []
+    with open(path, 'r', encoding='latin-1') as f:
+        for line in f:
+            if not line.startswith(">"):
+                continue
+            words = line[1:].split(None, 1)
+            if not words:
+                continue
+            gene = header_gene(words[1] if len(words) > 1 else "")
+            if gene is None:
+                continue
+            pairs.append((words[0].split(".")[0], gene))
+    return GeneIndex(pairs)
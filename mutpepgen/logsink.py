@@ -0,0 +1,107 @@
+"""Thread-safe, batched log channel between the engine thread and the Tk thread"""
+from collections import deque
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+import re
+import threading
+
+# (pattern, summary label) for messages that are coalesced into counts
+COALESCE_PATTERNS: List[Tuple[Pattern, str]] = [
+    (re.compile(r"^Warning: Transcript \S+ not found in database$"), "transcripts not found in database"),
+    (re.compile(r"^Warning: Transcript \S+ not found in CDS database$"), "transcripts not found in CDS database"),
+    (re.compile(r"^Reference of .+ not found in \S+; using isoform "), "isoform fallbacks"),
+    (re.compile(r"^Reference of .+ not found at its position in "), "nearby-position fallbacks"),
+    (re.compile(r"^Unrecognized mutation format: "), "unrecognized mutation formats"),
+    (re.compile(r"^Error processing mutation "), "mutation processing errors"),
+    # The progress bar shows the position, so the per-100-row lines are only a trace
+    (re.compile(r"^Processing mutation \d"), "progress messages"),
+]
+
+# Messages of one kind shown individually before the rest are only counted
+DEFAULT_MAX_REPEATS = 5
+
+
+class QueueLogSink:
+    """
+    Collect ``(message, tag)`` log calls from any thread for the Tk thread to display
+
+    The sink is callable with the same signature as ``log_message``, so it can
+    be passed as the engine's ``log_callback``. Functions that must run on the
+    Tk thread (e.g. showing results) can be queued with ``call_soon``.
+    """
+
+    def __init__(self, max_repeats: int = DEFAULT_MAX_REPEATS):
+        """
+        Initialize the sink
+
+        Args:
+            max_repeats: Messages of one coalesced kind shown before counting starts
+        """
+        self.max_repeats = max_repeats
+        self._lock = threading.Lock()
+        self._messages = deque()
+        self._callbacks = deque()
+        self._seen: Dict[str, int] = {}
+        self._suppressed: Dict[str, Tuple[int, Optional[str]]] = {}
+
+    def __call__(self, message: str, tag: Optional[str] = None) -> None:
+        label = self._coalesce_label(message)
+        with self._lock:
+            if label is not None:
+                seen = self._seen.get(label, 0) + 1
+                self._seen[label] = seen
+                if seen > self.max_repeats:
+                    count, _ = self._suppressed.get(label, (0, tag))
+                    self._suppressed[label] = (count + 1, tag)
+                    return
+            self._messages.append((message, tag))
+
+    def call_soon(self, callback: Callable, *args) -> None:
+        """Queue ``callback(*args)`` to run on the thread that drains the sink"""
+        with self._lock:
+            self._callbacks.append((callback, args))
+
+    def reset(self) -> None:
+        """Forget coalescing counts, e.g. at the start of a new run"""
+        with self._lock:
+            self._seen.clear()
+            self._suppressed.clear()
+
+    def drain(self, max_messages: Optional[int] = None) -> Tuple[List[Tuple[str, Optional[str]]], List[Tuple[Callable, tuple]]]:
+        """
+        Take pending messages and callbacks
+
+        Coalesced messages suppressed since the last drain are reported as a
+        single count line each, once the queued messages have been taken.
+
+        Args:
+            max_messages: Upper bound on messages returned (the rest stay queued)
+
+        Returns:
+            Tuple of (list of (message, tag), list of (callback, args))
+        """
+        with self._lock:
+            if max_messages is None or max_messages >= len(self._messages):
+                messages = list(self._messages)
+                self._messages.clear()
+                backlog = False
+            else:
+                messages = [self._messages.popleft() for _ in range(max_messages)]
+                backlog = True
+
+            if not backlog:
+                for label, (count, tag) in self._suppressed.items():
+                    messages.append((f"... {count} more {label} (total {self._seen[label]})", tag))
+                self._suppressed.clear()
+
+            # Callbacks wait until every message queued before them is shown
+            callbacks = []
+            if not backlog:
+                callbacks = list(self._callbacks)
+                self._callbacks.clear()
+        return messages, callbacks
+
+    def _coalesce_label(self, message: str) -> Optional[str]:
+        for pattern, label in COALESCE_PATTERNS:
+            if pattern.match(message):
+                return label
+        return None
@@ -0,0 +1,214 @@
+"""Run metrics: pipeline counters, stage timers and histograms"""
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+COUNTERS = (
+    'MAIN_counter',                             # mutation rows processed
+    'FILE_ERROR_counter',                       # input files that failed
+    'FILE_SUCCESS_counter',                     # input files (runs) finished
+    'TRANSCRIPT_FOUND_counter',                 # rows whose transcript is in the sequence/CDS database
+    'TRANSCRIPT_NOT_FOUND_counter',
+    'SUBSTITUTION_FOUND_counter',               # rows with a found transcript and a parsed p./c. change
+    'SUBSTITUTION_NOT_FOUND_counter',           # ... whose change is unrecognised or does not parse
+    'SUBSTITUTION_SUCCESS_counter',             # peptides built
+    'SUBSTITUTION_ERROR_counter',               # parsed changes that could not be applied
+    'POSITION_FOUND_counter',                   # p. changes whose reference is at the stated position
+    'POSITION_2ND_ATTEMPT_FOUND_counter',       # ... found in another isoform of the gene
+    'POSITION_3RD_ATTEMPT_FOUND_counter',       # ... found at a nearby offset
+    'POSITION_NOT_FOUND_counter',               # ... out of range, or reference not found
+    'UNIPROTtoGRch38_NOT_FOUND_counter',        # genomic variants outside every CDS
+    'MULTI_SEQ_FOUND_counter',                  # rows whose gene has other isoforms in the database
+    'MULTI_SEQ_POSITION_FOUND_counter',         # rows whose reference matched in several isoforms
+    'SUBSTITUTION_FOUND_2ND_ATTEMPT_counter',   # peptides built from an isoform match
+    'SUBSTITUTION_FOUND_3RD_ATTEMPT_counter',   # peptides built from an offset match
+    'UNIPROT_NO_ENST_counter',                  # UniProt entries without an Ensembl transcript
+    'GENOMIC_VARIANT_counter',                  # genomic variants mapped with the GTF
+    'GENOMIC_CODING_counter',                   # ... inside a CDS
+    'VCF_RECORD_counter',                       # VCF data lines read
+    'VCF_RECORD_SKIPPED_counter',               # ... filtered, or without a change or usable allele
+    'SELF_PEPTIDE_counter',                     # peptides whose mutant k-mers are all self
+    'SELF_PEPTIDE_DROPPED_counter',             # ... dropped by the self filter
+    'TILE_counter',                             # k-mer tiles written
+    'TILE_SELF_counter',                        # ... tiles found in the self proteome (flagged or dropped)
+    'DEDUP_ROW_counter',                        # peptide records deduplicated
+    'DEDUP_UNIQUE_counter',                     # ... unique peptides among them
+)
+
+# Input-reader count keys (genome.iter_coding_changes, vcf readers) -> counters
+INPUT_COUNTERS = {
+    "variants": "GENOMIC_VARIANT_counter",
+    "coding_variants": "GENOMIC_CODING_counter",
+    "not_in_cds": "UNIPROTtoGRch38_NOT_FOUND_counter",
+    "vcf_records": "VCF_RECORD_counter",
+    "vcf_skipped": "VCF_RECORD_SKIPPED_counter",
+}
+
+# Histogram bucket upper bounds; values above the last go to the +Inf bucket
+PEPTIDE_LENGTH_BUCKETS = (8, 9, 10, 11, 12, 15, 20, 25, 30, 40, 50, 100, 200)
+LOOKUP_LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2, 0.1, 1.0)
+HISTOGRAMS = {
+    "peptide_length": PEPTIDE_LENGTH_BUCKETS,
+    "lookup_latency_seconds": LOOKUP_LATENCY_BUCKETS,
+}
+
+METRICS_FILENAME = "metrics.json"
+PROMETHEUS_FILENAME = "metrics.prom"
+
+# Prefix of every exported Prometheus metric name
+PROMETHEUS_NAMESPACE = "mutpepgen"
+
+
+class MetricsRegistry:
+    """Thread-safe counters, stage timers and fixed-bucket histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero every counter, timer and histogram"""
+        with self._lock:
+            self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+            # stage -> [timed blocks, seconds]
+            self.timers: Dict[str, list] = {}
+            self.histograms = {name: {"buckets": list(bounds), "counts": [0] * (len(bounds) + 1),
+                                      "count": 0, "sum": 0.0}
+                               for name, bounds in HISTOGRAMS.items()}
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    def add_time(self, stage: str, seconds: float, count: int = 1) -> None:
+        """Add ``count`` timed blocks totalling ``seconds`` to a stage timer"""
+        with self._lock:
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += count
+            timer[1] += seconds
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Add the wall time of the ``with`` block to a stage timer"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def observe(self, name: str, value: float) -> None:
+        self.observe_many(name, [value])
+
+    def observe_many(self, name: str, values: Iterable[float]) -> None:
+        """Add values to a histogram, bucketed all at once with NumPy"""
+        values = np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=np.float64)
+        if not len(values):
+            return
+        histogram = self.histograms[name]
+        # Bucket i counts values <= buckets[i] (Prometheus "le")
+        counts = np.bincount(np.searchsorted(histogram["buckets"], values, side="left"),
+                             minlength=len(histogram["counts"]))
+        with self._lock:
+            histogram["counts"] = [a + b for a, b in zip(histogram["counts"], counts.tolist())]
+            histogram["count"] += len(values)
+            histogram["sum"] += float(values.sum())
+
+    def snapshot(self) -> Dict[str, object]:
+        """All metrics as a JSON-serialisable dict (the ``metrics.json`` layout)"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {stage: {"count": count, "seconds": round(seconds, 6)}
+                           for stage, (count, seconds) in self.timers.items()},
+                "histograms": {name: {"buckets": list(histogram["buckets"]), "counts": list(histogram["counts"]),
+                                      "count": histogram["count"], "sum": histogram["sum"]}
+                               for name, histogram in self.histograms.items()},
+            }
+
+    def merge(self, snapshot: Dict[str, object]) -> None:
+        """
+        Add a snapshot taken elsewhere, e.g. in a worker process or by an earlier run
+
+        Raises:
+            ValueError: A histogram in the snapshot has different buckets
+        """
+        for name, value in snapshot.get("counters", {}).items():
+            self.increment(name, value)
+        for stage, timer in snapshot.get("timers", {}).items():
+            self.add_time(stage, timer["seconds"], timer["count"])
+        with self._lock:
+            for name, other in snapshot.get("histograms", {}).items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = {"buckets": list(other["buckets"]),
+                                                         "counts": [0] * len(other["counts"]),
+                                                         "count": 0, "sum": 0.0}
+                if list(other["buckets"]) != histogram["buckets"]:
+                    raise ValueError(f"Cannot merge histogram {name!r}: its buckets differ")
+                histogram["counts"] = [a + b for a, b in zip(histogram["counts"], other["counts"])]
+                histogram["count"] += other["count"]
+                histogram["sum"] += other["sum"]
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot["counters"].items():
+            metric = f"{PROMETHEUS_NAMESPACE}_{_metric_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+        if snapshot["timers"]:
+            metric = f"{PROMETHEUS_NAMESPACE}_stage_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for stage, timer in snapshot["timers"].items():
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {timer["seconds"]}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {timer["count"]}')
+
+        for name, histogram in snapshot["histograms"].items():
+            metric = f"{PROMETHEUS_NAMESPACE}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = np.cumsum(histogram["counts"]).tolist()
+            for bound, count in zip(histogram["buckets"] + ["+Inf"], cumulative):
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{metric}_sum {histogram['sum']}")
+            lines.append(f"{metric}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir: str) -> None:
+        """Write ``metrics.json`` and ``metrics.prom`` to a directory"""
+        with open(os.path.join(output_dir, METRICS_FILENAME), 'w') as json_out:
+            json.dump(self.snapshot(), json_out, indent=2)
+        with open(os.path.join(output_dir, PROMETHEUS_FILENAME), 'w') as prom_out:
+            prom_out.write(self.to_prometheus())
+
+
+def _metric_name(counter: str) -> str:
+    """Prometheus name for a counter: ``TRANSCRIPT_FOUND_counter`` -> ``transcript_found``"""
+    return counter[:-len("_counter")].lower() if counter.endswith("_counter") else counter.lower()
+
+
+def load_metrics(output_dir: str) -> Optional[Dict[str, object]]:
+    """The snapshot in a directory's ``metrics.json``, or None if there is none"""
+    try:
+        with open(os.path.join(output_dir, METRICS_FILENAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def add_counters(output_dir: str, counters: Dict[str, int]) -> None:
+    """Add counts from outside the peptide engine to the metrics written in a directory"""
+    metrics = MetricsRegistry()
+    metrics.merge(load_metrics(output_dir) or {})
+    metrics.merge({"counters": counters})
+    metrics.write(output_dir)
+
+
+def input_counters(stats: Dict[str, int]) -> Dict[str, int]:
+    """Counters for input-reader counts (see ``INPUT_COUNTERS``)"""
+    return {INPUT_COUNTERS[key]: value for key, value in stats.items() if key in INPUT_COUNTERS}
@@ -1,3 +1,12 @@
+import sys
+
+# Any command-line arguments select the headless batch mode, e.g.
+#   python mutpepgen.py sample1.maf sample2.maf -w 15 -o results
+# Dispatched before the GUI imports so batch runs do not need a display or Tk
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from cli import main
+    sys.exit(main())
+
 import tkinter as tk
 import tkinter.messagebox as messagebox
 import customtkinter as ctk
@@ -14,8 +23,20 @@ import time
 import json
 from Bio import SeqIO
 from Bio.Seq import Seq
+from engine import PeptideConfig, PeptideGenerator, RunCancelled, load_sequence_database, read_mutation_table
+from checkpoint import load_checkpoint
+from isoforms import GeneIndex, build_gene_index
+from readers import iter_mutation_file, read_preview
+from vcf import is_vcf_path, iter_vcf_mutations, read_vcf_preview
+from writers import RECORDS_FILENAME, iter_records, read_records
+from dedup import UNIQUE_FASTA_FILENAME, PeptideDeduplicator
+from logsink import QueueLogSink
+from metrics import METRICS_FILENAME, PROMETHEUS_FILENAME, add_counters, input_counters
+from progress import format_progress
+from tiling import DEFAULT_TILE_LENGTHS
+from selfindex import open_self_index
+from seqdb import IndexedSequenceDB
 import subprocess
-import sys
 
 # Set appearance mode and color theme
 ctk.set_appearance_mode("System")  # Default to system theme
@@ -27,6 +48,10 @@ H=1280
 W=720
 __version__="v1.0.0-dev"
 
+# Worker log messages are shown in batches of at most LOG_BATCH_SIZE every LOG_POLL_INTERVAL_MS
+LOG_POLL_INTERVAL_MS = 100
+LOG_BATCH_SIZE = 500
+
 class MutationPeptideApp(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -60,6 +85,9 @@ class MutationPeptideApp(ctk.CTk):
         # Initialize database if it doesn't exist
         self.setup_database()
         
+        # Start showing messages queued by worker threads
+        self.after(LOG_POLL_INTERVAL_MS, self.poll_log_queue)
+        
     def set_app_icon(self):
         """Set the application icon after the window is created"""
         # For Windows and macOS compatibility
@@ -85,11 +113,21 @@ class MutationPeptideApp(ctk.CTk):
         self.output_dir = os.path.join(os.getcwd(), "results")
         self.peptide_window = tk.IntVar(value=25)
         self.include_sequence_info = tk.BooleanVar(value=True)
+        self.stream_input = tk.BooleanVar(value=False)
+        self.tile_peptides = tk.BooleanVar(value=False)
+        self.tile_wildtype = tk.BooleanVar(value=False)
+        self.deduplicate = tk.BooleanVar(value=False)
+        self.self_filter = tk.BooleanVar(value=False)
         self.num_threads = tk.IntVar(value=4)
         self.version = __version__
         self.processing_in_progress = False
+        self.cancel_event = None
+        self.log_sink = QueueLogSink()
         self.df = None
         self.sequence_db = {}
+        self.cds_database_path = None
+        self.cds_db = None
+        self.gene_index = None
         
         # Set up color scheme
         self.colors = {
@@ -180,13 +218,24 @@ class MutationPeptideApp(ctk.CTk):
         )
         db_section_label.grid(row=6, column=0, padx=20, pady=(15, 10), sticky="w")
         
+        db_buttons_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
+        db_buttons_frame.grid(row=7, column=0, padx=20, pady=(0, 10), sticky="ew")
+        
         self.db_button = ctk.CTkButton(
-            self.sidebar_frame, 
+            db_buttons_frame, 
             text="Select Sequence Database", 
             command=self.select_database,
             height=36
         )
-        self.db_button.grid(row=7, column=0, padx=20, pady=(0, 10), sticky="ew")
+        self.db_button.pack(fill="x")
+        
+        self.cds_button = ctk.CTkButton(
+            db_buttons_frame, 
+            text="Select CDS Database (Optional)", 
+            command=self.select_cds_database,
+            height=36
+        )
+        self.cds_button.pack(fill="x", pady=(10, 0))
         
         # Section label - Parameters
         param_section_label = ctk.CTkLabel(
@@ -233,6 +282,41 @@ class MutationPeptideApp(ctk.CTk):
         )
         self.seq_info_checkbox.grid(row=0, column=0, sticky="w")
         
+        self.stream_checkbox = ctk.CTkCheckBox(
+            output_options_frame,
+            text="Stream large input files",
+            variable=self.stream_input
+        )
+        self.stream_checkbox.grid(row=1, column=0, pady=(5, 0), sticky="w")
+        
+        self.tile_checkbox = ctk.CTkCheckBox(
+            output_options_frame,
+            text=f"Tile {DEFAULT_TILE_LENGTHS[0]}-{DEFAULT_TILE_LENGTHS[-1]}mers over mutations",
+            variable=self.tile_peptides
+        )
+        self.tile_checkbox.grid(row=2, column=0, pady=(5, 0), sticky="w")
+        
+        self.tile_wildtype_checkbox = ctk.CTkCheckBox(
+            output_options_frame,
+            text="Pair tiles with wild-type k-mers",
+            variable=self.tile_wildtype
+        )
+        self.tile_wildtype_checkbox.grid(row=3, column=0, pady=(5, 0), sticky="w")
+        
+        self.dedup_checkbox = ctk.CTkCheckBox(
+            output_options_frame,
+            text="Write each unique peptide once",
+            variable=self.deduplicate
+        )
+        self.dedup_checkbox.grid(row=4, column=0, pady=(5, 0), sticky="w")
+        
+        self.self_filter_checkbox = ctk.CTkCheckBox(
+            output_options_frame,
+            text="Drop peptides found in the self proteome",
+            variable=self.self_filter
+        )
+        self.self_filter_checkbox.grid(row=5, column=0, pady=(5, 0), sticky="w")
+        
         # Threads frame
         threads_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
         threads_frame.grid(row=11, column=0, padx=20, pady=(0, 10), sticky="ew")
@@ -292,7 +376,18 @@ class MutationPeptideApp(ctk.CTk):
             text="Ready",
             font=ctk.CTkFont(size=12)
         )
-        self.status_label.pack(padx=10, pady=10)
+        self.status_label.pack(padx=10, pady=(10, 5))
+        
+        self.progress_bar = ctk.CTkProgressBar(self.status_frame, height=10)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(padx=10, pady=(0, 5), fill="x")
+        
+        self.progress_label = ctk.CTkLabel(
+            self.status_frame,
+            text="",
+            font=ctk.CTkFont(size=10)
+        )
+        self.progress_label.pack(padx=10, pady=(0, 5))
         
         # Version info
         self.version_label = ctk.CTkLabel(
@@ -419,6 +514,7 @@ class MutationPeptideApp(ctk.CTk):
         self.database_status = self.create_status_indicator(self.status_left, "Sequence Database", 3)
         self.peptide_status = self.create_status_indicator(self.status_left, "Peptide Window Size", 4)
         self.output_status = self.create_status_indicator(self.status_left, "Results Directory", 5)
+        self.cds_status = self.create_status_indicator(self.status_left, "CDS Database", 6, required=False)
         
         # Dashboard right column - Quick stats and visualization
         self.status_right = ctk.CTkFrame(dashboard_frame)
@@ -693,18 +789,24 @@ class MutationPeptideApp(ctk.CTk):
             self.log_message(f"Loading sequence database from {db_path}...", "info")
             start_time = time.time()
             
-            # Clear existing database
-            self.sequence_db = {}
-            
             # Load sequences from FASTA file
-            for record in SeqIO.parse(db_path, "fasta"):
-                # Extract ENST ID from the record ID (assuming format like "ENST00000123456.1")
-                enst_id = record.id.split('.')[0]
-                self.sequence_db[enst_id] = str(record.seq)
+            self.sequence_db = load_sequence_database(db_path)
             
             end_time = time.time()
             self.log_message(f"Loaded {len(self.sequence_db)} sequences in {end_time - start_time:.2f} seconds", "success")
             
+            # Gene assignments from the FASTA headers, for the isoform fallback;
+            # the sequence cache already holds them
+            self.gene_index = None
+            try:
+                if isinstance(self.sequence_db, IndexedSequenceDB):
+                    self.gene_index = GeneIndex(self.sequence_db.genes())
+                else:
+                    self.gene_index = build_gene_index(db_path)
+                self.log_message(f"Indexed {len(self.gene_index.genes)} genes for the isoform fallback", "info")
+            except ValueError as e:
+                self.log_message(f"No isoform fallback: {str(e)}", "warning")
+            
             # Update database status
             db_name = os.path.basename(db_path)
             self.update_status(self.database_status, True, f"{db_name} ✓")
@@ -767,15 +869,31 @@ class MutationPeptideApp(ctk.CTk):
         self.log_textbox.configure(state="normal")
         self.log_textbox.see("end")
         
+    def poll_log_queue(self):
+        """Show queued worker messages in one batch and run queued UI callbacks"""
+        messages, callbacks = self.log_sink.drain(LOG_BATCH_SIZE)
+        if messages:
+            self.log_textbox.configure(state="normal")
+            for message, tag in messages:
+                if tag:
+                    self.log_textbox.insert("end", message + "\n", tag)
+                else:
+                    self.log_textbox.insert("end", message + "\n")
+            self.log_textbox.see("end")
+        for callback, args in callbacks:
+            callback(*args)
+        self.after(LOG_POLL_INTERVAL_MS, self.poll_log_queue)
+        
     def select_input_file(self):
         """Select input mutation file"""
         filepath = filedialog.askopenfilename(
             title="Select Mutation Data File",
             filetypes=[
-                ("Mutation Files", "*.csv;*.tsv;*.maf"),
+                ("Mutation Files", "*.csv;*.tsv;*.maf;*.vcf;*.vcf.gz"),
                 ("CSV Files", "*.csv"),
                 ("TSV Files", "*.tsv"),
                 ("MAF Files", "*.maf"),
+                ("Annotated VCF Files", "*.vcf;*.vcf.gz"),
                 ("All Files", "*.*")
             ]
         )
@@ -783,7 +901,7 @@ class MutationPeptideApp(ctk.CTk):
         if filepath:
             # Check if it's a valid file type
             ext = os.path.splitext(filepath)[1].lower()
-            if ext in ['.csv', '.tsv', '.maf']:
+            if ext in ['.csv', '.tsv', '.maf'] or is_vcf_path(filepath):
                 self.input_files = [filepath]
                 self.current_file = filepath
                 file_name = os.path.basename(filepath)
@@ -801,9 +919,16 @@ class MutationPeptideApp(ctk.CTk):
                 
                 # Try to load the file
                 self.load_file(filepath)
+                
+                if is_vcf_path(filepath) and self.df is not None:
+                    # Transcripts and changes come from the CSQ/ANN annotation, not from columns
+                    self.column_mapping = {"enst_id": "transcript_id", "mutation": "mutation"}
+                    self.has_selected_columns = True
+                    self.update_status(self.column_status, True, "VCF annotation ✓")
+                    self.column_button.configure(state="disabled")
             else:
                 self.update_status(self.input_file_status, False)
-                messagebox.showwarning("Invalid File", "Please select a CSV, TSV, or MAF file")
+                messagebox.showwarning("Invalid File", "Please select a CSV, TSV, MAF or VCF file")
         else:
             # User canceled selection
             if not self.input_files:
@@ -812,16 +937,18 @@ class MutationPeptideApp(ctk.CTk):
     def load_file(self, filepath):
         """Load the selected file and detect columns"""
         try:
-            ext = os.path.splitext(filepath)[1].lower()
             self.log_message(f"Loading file {filepath}...", "info")
             
-            if ext == '.csv':
-                self.df = pd.read_csv(filepath)
-            elif ext == '.tsv':
-                self.df = pd.read_csv(filepath, sep='\t')
-            elif ext == '.maf':
-                # For MAF files, skip lines starting with #
-                self.df = pd.read_csv(filepath, sep='\t', comment='#')
+            if is_vcf_path(filepath):
+                # VCFs are always streamed; the preview shows their first annotated changes
+                self.df = read_vcf_preview(filepath)
+                self.log_message(f"VCF input: previewing the first {len(self.df)} annotated changes", "info")
+            elif self.stream_input.get():
+                # Only a preview is kept in memory; the file is streamed during processing
+                self.df = read_preview(filepath)
+                self.log_message(f"Streaming mode: previewing the first {len(self.df)} rows", "info")
+            else:
+                self.df = read_mutation_table(filepath)
             
             # Update data explorer
             self.refresh_data_view()
@@ -1031,6 +1158,7 @@ class MutationPeptideApp(ctk.CTk):
             title="Select Sequence Database",
             filetypes=[
                 ("FASTA Files", "*.fasta;*.fa"),
+                ("Indexed Databases", "*.mpdb"),
                 ("All Files", "*.*")
             ]
         )
@@ -1042,6 +1170,40 @@ class MutationPeptideApp(ctk.CTk):
             # User canceled, keep current database
             pass
             
+    def select_cds_database(self):
+        """Select the optional nucleotide CDS database used for c. mutations and frameshifts"""
+        cds_path = filedialog.askopenfilename(
+            title="Select CDS Database",
+            filetypes=[
+                ("FASTA Files", "*.fasta;*.fa"),
+                ("Indexed Databases", "*.mpdb"),
+                ("All Files", "*.*")
+            ]
+        )
+        
+        if cds_path:
+            self.load_cds_database(cds_path)
+            
+    def load_cds_database(self, cds_path):
+        """Load the CDS database"""
+        try:
+            self.log_message(f"Loading CDS database from {cds_path}...", "info")
+            start_time = time.time()
+            
+            self.cds_db = load_sequence_database(cds_path)
+            self.cds_database_path = cds_path
+            
+            end_time = time.time()
+            self.log_message(f"Loaded {len(self.cds_db)} coding sequences in {end_time - start_time:.2f} seconds", "success")
+            self.log_message("c. mutations will be translated from the CDS, including full frameshift tails", "info")
+            
+            self.update_status(self.cds_status, True, f"{os.path.basename(cds_path)} ✓")
+        except Exception as e:
+            self.log_message(f"Error loading CDS database: {str(e)}", "error")
+            self.cds_db = None
+            self.cds_database_path = None
+            self.update_status(self.cds_status, False, optional=True)
+            
     def select_output_dir(self):
         """Select output directory for results"""
         output_dir = filedialog.askdirectory(
@@ -1088,15 +1250,31 @@ class MutationPeptideApp(ctk.CTk):
     def run_analysis(self):
         """Run the peptide generation analysis"""
         if self.processing_in_progress:
-            messagebox.showinfo("Processing", "Analysis is already running. Please wait.")
+            # The run button doubles as the cancel button while a run is going
+            self.cancel_analysis()
             return
             
         if not self.validate_inputs():
             return
+        
+        # Offer to continue an interrupted run on the same file
+        resume = False
+        checkpoint = load_checkpoint(self.output_dir)
+        if checkpoint and checkpoint.get("run", {}).get("source") == os.path.abspath(self.current_file):
+            resume = messagebox.askyesno(
+                "Resume Analysis",
+                f"A previous run on this file stopped after row {checkpoint['rows']}.\n\n"
+                "Resume from there? Choose No to start over."
+            )
             
         # Set processing flag
         self.processing_in_progress = True
+        self.cancel_event = threading.Event()
+        self.run_button.configure(text="Cancel")
         self.status_label.configure(text="Processing...")
+        self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text="")
         
         # Switch to the log tab to show progress
         self.tabview.set("Processing Log")
@@ -1116,185 +1294,132 @@ class MutationPeptideApp(ctk.CTk):
         self.log_message(f"Results Directory: {self.output_dir}")
         self.log_message("-"*50)
         
+        config = PeptideConfig(
+            window_size=self.peptide_window.get(),
+            include_sequence_info=self.include_sequence_info.get(),
+            tile_lengths=DEFAULT_TILE_LENGTHS if self.tile_peptides.get() else None,
+            tile_wildtype=self.tile_wildtype.get(),
+            self_filter="drop" if self.self_filter.get() else None
+        )
+        if config.tile_lengths:
+            self.log_message(f"K-mer tiling: lengths {', '.join(map(str, config.tile_lengths))}, "
+                             f"window widened to {config.window_size}")
+        
         # Start processing in a separate thread
-        threading.Thread(target=self.process_mutations).start()
+        self.log_sink.reset()
+        threading.Thread(
+            target=self.process_mutations,
+            args=(config, self.num_threads.get(), self.stream_input.get(), resume, self.cancel_event,
+                  self.deduplicate.get()),
+            daemon=True
+        ).start()
+        
+    def cancel_analysis(self):
+        """Ask the running analysis to stop after the current batch"""
+        if self.cancel_event is None or self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        self.status_label.configure(text="Cancelling...")
+        self.log_message("Cancelling after the current batch...", "warning")
         
-    def process_mutations(self):
+    def process_mutations(self, config, workers, stream_input, resume=False, cancel_event=None, deduplicate=False):
         """Process mutations and generate peptides"""
+        # Runs on a worker thread: Tk widgets and variables are only touched
+        # through the log sink, so settings are read by run_analysis
+        log = self.log_sink
         try:
-            window_size = self.peptide_window.get()
-            half_window = window_size // 2
-            
-            self.log_message("Step 1: Preparing mutation data...", "subheader")
+            log("Step 1: Preparing mutation data...", "subheader")
             
             # Get the columns we need
             enst_column = self.column_mapping["enst_id"]
             mutation_column = self.column_mapping["mutation"]
             
-            # Create results directory if it doesn't exist
-            os.makedirs(self.output_dir, exist_ok=True)
-            
-            # Initialize counters
-            total_mutations = len(self.df)
-            processed_mutations = 0
-            successful_peptides = 0
-            failed_peptides = 0
-            
-            # Prepare results dictionary
-            results = {
-                "mutation_peptides": [],
-                "stats": {
-                    "total_mutations": total_mutations,
-                    "processed_mutations": 0,
-                    "successful_peptides": 0,
-                    "failed_peptides": 0,
-                    "invalid_transcripts": 0,
-                    "invalid_mutations": 0
-                }
-            }
-            
-            # Create output FASTA file
-            fasta_path = os.path.join(self.output_dir, "mutation_peptides.fasta")
-            summary_path = os.path.join(self.output_dir, "analysis_summary.json")
+            self_index = None
+            if config.self_filter:
+                log("Loading self-proteome k-mer index (built on first use)...", "info")
+                self_index = open_self_index(self.database_path, self.sequence_db)
             
-            self.log_message(f"Processing {total_mutations} mutations...", "info")
+            # Progress events arrive on this thread; the bar is updated on the Tk thread
+            generator = PeptideGenerator(self.sequence_db, config, log_callback=log,
+                                         progress_callback=lambda event: log.call_soon(self.update_progress, event),
+                                         cds_db=self.cds_db, gene_index=self.gene_index, self_index=self_index)
             
-            with open(fasta_path, 'w') as fasta_out:
-                # Process each mutation
-                for index, row in self.df.iterrows():
-                    try:
-                        # Get transcript ID
-                        transcript_id = str(row[enst_column]).strip()
-                        
-                        # Ensure ENST format
-                        if not transcript_id.startswith("ENST"):
-                            transcript_id = f"ENST{transcript_id}" if transcript_id.isdigit() else transcript_id
-                            
-                        # Remove version number if present
-                        if "." in transcript_id:
-                            transcript_id = transcript_id.split(".")[0]
-                        
-                        # Get mutation information
-                        mutation_info = str(row[mutation_column]).strip()
-                        
-                        # Log progress every 100 mutations
-                        if index % 100 == 0 or index == total_mutations - 1:
-                            self.log_message(f"Processing mutation {index+1}/{total_mutations}: {transcript_id} {mutation_info}", "info")
-                        
-                        # Check if transcript exists in database
-                        if transcript_id not in self.sequence_db:
-                            self.log_message(f"Warning: Transcript {transcript_id} not found in database", "warning")
-                            results["stats"]["invalid_transcripts"] += 1
-                            failed_peptides += 1
-                            continue
-                        
-                        # Get the sequence
-                        sequence = self.sequence_db[transcript_id]
-                        
-                        # Parse the mutation
-                        try:
-                            # Handling different mutation formats
-                            if mutation_info.startswith("p."):
-                                # Protein mutation format (e.g., p.V600E)
-                                mutation_info = mutation_info[2:]  # Remove p. prefix
-                                
-                                # Extract position and mutation
-                                position = ""
-                                for char in mutation_info[1:]:
-                                    if char.isdigit():
-                                        position += char
-                                    else:
-                                        break
-                                        
-                                if not position:
-                                    raise ValueError(f"Could not extract position from {mutation_info}")
-                                    
-                                position = int(position) - 1  # Convert to 0-based index
-                                mutant_aa = mutation_info[-1]
-                                
-                                # Validate position
-                                if position < 0 or position >= len(sequence):
-                                    raise ValueError(f"Position {position+1} is out of range for sequence length {len(sequence)}")
-                                
-                                # Extract peptide region
-                                start = max(0, position - half_window)
-                                end = min(len(sequence), position + half_window + 1)
-                                
-                                peptide = sequence[start:end]
-                                
-                                # Create mutant peptide by replacing the amino acid at mutation position
-                                rel_pos = position - start
-                                if 0 <= rel_pos < len(peptide):
-                                    mutant_peptide = peptide[:rel_pos] + mutant_aa + peptide[rel_pos+1:]
-                                else:
-                                    raise ValueError(f"Relative position {rel_pos} is out of range for peptide length {len(peptide)}")
-                                
-                                # Create FASTA header
-                                if self.include_sequence_info.get():
-                                    header = f">{transcript_id}|{mutation_info}|pos:{position+1}|window:{window_size}|mutant"
-                                else:
-                                    header = f">{transcript_id}_{mutation_info}_mutant"
-                                
-                                # Write to FASTA file
-                                fasta_out.write(f"{header}\n{mutant_peptide}\n")
-                                
-                                # Store in results
-                                results["mutation_peptides"].append({
-                                    "transcript_id": transcript_id,
-                                    "mutation": mutation_info,
-                                    "position": position + 1,
-                                    "peptide": mutant_peptide,
-                                    "original_aa": sequence[position],
-                                    "mutant_aa": mutant_aa
-                                })
-                                
-                                successful_peptides += 1
-                                results["stats"]["successful_peptides"] += 1
-                                
-                            else:
-                                # Other mutation formats not handled yet
-                                self.log_message(f"Unrecognized mutation format: {mutation_info}", "warning")
-                                results["stats"]["invalid_mutations"] += 1
-                                failed_peptides += 1
-                                continue
-                                
-                        except Exception as e:
-                            self.log_message(f"Error processing mutation {mutation_info}: {str(e)}", "error")
-                            results["stats"]["invalid_mutations"] += 1
-                            failed_peptides += 1
-                            continue
-                            
-                        processed_mutations += 1
-                        results["stats"]["processed_mutations"] += 1
-                        
-                    except Exception as e:
-                        self.log_message(f"Error processing row {index}: {str(e)}", "error")
-                        failed_peptides += 1
-                        continue
+            input_stats = {}
+            if is_vcf_path(self.current_file):
+                total_mutations = None
+                log(f"Streaming VCF annotations from {os.path.basename(self.current_file)}...", "info")
+                mutations = iter_vcf_mutations(self.current_file, stats=input_stats)
+            elif stream_input:
+                total_mutations = None
+                log(f"Streaming mutations from {os.path.basename(self.current_file)}...", "info")
+                mutations = iter_mutation_file(self.current_file, enst_column, mutation_column)
+            else:
+                total_mutations = len(self.df)
+                log(f"Processing {total_mutations} mutations...", "info")
+                mutations = self.df[[enst_column, mutation_column]]
             
-            # Update final statistics
-            results["stats"]["processed_mutations"] = processed_mutations
-            results["stats"]["successful_peptides"] = successful_peptides
-            results["stats"]["failed_peptides"] = failed_peptides
+            results = generator.run(mutations, self.output_dir, total=total_mutations, workers=workers,
+                                    cancel_event=cancel_event, resume=resume,
+                                    source=os.path.abspath(self.current_file))
+            stats = results["stats"]
+            if input_stats:
+                add_counters(self.output_dir, input_counters(input_stats))
             
-            # Save summary to JSON
-            with open(summary_path, 'w') as json_out:
-                json.dump(results, json_out, indent=2)
+            if deduplicate:
+                log("Step 2: Collapsing duplicate peptides...", "subheader")
+                sample = os.path.splitext(os.path.basename(self.current_file))[0]
+                with PeptideDeduplicator(work_dir=self.output_dir) as dedup:
+                    dedup.add_records(iter_records(os.path.join(self.output_dir, results["files"]["records"])), sample)
+                    counts = dedup.write(self.output_dir)
+                add_counters(self.output_dir, {"DEDUP_ROW_counter": counts["rows"],
+                                               "DEDUP_UNIQUE_counter": counts["unique_peptides"]})
+                log(f"{counts['unique_peptides']} unique peptides written to {UNIQUE_FASTA_FILENAME}", "info")
             
             # Log completion
-            self.log_message("\nAnalysis completed!", "header")
-            self.log_message(f"Generated {successful_peptides} peptides from {processed_mutations} mutations", "success")
-            self.log_message(f"Failed to process {failed_peptides} mutations", "info")
-            self.log_message(f"Results saved to: {self.output_dir}", "info")
+            log("\nAnalysis completed!", "header")
+            log(f"Generated {stats['successful_peptides']} peptides from {stats['processed_mutations']} mutations", "success")
+            log(f"Failed to process {stats['failed_peptides']} mutations", "info")
+            if config.self_filter:
+                log(f"Dropped {stats['self_peptides']} peptides whose mutant k-mers are all self", "info")
+            log(f"Results saved to: {self.output_dir}", "info")
+            timings = results["timings"]
+            stage_text = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in timings["stage_seconds"].items())
+            log(f"Elapsed: {timings['elapsed_seconds']:.1f}s ({timings['rows_per_second']:,.0f} rows/s; {stage_text})", "info")
             
-            # Update results tab
-            self.display_results(results)
+            # Update results tab on the Tk thread
+            log.call_soon(self.display_results, results)
             
+        except RunCancelled as e:
+            log(f"\nAnalysis cancelled after {e.rows} mutations. Run again to resume from there.", "warning")
         except Exception as e:
-            self.log_message(f"Error during analysis: {str(e)}", "error")
+            log(f"Error during analysis: {str(e)}", "error")
         finally:
-            self.processing_in_progress = False
-            self.status_label.configure(text="Ready")
+            log.call_soon(self.finish_processing)
+    
+    def update_progress(self, event):
+        """Show a progress event from the engine (runs on the Tk thread)"""
+        if event["fraction"] is None:
+            # Streamed input: the total is unknown until the end
+            if event["event"] == "done":
+                self.progress_bar.stop()
+                self.progress_bar.configure(mode="determinate")
+                self.progress_bar.set(1)
+            elif self.progress_bar.cget("mode") != "indeterminate":
+                self.progress_bar.configure(mode="indeterminate")
+                self.progress_bar.start()
+        else:
+            self.progress_bar.set(event["fraction"])
+        self.progress_label.configure(text=format_progress(event))
+    
+    def finish_processing(self):
+        """Reset the run state once the worker thread is done (runs on the Tk thread)"""
+        self.processing_in_progress = False
+        self.cancel_event = None
+        self.run_button.configure(text="Generate Peptides")
+        self.status_label.configure(text="Ready")
+        if self.progress_bar.cget("mode") == "indeterminate":
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
     
     def display_results(self, results):
         """Display results in the results tab"""
@@ -1315,6 +1440,7 @@ class MutationPeptideApp(ctk.CTk):
 - **Failed Mutations**: {results['stats']['failed_peptides']}
 - **Invalid Transcripts**: {results['stats']['invalid_transcripts']}
 - **Invalid Mutation Format**: {results['stats']['invalid_mutations']}
+- **Reference Fallbacks**: {results['stats']['isoform_fallbacks']} other isoform, {results['stats']['offset_fallbacks']} nearby position
 
 ## Parameters Used
 - **Peptide Window Size**: {self.peptide_window.get()} amino acids
@@ -1322,7 +1448,9 @@ class MutationPeptideApp(ctk.CTk):
 
 ## File Locations
 - **FASTA File**: {os.path.join(self.output_dir, 'mutation_peptides.fasta')}
+- **Peptide Records**: {os.path.join(self.output_dir, RECORDS_FILENAME)}
 - **Analysis Summary**: {os.path.join(self.output_dir, 'analysis_summary.json')}
+- **Run Metrics**: {os.path.join(self.output_dir, METRICS_FILENAME)} (Prometheus: {PROMETHEUS_FILENAME})
         """
         
         self.results_textbox.insert("0.0", summary)
@@ -1352,10 +1480,11 @@ class MutationPeptideApp(ctk.CTk):
         ax1.set_title('Mutation Processing Results')
         
         # Add a subplot for peptide length distribution if we have successful peptides
-        if results['mutation_peptides']:
+        length_counts = self.get_peptide_length_counts(results)
+        if length_counts:
             ax2 = fig.add_subplot(122)
-            peptide_lengths = [len(peptide['peptide']) for peptide in results['mutation_peptides']]
-            ax2.hist(peptide_lengths, bins=10, color='#4CAF50')
+            peptide_lengths = [int(length) for length in length_counts]
+            ax2.hist(peptide_lengths, bins=10, weights=list(length_counts.values()), color='#4CAF50')
             ax2.set_xlabel('Peptide Length')
             ax2.set_ylabel('Count')
             ax2.set_title('Peptide Length Distribution')
@@ -1368,6 +1497,27 @@ class MutationPeptideApp(ctk.CTk):
         canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
+    def get_peptide_length_counts(self, results):
+        """Peptide length -> count, from the summary or (older summaries) the peptide list"""
+        if "peptide_lengths" in results:
+            return results["peptide_lengths"]
+        counts = {}
+        for peptide in results.get("mutation_peptides", []):
+            length = str(len(peptide["peptide"]))
+            counts[length] = counts.get(length, 0) + 1
+        return counts
+    
+    def get_peptide_sample(self, results, limit=100):
+        """First ``limit`` peptide records, read from the record sidecar when available"""
+        if "mutation_peptides" in results:
+            # Summaries written before records moved to the sidecar
+            return results["mutation_peptides"][:limit]
+        records_file = results.get("files", {}).get("records", RECORDS_FILENAME)
+        records_path = os.path.join(self.output_dir, records_file)
+        if not os.path.exists(records_path):
+            return []
+        return read_records(records_path, limit)
+    
     def export_all_results(self):
         """Export all results to the output directory"""
         if not os.path.exists(os.path.join(self.output_dir, "mutation_peptides.fasta")):
@@ -1584,15 +1734,15 @@ class MutationPeptideApp(ctk.CTk):
 """
         
         # Add peptide table if there are peptides
-        if results['mutation_peptides']:
+        sample_peptides = self.get_peptide_sample(results, 100)
+        if sample_peptides:
             # Get a sample of peptides (maximum 100 for performance)
-            sample_size = min(100, len(results['mutation_peptides']))
-            sample_peptides = results['mutation_peptides'][:sample_size]
+            sample_size = len(sample_peptides)
             
             html += f"""
     <div class="container">
         <h2>Generated Peptides</h2>
-        <p>Showing {sample_size} out of {len(results['mutation_peptides'])} peptides</p>
+        <p>Showing {sample_size} out of {results['stats']['successful_peptides']} peptides</p>
         <table>
             <thead>
                 <tr>
@@ -1813,15 +1963,15 @@ class MutationPeptideApp(ctk.CTk):
     """
             
         # Add peptide table if there are peptides
-        if results['mutation_peptides']:
+        sample_peptides = self.get_peptide_sample(results, 100)
+        if sample_peptides:
             # Get a sample of peptides (maximum 100 for performance)
-            sample_size = min(100, len(results['mutation_peptides']))
-            sample_peptides = results['mutation_peptides'][:sample_size]
+            sample_size = len(sample_peptides)
             
             html += f"""
     <div class="container">
         <h2>Generated Peptides</h2>
-        <p>Showing {sample_size} out of {len(results['mutation_peptides'])} peptides</p>
+        <p>Showing {sample_size} out of {results['stats']['successful_peptides']} peptides</p>
         <table>
             <thead>
                 <tr>
@@ -1962,10 +2112,15 @@ class MutationPeptideApp(ctk.CTk):
             help_frame,
             text="MutPep accepts the following file formats:\n"
                  "• CSV/TSV: Tabular data with mutation information\n"
-                 "• MAF: Mutation Annotation Format files\n\n"
+                 "• MAF: Mutation Annotation Format files\n"
+                 "• VCF (.vcf, .vcf.gz): annotated by VEP (CSQ) or SnpEff (ANN); "
+                 "transcripts and changes are read from the annotation and the file is streamed\n\n"
                  "Required data fields:\n"
                  "• Transcript ID (ENST): Ensembl transcript identifier\n"
-                 "• Mutation: Mutation description in HGVS format (e.g., p.V600E)",
+                 "• Mutation: Protein change in HGVS format, with one- or three-letter codes "
+                 "(e.g., p.V600E, p.Arg1450Ter, p.G12_G13insA, p.K120fs*5)\n"
+                 "• With an optional CDS database, coding DNA changes (e.g., c.358delA) "
+                 "are translated from the transcript, giving the full novel tail of frameshifts",
             font=ctk.CTkFont(size=12),
             wraplength=580,
             justify="left"
@@ -2009,7 +2164,11 @@ class MutationPeptideApp(ctk.CTk):
                  "(centered on the mutation site)\n"
                  "• Include Sequence Info: Add additional information to FASTA "
                  "headers (position, window size)\n"
-                 "• Processing Threads: Number of parallel threads to use for analysis",
+                 "• Stream Large Input Files: Read only the mapped columns in chunks "
+                 "instead of loading the whole file\n"
+                 "• Processing Threads: Number of worker processes used to generate peptides\n"
+                 "• Cancel: Stops the run after the current batch; running the same file "
+                 "again offers to resume from where it stopped",
             font=ctk.CTkFont(size=12),
             wraplength=580,
             justify="left"
@@ -2030,7 +2189,8 @@ class MutationPeptideApp(ctk.CTk):
             text="Results are provided in multiple formats:\n"
                  "• Summary statistics in the application\n"
                  "• FASTA file with mutant peptide sequences\n"
-                 "• JSON file with detailed analysis data\n"
+                 "• JSON summary with aggregate statistics\n"
+                 "• JSON Lines file with one record per peptide\n"
                  "• HTML report with visualizations and peptide tables\n\n"
                  "You can export these results to a location of your choice "
                  "for further analysis.",
@@ -2139,7 +2299,6 @@ def setup_application():
         print("Warning: CanImmune logo not found. The application will use text headers instead.")
 
 if __name__ == "__main__":
-
     # Show splash screen
     # splash = show_splash_screen()
     
@@ -0,0 +1,157 @@
+"""Progress, throughput and per-stage timing for peptide-generation runs"""
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+import json
+import threading
+import time
+
+from metrics import MetricsRegistry
+
+STAGES = ("parse", "lookup", "window", "write")
+
+# Minimum seconds between two progress events
+DEFAULT_MIN_INTERVAL = 0.5
+
+ProgressCallback = Callable[[Dict[str, object]], None]
+
+
+class ProgressTracker:
+    """
+    Track rows processed, throughput, ETA and per-stage timings
+
+    ``callback`` receives an event dict at most every ``min_interval``
+    seconds while rows are advancing, and once more from ``finish``.
+    """
+
+    def __init__(self, total: int = 0, callback: Optional[ProgressCallback] = None,
+                 min_interval: float = DEFAULT_MIN_INTERVAL, metrics: Optional[MetricsRegistry] = None):
+        """
+        Initialize the tracker
+
+        Args:
+            total: Expected number of rows (0 if unknown, e.g. streamed input)
+            callback: Function receiving progress events
+            min_interval: Minimum seconds between events
+            metrics: Registry whose stage timers also receive the timings
+        """
+        self.total = total
+        self.callback = callback
+        self.min_interval = min_interval
+        self.metrics = metrics
+        self.rows = 0
+        self.skipped_rows = 0
+        self.stage_seconds: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_event = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        """Add the wall time of the ``with`` block to stage ``name``"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.perf_counter() - start)
+
+    def add_stage_time(self, name: str, seconds: float) -> None:
+        self._add_stage_time(name, seconds)
+        if self.metrics is not None:
+            self.metrics.add_time(name, seconds)
+
+    def _add_stage_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def merge_stage_times(self, stage_seconds: Dict[str, float]) -> None:
+        """
+        Add timings measured elsewhere, e.g. in a worker process
+
+        They are not added to ``metrics``: a worker's timers arrive with its
+        own registry's snapshot.
+        """
+        for name, seconds in stage_seconds.items():
+            self._add_stage_time(name, seconds)
+
+    def skip(self, rows: int) -> None:
+        """Count rows already processed by an earlier run; they do not add to the rate"""
+        with self._lock:
+            self.rows += rows
+            self.skipped_rows += rows
+
+    def advance(self, rows: int) -> None:
+        """Record ``rows`` more processed rows and emit an event if one is due"""
+        with self._lock:
+            self.rows += rows
+            now = time.perf_counter()
+            due = now - self._last_event >= self.min_interval
+            if due:
+                self._last_event = now
+        if due and self.callback is not None:
+            self.callback(self.snapshot("progress"))
+
+    def finish(self) -> Dict[str, object]:
+        """Emit and return the final event"""
+        event = self.snapshot("done")
+        if self.callback is not None:
+            self.callback(event)
+        return event
+
+    def snapshot(self, event: str = "progress") -> Dict[str, object]:
+        """
+        Current progress as a dict
+
+        Keys: event, rows, total, fraction, elapsed_seconds, rows_per_second,
+        eta_seconds and stage_seconds. ``fraction`` and ``eta_seconds`` are
+        None when the total is unknown.
+        """
+        with self._lock:
+            rows = self.rows
+            skipped = self.skipped_rows
+            stages = {name: round(seconds, 4) for name, seconds in self.stage_seconds.items()}
+        elapsed = time.perf_counter() - self._start
+        rate = (rows - skipped) / elapsed if elapsed > 0 else 0.0
+        fraction = eta = None
+        if self.total:
+            fraction = min(1.0, rows / self.total)
+            eta = (self.total - rows) / rate if rate > 0 else None
+        return {
+            "event": event,
+            "rows": rows,
+            "total": self.total or None,
+            "fraction": fraction,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rate, 1),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "stage_seconds": stages,
+        }
+
+
+def format_progress(event: Dict[str, object]) -> str:
+    """One-line human readable summary of a progress event"""
+    text = f"{event['rows']:,}"
+    if event["total"]:
+        text += f"/{event['total']:,}"
+    text += f" rows | {event['rows_per_second']:,.0f} rows/s"
+    if event["eta_seconds"] is not None:
+        minutes, seconds = divmod(int(event["eta_seconds"]), 60)
+        hours, minutes = divmod(minutes, 60)
+        text += f" | ETA {hours:d}:{minutes:02d}:{seconds:02d}"
+    return text
+
+
+class JsonEventWriter:
+    """Progress callback that writes each event as one JSON line to a stream"""
+
+    def __init__(self, stream, **fields):
+        """
+        Args:
+            stream: Text stream to write to (line-buffered file or sys.stderr)
+            fields: Extra keys added to every event, e.g. ``file="sample.maf"``
+        """
+        self.stream = stream
+        self.fields = fields
+
+    def __call__(self, event: Dict[str, object]) -> None:
+        self.stream.write(json.dumps({**self.fields, **event}) + "\n")
+        self.stream.flush()
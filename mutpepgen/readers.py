@@ -0,0 +1,133 @@
+"""Streaming mutation file readers"""
+from typing import Dict, Iterator, List
+import io
+import os
+
+import pandas as pd
+
+from blocks import map_blocks, read_block
+
+SUPPORTED_EXTENSIONS = ('.csv', '.tsv', '.maf')
+
+# Rows per chunk when streaming a mutation file
+DEFAULT_STREAM_CHUNKSIZE = 200000
+
+
+def read_options(filepath: str) -> Dict[str, object]:
+    """
+    pandas.read_csv keyword arguments for a mutation file, chosen by extension
+
+    Raises:
+        ValueError: The extension is not .csv, .tsv or .maf
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == '.csv':
+        return {}
+    elif ext == '.tsv':
+        return {"sep": '\t'}
+    elif ext == '.maf':
+        # For MAF files, skip lines starting with #
+        return {"sep": '\t', "comment": '#'}
+    raise ValueError(f"Unsupported mutation file type: {ext}")
+
+
+def read_columns(filepath: str) -> List[str]:
+    """Column names of a mutation file, reading only its header"""
+    return list(pd.read_csv(filepath, nrows=0, **read_options(filepath)).columns)
+
+
+def read_preview(filepath: str, rows: int = 100) -> pd.DataFrame:
+    """First ``rows`` rows of a mutation file, for display and column mapping"""
+    return pd.read_csv(filepath, nrows=rows, **read_options(filepath))
+
+
+def data_offset(filepath: str) -> int:
+    """Byte offset of the first data row of a mutation file: after its comment lines and header"""
+    comment = read_options(filepath).get("comment")
+    with open(filepath, 'rb') as f:
+        for line in iter(f.readline, b""):
+            if line.strip() and not (comment and line.startswith(comment.encode('ascii'))):
+                break
+        return f.tell()
+
+
+def _read_table_block(filepath: str, begin: int, end: int, names: List[str],
+                      options: Dict[str, object]) -> pd.DataFrame:
+    """Parse one byte block of a mutation file's data rows"""
+    try:
+        return pd.read_csv(io.BytesIO(read_block(filepath, begin, end)), header=None, names=names, **options)
+    except pd.errors.EmptyDataError:
+        # Only blank or comment lines in this block
+        return pd.DataFrame(columns=options["usecols"]).astype(options["dtype"])
+
+
+def _iter_table_blocks(filepath: str, options: Dict[str, object], chunksize: int,
+                       processes: int) -> Iterator[pd.DataFrame]:
+    """Parse a mutation file's blocks in ``processes`` workers, yielding ``chunksize``-row frames in file order"""
+    options = dict(read_options(filepath), **options)
+    for frame in map_blocks(_read_table_block, filepath, processes, read_columns(filepath), options,
+                            start=data_offset(filepath)):
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+
+
+def iter_mutation_file(filepath: str, enst_column: str, mutation_column: str,
+                       chunksize: int = DEFAULT_STREAM_CHUNKSIZE,
+                       processes: int = 1) -> Iterator[pd.DataFrame]:
+    """
+    Stream the transcript and mutation columns of a mutation file
+
+    Args:
+        filepath: Path to a .csv, .tsv or .maf file
+        enst_column: Transcript ID column
+        mutation_column: Mutation column
+        chunksize: Rows per yielded DataFrame
+        processes: Worker processes parsing blocks of the file; 1 reads it in this process
+
+    Yields:
+        DataFrames with exactly two columns: transcript ID then mutation
+    """
+    columns = [enst_column, mutation_column]
+    if processes > 1:
+        options = {"usecols": list(dict.fromkeys(columns)), "dtype": {column: str for column in columns}}
+        for chunk in _iter_table_blocks(filepath, options, chunksize, processes):
+            yield chunk[columns]
+        return
+
+    reader = pd.read_csv(filepath, usecols=list(dict.fromkeys(columns)),
+                         dtype={column: str for column in columns},
+                         chunksize=chunksize, **read_options(filepath))
+    with reader:
+        for chunk in reader:
+            # Select explicitly so the order is (transcript, mutation) whatever the file order
+            yield chunk[columns]
+
+
+def iter_variant_file(filepath: str, columns: List[str],
+                      chunksize: int = DEFAULT_STREAM_CHUNKSIZE,
+                      processes: int = 1) -> Iterator[pd.DataFrame]:
+    """
+    Stream the chromosome, position, reference and alternate allele columns of a mutation file
+
+    Args:
+        filepath: Path to a .csv, .tsv or .maf file
+        columns: Chromosome, position, reference and alternate allele columns, in that order
+        chunksize: Rows per yielded DataFrame
+        processes: Worker processes parsing blocks of the file; 1 reads it in this process
+
+    Yields:
+        DataFrames with exactly the four given columns, in that order
+    """
+    dtypes = {column: str for column in columns}
+    dtypes[columns[1]] = "Int64"
+    options = {"usecols": list(dict.fromkeys(columns)), "dtype": dtypes,
+               "keep_default_na": False, "na_values": {columns[1]: [""]}}
+    if processes > 1:
+        for chunk in _iter_table_blocks(filepath, options, chunksize, processes):
+            yield chunk[columns]
+        return
+
+    reader = pd.read_csv(filepath, chunksize=chunksize, **options, **read_options(filepath))
+    with reader:
+        for chunk in reader:
+            yield chunk[columns]
@@ -0,0 +1,367 @@
+"""Self-proteome k-mer index for flagging peptides that are not foreign"""
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from seqdb import file_digest, source_unchanged
+from tiling import kmer_bounds
+
+SELF_INDEX_EXTENSION = ".selfkmers"
+
+DEFAULT_SELF_LENGTHS = tuple(range(8, 12))
+
+# 5 bits per residue in a 64-bit key
+MAX_KMER_LENGTH = 12
+
+BLOOM_BITS_PER_KEY = 12
+_BLOOM_HASHES = 6
+# Precomputed bit patterns a key's word mask is chosen from
+_BLOOM_PATTERNS = 1 << 16
+
+# Residues encoded per pass while building the index
+_BUILD_BATCH_RESIDUES = 1 << 23
+
+_MAGIC = b"MPKMERS\0"
+_VERSION = 1
+# magic, version, length count, Bloom words, source size, source mtime (ns), source SHA-256
+_HEADER = struct.Struct("<8sIIQQQ32s")
+# k, key count, key offset
+_LENGTH_ENTRY = struct.Struct("<IxxxxQQ")
+
+# Letters map to 1-26, anything else (separators, '*', '-') to 0, which no k-mer may contain
+_RESIDUE_CODES = np.zeros(256, dtype=np.uint64)
+_RESIDUE_CODES[np.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ", dtype=np.uint8)] = np.arange(1, 27)
+_RESIDUE_CODES[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz", dtype=np.uint8)] = np.arange(1, 27)
+
+_HASH_MULTIPLIER_1 = np.uint64(0x9E3779B97F4A7C15)
+_HASH_MULTIPLIER_2 = np.uint64(0xC2B2AE3D27D4EB4F)
+
+
+def encode_residues(data: bytes) -> np.ndarray:
+    """5-bit residue codes of ASCII sequence data"""
+    return _RESIDUE_CODES[np.frombuffer(data, dtype=np.uint8)]
+
+
+def kmer_keys(codes: np.ndarray, positions: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packed keys of the k-mers starting at ``positions`` of an encoded sequence
+
+    Returns:
+        (keys, valid) arrays; a k-mer holding a non-letter is not valid
+    """
+    keys = np.zeros(len(positions), dtype=np.uint64)
+    valid = np.ones(len(positions), dtype=bool)
+    five = np.uint64(5)
+    for offset in range(k):
+        residue = codes[positions + offset]
+        keys = (keys << five) | residue
+        valid &= residue != 0
+    return keys, valid
+
+
+def rolling_kmer_keys(codes: np.ndarray, lengths: Sequence[int]) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Packed keys of the k-mers at every position of an encoded sequence, for ascending lengths
+
+    Each length extends the previous one's keys in place by a residue, so
+    all the lengths cost little more than the shortest; use (or copy) each
+    ``keys`` array before advancing the iterator.
+
+    Yields:
+        (k, keys, valid) with one key per start position ``0 .. len(codes) - k``
+    """
+    lengths = sorted(lengths)
+    zeros = np.concatenate(([0], np.cumsum(codes == 0)))
+    five = np.uint64(5)
+    keys = codes.copy()
+    for k in range(1, lengths[-1] + 1):
+        if len(codes) < k:
+            return
+        if k > 1:
+            keys = keys[:-1]
+            keys <<= five
+            keys |= codes[k - 1:]
+        if k in lengths:
+            yield k, keys, zeros[k:] == zeros[:-k]
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """Scramble 64-bit values (wrapping multiply and xor-shift)"""
+    with np.errstate(over="ignore"):
+        mixed = values * _HASH_MULTIPLIER_1
+    mixed ^= mixed >> np.uint64(29)
+    with np.errstate(over="ignore"):
+        mixed *= _HASH_MULTIPLIER_2
+    mixed ^= mixed >> np.uint64(32)
+    return mixed
+
+
+def _bloom_pattern_table() -> np.ndarray:
+    """Bit masks with ``_BLOOM_HASHES`` pseudo-random bits each, indexed by 16 hash bits"""
+    bits = _mix(np.arange(_BLOOM_PATTERNS * _BLOOM_HASHES, dtype=np.uint64)) >> np.uint64(58)
+    masks = np.left_shift(np.uint64(1), bits).reshape(_BLOOM_PATTERNS, _BLOOM_HASHES)
+    return np.bitwise_or.reduce(masks, axis=1)
+
+
+_BLOOM_PATTERN_TABLE = _bloom_pattern_table()
+
+
+def _bloom_probes(keys: np.ndarray, words: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Bloom word index and bit mask of each key"""
+    hashed = _mix(keys)
+    # Low bits pick the bit pattern from the table, high bits the word
+    mask = _BLOOM_PATTERN_TABLE[(hashed & np.uint64(_BLOOM_PATTERNS - 1)).astype(np.intp)]
+    hashed >>= np.uint64(32)
+    hashed &= np.uint64(words - 1)
+    return hashed.astype(np.intp), mask
+
+
+def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+    """Sorted distinct keys (a plain sort is much faster than ``np.unique`` on large uint64 arrays)"""
+    keys = np.sort(keys)
+    if len(keys):
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return keys
+
+
+def _validate_lengths(lengths: Sequence[int]) -> Tuple[int, ...]:
+    lengths = tuple(sorted(set(lengths)))
+    if not lengths or lengths[0] < 1 or lengths[-1] > MAX_KMER_LENGTH:
+        raise ValueError(f"Self k-mer lengths must be between 1 and {MAX_KMER_LENGTH}, got {lengths}")
+    return lengths
+
+
+def build_self_index(sequences: Iterable[str], index_path: str,
+                     lengths: Sequence[int] = DEFAULT_SELF_LENGTHS,
+                     source_path: Optional[str] = None) -> Dict[int, int]:
+    """
+    Write the k-mer index of a set of protein sequences
+
+    Args:
+        sequences: Protein sequences (e.g. ``sequence_db.values()``)
+        index_path: Destination ``.selfkmers`` file
+        lengths: k-mer lengths to index
+        source_path: Database file the sequences came from, recorded so
+            ``open_self_index`` can tell when it changes
+
+    Returns:
+        Number of distinct k-mers per length
+    """
+    lengths = _validate_lengths(lengths)
+    batches: Dict[int, List[np.ndarray]] = {k: [] for k in lengths}
+
+    def index_batch(batch: List[str]) -> None:
+        # Separators encode to 0, so no k-mer spans two sequences
+        codes = encode_residues("\0".join(batch).encode("ascii", "replace"))
+        for k, keys, valid in rolling_kmer_keys(codes, lengths):
+            batches[k].append(_sorted_unique(keys[valid]))
+
+    batch: List[str] = []
+    residues = 0
+    for sequence in sequences:
+        batch.append(sequence)
+        residues += len(sequence) + 1
+        if residues >= _BUILD_BATCH_RESIDUES:
+            index_batch(batch)
+            batch, residues = [], 0
+    if batch:
+        index_batch(batch)
+
+    keys_by_length = {k: _sorted_unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.uint64)
+                      for k, parts in batches.items()}
+    total = sum(len(keys) for keys in keys_by_length.values())
+    words = 1
+    while words * 64 < total * BLOOM_BITS_PER_KEY:
+        words *= 2
+    bloom = np.zeros(words, dtype=np.uint64)
+    for keys in keys_by_length.values():
+        word, mask = _bloom_probes(keys, words)
+        np.bitwise_or.at(bloom, word, mask)
+
+    if source_path:
+        source = os.stat(source_path)
+        source_size, source_mtime_ns, source_digest = source.st_size, source.st_mtime_ns, file_digest(source_path)
+    else:
+        source_size, source_mtime_ns, source_digest = 0, 0, b"\0" * 32
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(_HEADER.pack(_MAGIC, _VERSION, len(lengths), words,
+                               source_size, source_mtime_ns, source_digest))
+        # The tables are 8-byte aligned, so every array can be viewed in place
+        offset = _HEADER.size + _LENGTH_ENTRY.size * len(lengths) + words * 8
+        for k in lengths:
+            out.write(_LENGTH_ENTRY.pack(k, len(keys_by_length[k]), offset))
+            offset += len(keys_by_length[k]) * 8
+        out.write(bloom.astype("<u8").tobytes())
+        for k in lengths:
+            out.write(keys_by_length[k].astype("<u8").tobytes())
+    os.replace(tmp_path, index_path)
+    return {k: len(keys) for k, keys in keys_by_length.items()}
+
+
+class SelfKmerIndex:
+    """
+    Membership of k-mers in the self proteome, backed by a memory-mapped ``.selfkmers`` file
+
+    Pickling an instance only sends the file path.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a k-mer index
+
+        Args:
+            path: Path to a ``.selfkmers`` file created by ``build_self_index``
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a MutPepGen k-mer index")
+        magic, version, length_count, words, source_size, source_mtime_ns, source_digest = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a MutPepGen k-mer index (version {_VERSION})")
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.source_digest = source_digest
+
+        self._words = words
+        self._bloom = np.frombuffer(self._mmap, dtype="<u8", count=words,
+                                    offset=_HEADER.size + _LENGTH_ENTRY.size * length_count)
+        self._keys: Dict[int, np.ndarray] = {}
+        for i in range(length_count):
+            k, count, offset = _LENGTH_ENTRY.unpack_from(self._mmap, _HEADER.size + _LENGTH_ENTRY.size * i)
+            self._keys[k] = np.frombuffer(self._mmap, dtype="<u8", count=count, offset=offset)
+        self.lengths = tuple(sorted(self._keys))
+
+    def __reduce__(self):
+        return (SelfKmerIndex, (self.path,))
+
+    def __contains__(self, kmer: str) -> bool:
+        return bool(self.find([kmer])[0])
+
+    def counts(self) -> Dict[int, int]:
+        """Distinct k-mers per length"""
+        return {k: len(keys) for k, keys in self._keys.items()}
+
+    def contains_keys(self, keys: np.ndarray, k: int) -> np.ndarray:
+        """
+        Which packed k-mer keys (see ``kmer_keys``) of length ``k`` are in the proteome
+
+        Raises:
+            KeyError: ``k`` is not an indexed length
+        """
+        sorted_keys = self._keys[k]
+        word, mask = _bloom_probes(keys, self._words)
+        found = (self._bloom[word] & mask) == mask
+        candidates = np.flatnonzero(found)
+        if len(candidates) and len(sorted_keys):
+            slots = np.searchsorted(sorted_keys, keys[candidates])
+            slots[slots == len(sorted_keys)] = 0
+            found[candidates] = sorted_keys[slots] == keys[candidates]
+        else:
+            found[:] = False
+        return found
+
+    def find(self, kmers: Sequence[str]) -> np.ndarray:
+        """Which k-mers are in the proteome; k-mers of lengths that are not indexed are not"""
+        found = np.zeros(len(kmers), dtype=bool)
+        if not len(kmers):
+            return found
+        encoded = [kmer.encode("ascii", "replace") if isinstance(kmer, str) else kmer for kmer in kmers]
+        kmer_lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        codes = encode_residues(b"".join(encoded))
+        starts = np.cumsum(kmer_lengths) - kmer_lengths
+        for k in self.lengths:
+            rows = np.flatnonzero(kmer_lengths == k)
+            if len(rows):
+                keys, valid = kmer_keys(codes, starts[rows], k)
+                found[rows] = valid & self.contains_keys(keys, k)
+        return found
+
+    def matches_source(self, path: str) -> bool:
+        """Check whether this index was built from the current contents of ``path``"""
+        return source_unchanged(path, self.source_size, self.source_mtime_ns, self.source_digest)
+
+    def close(self) -> None:
+        # Drop every view into the map before closing it
+        self._bloom = None
+        self._keys = {}
+        self._mmap.close()
+
+
+def self_kmer_counts(index: SelfKmerIndex, peptides: Sequence[str], span_starts, span_ends) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Count the mutant k-mers of many peptides and how many of them are self
+
+    Args:
+        index: k-mer index of the self proteome
+        peptides: Mutant peptides
+        span_starts: Index of the first mutant residue in each peptide
+        span_ends: Index after the last mutant residue (see ``tiling.kmer_bounds``)
+
+    Returns:
+        (self k-mers, mutant k-mers) per peptide, over the indexed lengths
+    """
+    count = len(peptides)
+    if not count:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    peptide_lengths = np.fromiter(map(len, peptides), dtype=np.int64, count=count)
+    codes = encode_residues("\0".join(peptides).encode("ascii", "replace"))
+    bases = np.cumsum(peptide_lengths + 1) - (peptide_lengths + 1)
+
+    rows, starts, lengths = kmer_bounds(peptide_lengths, span_starts, span_ends, index.lengths)
+    positions = bases[rows] + starts
+    found = np.zeros(len(rows), dtype=bool)
+    for k, keys, valid in rolling_kmer_keys(codes, index.lengths):
+        selected = np.flatnonzero(lengths == k)
+        if len(selected):
+            at = positions[selected]
+            found[selected] = valid[at] & index.contains_keys(keys[at], k)
+    return (np.bincount(rows[found], minlength=count),
+            np.bincount(rows, minlength=count))
+
+
+def self_index_path_for(database_path: str) -> str:
+    """Location of the k-mer index for a sequence database (alongside it)"""
+    return database_path + SELF_INDEX_EXTENSION
+
+
+def open_self_index(database_path: str, sequence_db: Mapping[str, str],
+                    lengths: Sequence[int] = DEFAULT_SELF_LENGTHS,
+                    index_path: Optional[str] = None) -> SelfKmerIndex:
+    """
+    Open the k-mer index of a sequence database, building it if it is missing or stale
+
+    Args:
+        database_path: FASTA or ``.mpdb`` file ``sequence_db`` was loaded from
+        sequence_db: The loaded ENST -> sequence mapping
+        lengths: k-mer lengths to index
+        index_path: Where to keep the index (default: ``<database_path>.selfkmers``)
+
+    Raises:
+        OSError: The index could not be written
+        ValueError: A length is outside 1 to ``MAX_KMER_LENGTH``
+    """
+    lengths = _validate_lengths(lengths)
+    index_path = index_path if index_path else self_index_path_for(database_path)
+    if os.path.exists(index_path):
+        try:
+            index = SelfKmerIndex(index_path)
+        except ValueError:
+            index = None
+        if index is not None:
+            if index.lengths == lengths and index.matches_source(database_path):
+                return index
+            index.close()
+
+    build_self_index(sequence_db.values(), index_path, lengths, source_path=database_path)
+    return SelfKmerIndex(index_path)
@@ -0,0 +1,393 @@
+"""
+Indexed, memory-mapped protein sequence database (``.mpdb``)
+
+Build an index from the command line::
+
+    python mutpepgen/seqdb.py database/ensembl_sequences.fasta database/ensembl_sequences.mpdb
+"""
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+
+import numpy as np
+
+from blocks import map_blocks, read_block
+
+INDEX_EXTENSION = ".mpdb"
+
+# FASTA header field listing the other IDs that share a record's sequence
+ALIAS_PREFIX = "aliases="
+
+_GENE_SYMBOL_PATTERN = re.compile(r"\bgene_symbol:(\S+)")
+_GENE_ID_PATTERN = re.compile(r"\bgene:(ENSG\d+)")
+# Ensembl transcript names, e.g. BRAF-001 or BRAF-201
+_TRANSCRIPT_NAME_PATTERN = re.compile(r"^(\S+)-\d{3}$")
+
+_MAGIC = b"MPSEQDB\0"
+_VERSION = 3
+# magic, version, id width, count, residues offset, index offset,
+# source size, source mtime (ns), source SHA-256, gene count, gene width, genes offset
+_HEADER = struct.Struct("<8sIIQQQQQ32sQQQ")
+
+
+def file_digest(path: str) -> bytes:
+    """SHA-256 of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def source_unchanged(path: str, size: int, mtime_ns: int, digest: bytes) -> bool:
+    """Whether a file still has the size and mtime, or failing the mtime the SHA-256, recorded from it"""
+    try:
+        source = os.stat(path)
+    except OSError:
+        return False
+    if source.st_size != size:
+        return False
+    if source.st_mtime_ns == mtime_ns:
+        return True
+    return file_digest(path) == digest
+
+
+def cache_path_for(fasta_path: str) -> str:
+    """Location of the cached index for a FASTA file (alongside it)"""
+    return fasta_path + INDEX_EXTENSION
+
+
+def header_aliases(description: str) -> List[str]:
+    """IDs listed in the ``aliases=ID1,ID2`` field of a FASTA header (after the record ID)"""
+    for word in description.split():
+        if word.startswith(ALIAS_PREFIX):
+            return [alias for alias in word[len(ALIAS_PREFIX):].split(",") if alias]
+    return []
+
+
+def header_gene(description: str) -> Optional[str]:
+    """Gene symbol or ENSG ID in a FASTA header (after the record ID), or None"""
+    match = _GENE_SYMBOL_PATTERN.search(description) or _GENE_ID_PATTERN.search(description)
+    if match:
+        return match.group(1)
+    for word in description.split():
+        match = _TRANSCRIPT_NAME_PATTERN.match(word)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _parse_fasta(lines: Iterable[str], genes: Optional[Dict[str, str]] = None) -> Iterator[Tuple[List[str], str]]:
+    """
+    (record IDs, sequence) pairs from FASTA lines; lines before the first header are ignored
+
+    ``genes``, when given, receives the unversioned record ID -> gene of each
+    header that names one (see ``header_gene``).
+    """
+    record_ids: Optional[List[str]] = None
+    parts: List[str] = []
+    for line in lines:
+        if line.startswith(">"):
+            if record_ids is not None:
+                yield record_ids, "".join(parts)
+            words = line[1:].split(None, 1)
+            record_ids = [words[0] if words else ""]
+            if len(words) > 1:
+                if ALIAS_PREFIX in words[1]:
+                    record_ids.extend(header_aliases(words[1]))
+                if genes is not None:
+                    gene = header_gene(words[1])
+                    if gene is not None:
+                        genes[record_ids[0].split('.')[0]] = gene
+            parts = []
+        elif record_ids is not None:
+            parts.append(line.strip().replace(" ", ""))
+    if record_ids is not None:
+        yield record_ids, "".join(parts)
+
+
+def _read_fasta_block(fasta_path: str, begin: int, end: int,
+                      with_genes: bool) -> Tuple[List[Tuple[List[str], str]], Optional[Dict[str, str]]]:
+    """Parse the records (and, if asked, the genes) of one ``>``-aligned byte block of a FASTA file"""
+    genes = {} if with_genes else None
+    # latin-1 decodes any header byte; split on newlines only, like iterating a file
+    records = list(_parse_fasta(read_block(fasta_path, begin, end).decode('latin-1').split('\n'), genes))
+    return records, genes
+
+
+def iter_fasta_records(fasta_path: str, processes: int = 1,
+                       genes: Optional[Dict[str, str]] = None) -> Iterator[Tuple[List[str], str]]:
+    """
+    Stream (record IDs, sequence) pairs from a FASTA file
+
+    The IDs are the first word of the header line, as in Bio.SeqIO,
+    followed by its ``aliases=`` IDs, if any.
+
+    Args:
+        fasta_path: FASTA file
+        processes: Worker processes parsing ``>``-aligned blocks of the file;
+            records still come in file order
+        genes: Optional dictionary that receives the unversioned record ID ->
+            gene of each header naming one, in file order, as records are read
+    """
+    if processes > 1:
+        for records, block_genes in map_blocks(_read_fasta_block, fasta_path, processes, genes is not None,
+                                               marker=b">"):
+            if genes is not None:
+                genes.update(block_genes)
+            yield from records
+        return
+
+    with open(fasta_path, 'r', encoding='latin-1') as f:
+        yield from _parse_fasta(f, genes)
+
+
+def iter_fasta(fasta_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (record ID, sequence) pairs from a FASTA file
+
+    The record ID is the first word of the header line, as in Bio.SeqIO.
+    """
+    for record_ids, sequence in iter_fasta_records(fasta_path):
+        yield record_ids[0], sequence
+
+
+def write_index(index_path: str, records: Iterable[Tuple[Sequence[str], str]],
+                source_path: Optional[str] = None, genes: Optional[Dict[str, str]] = None) -> int:
+    """
+    Write an indexed ``.mpdb`` sequence database
+
+    Each sequence is written once and all of its IDs point at it.
+
+    Args:
+        index_path: Destination ``.mpdb`` file
+        records: (IDs, sequence) pairs
+        source_path: File the records came from; its size, mtime and SHA-256
+            are recorded so ``open_cached`` can tell when it changed
+        genes: Unversioned ID -> gene assignments for the isoform fallback;
+            read once ``records`` is exhausted, so it may be filled while they stream
+
+    Returns:
+        Number of IDs written
+    """
+    ids: List[bytes] = []
+    offsets: List[int] = []
+    lengths: List[int] = []
+
+    if source_path:
+        source = os.stat(source_path)
+        source_size, source_mtime_ns, source_digest = source.st_size, source.st_mtime_ns, file_digest(source_path)
+    else:
+        source_size, source_mtime_ns, source_digest = 0, 0, b"\0" * 32
+
+    # Per-process temporary name so concurrent builders never clash
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as out:
+            out.write(b"\0" * _HEADER.size)
+            residues_offset = out.tell()
+            position = 0
+            for record_ids, sequence in records:
+                try:
+                    data = sequence.encode('ascii')
+                    record_keys = [record_id.split('.')[0].encode('ascii') for record_id in record_ids]
+                except UnicodeEncodeError:
+                    raise ValueError(f"Record {record_ids[0]} has a non-ASCII ID or residue") from None
+                for key in record_keys:
+                    ids.append(key)
+                    offsets.append(position)
+                    lengths.append(len(data))
+                out.write(data)
+                position += len(data)
+
+            # Align the index so the numeric arrays can be viewed in place
+            out.write(b"\0" * (-out.tell() % 8))
+            index_offset = out.tell()
+            id_width = max((len(i) for i in ids), default=1)
+            id_width += -id_width % 8
+            out.write(np.array(ids, dtype=f"S{id_width}").tobytes())
+            out.write(np.array(offsets, dtype="<u8").tobytes())
+            out.write(np.array(lengths, dtype="<u8").tobytes())
+
+            # Gene assignments: ID and gene name arrays
+            genes = genes or {}
+            out.write(b"\0" * (-out.tell() % 8))
+            genes_offset = out.tell()
+            gene_names = [gene.encode('latin-1') for gene in genes.values()]
+            gene_width = max((len(gene) for gene in gene_names), default=1)
+            gene_width += -gene_width % 8
+            out.write(np.array([enst_id.encode('ascii') for enst_id in genes], dtype=f"S{id_width}").tobytes())
+            out.write(np.array(gene_names, dtype=f"S{gene_width}").tobytes())
+
+            out.seek(0)
+            out.write(_HEADER.pack(_MAGIC, _VERSION, id_width, len(ids), residues_offset, index_offset,
+                                   source_size, source_mtime_ns, source_digest, len(genes), gene_width, genes_offset))
+
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        # Leave no partial index behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(ids)
+
+
+def build_index(fasta_path: str, index_path: str, processes: int = 1) -> int:
+    """
+    Convert a FASTA file into an indexed ``.mpdb`` sequence database
+
+    The gene named by each header is stored with it (see ``IndexedSequenceDB.genes``).
+
+    Args:
+        fasta_path: Source FASTA of ENST protein sequences
+        index_path: Destination ``.mpdb`` file
+        processes: Worker processes parsing the FASTA
+
+    Returns:
+        Number of IDs written
+    """
+    genes: Dict[str, str] = {}
+    return write_index(index_path, iter_fasta_records(fasta_path, processes, genes), source_path=fasta_path,
+                       genes=genes)
+
+
+class IndexedSequenceDB(Mapping):
+    """
+    Read-only ENST -> sequence mapping backed by a memory-mapped ``.mpdb`` file
+
+    Pickling an instance only sends the file path.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open an indexed sequence database
+
+        Args:
+            path: Path to a ``.mpdb`` file created by ``build_index``
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a MutPepGen sequence index")
+        magic, version = struct.unpack_from("<8sI", self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a MutPepGen sequence index (version {_VERSION})")
+        (_, _, id_width, count, residues_offset, index_offset, source_size, source_mtime_ns, source_digest,
+         self._gene_count, self._gene_width, self._genes_offset) = _HEADER.unpack_from(self._mmap, 0)
+        self._id_width = id_width
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.source_digest = source_digest
+
+        self._buffer = memoryview(self._mmap)
+        self._residues_offset = residues_offset
+        ids = np.frombuffer(self._mmap, dtype=f"S{id_width}", count=count, offset=index_offset)
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=count, offset=index_offset + id_width * count)
+        self._lengths = np.frombuffer(self._mmap, dtype="<u8", count=count,
+                                      offset=index_offset + (id_width + 8) * count)
+        # Later duplicates win, as with the dict loader
+        self._slots: Dict[str, int] = {enst_id.decode('ascii'): i for i, enst_id in enumerate(ids)}
+
+    def __reduce__(self):
+        return (IndexedSequenceDB, (self.path,))
+
+    def __contains__(self, enst_id) -> bool:
+        return enst_id in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._slots)
+
+    def __getitem__(self, enst_id: str) -> str:
+        return bytes(self.window(enst_id, 0, self.length(enst_id))).decode('ascii')
+
+    def length(self, enst_id: str) -> int:
+        """Sequence length without reading any residues"""
+        return int(self._lengths[self._slots[enst_id]])
+
+    def window(self, enst_id: str, start: int, end: int) -> memoryview:
+        """
+        Zero-copy view of residues ``start:end`` of one sequence
+
+        Raises:
+            KeyError: The transcript is not in the database
+        """
+        slot = self._slots[enst_id]
+        length = int(self._lengths[slot])
+        start = max(0, min(start, length))
+        end = max(start, min(end, length))
+        base = self._residues_offset + int(self._offsets[slot])
+        return self._buffer[base + start:base + end]
+
+    def genes(self) -> List[Tuple[str, str]]:
+        """(unversioned ID, gene) pairs stored by ``build_index``, in FASTA order"""
+        count = self._gene_count
+        ids = np.frombuffer(self._mmap, dtype=f"S{self._id_width}", count=count, offset=self._genes_offset)
+        genes = np.frombuffer(self._mmap, dtype=f"S{self._gene_width}", count=count,
+                              offset=self._genes_offset + self._id_width * count)
+        return [(enst_id.decode('ascii'), gene.decode('latin-1')) for enst_id, gene in zip(ids.tolist(), genes.tolist())]
+
+    def matches_source(self, fasta_path: str) -> bool:
+        """
+        Check whether this index was built from the current ``fasta_path``
+
+        Size and mtime are compared first; the SHA-256 is only computed when
+        the size matches but the mtime moved (e.g. after a copy or touch).
+        """
+        return source_unchanged(fasta_path, self.source_size, self.source_mtime_ns, self.source_digest)
+
+    def close(self) -> None:
+        # Drop every view into the map before closing it
+        self._offsets = self._lengths = None
+        self._buffer.release()
+        self._mmap.close()
+
+
+def open_cached(fasta_path: str, cache_path: str = None, processes: int = 1) -> IndexedSequenceDB:
+    """
+    Open the cached index for a FASTA file, rebuilding it if it is missing or stale
+
+    Args:
+        fasta_path: Source FASTA of ENST protein sequences
+        cache_path: Where to keep the index (default: ``<fasta_path>.mpdb``)
+        processes: Worker processes parsing the FASTA when the index is rebuilt
+
+    Returns:
+        IndexedSequenceDB for the current contents of the FASTA
+
+    Raises:
+        OSError: The cache could not be written (e.g. read-only directory)
+        ValueError: A record ID or residue is not ASCII
+    """
+    cache_path = cache_path if cache_path else cache_path_for(fasta_path)
+    if os.path.exists(cache_path):
+        try:
+            db = IndexedSequenceDB(cache_path)
+        except ValueError:
+            db = None
+        if db is not None:
+            if db.matches_source(fasta_path):
+                return db
+            db.close()
+
+    build_index(fasta_path, cache_path, processes)
+    return IndexedSequenceDB(cache_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"Usage: {sys.argv[0]} <input.fasta> <output{INDEX_EXTENSION}>")
+        sys.exit(2)
+    count = build_index(sys.argv[1], sys.argv[2])
+    print(f"Indexed {count} IDs into {sys.argv[2]}")
@@ -0,0 +1,130 @@
+"""Multi-length k-mer tiling of mutant peptides"""
+from typing import Iterator, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_TILE_LENGTHS = tuple(range(8, 16))
+
+TILES_FILENAME = "mutation_tiles.fasta"
+
+
+class Tile(NamedTuple):
+    """One k-mer cut from a mutant peptide"""
+    start: int                  # 0-based index in the record's peptide
+    length: int
+    peptide: bytes
+    wildtype: Optional[bytes]   # reference k-mer at the same place, when paired
+
+
+def parse_tile_lengths(text: str) -> Tuple[int, ...]:
+    """
+    Parse a tile length list such as ``8-11`` or ``8,9,10,15``
+
+    Raises:
+        ValueError: The list is empty or holds a length below 1
+    """
+    lengths = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            low, high = (int(bound) for bound in part.split("-", 1))
+            lengths.update(range(low, high + 1))
+        else:
+            lengths.add(int(part))
+    if not lengths or min(lengths) < 1:
+        raise ValueError(f"Invalid tile lengths {text!r}")
+    return tuple(sorted(lengths))
+
+
+def kmer_bounds(peptide_lengths, span_starts, span_ends,
+                lengths: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The k-mers that contain the mutant span of each of many peptides
+
+    Args:
+        peptide_lengths: Length of each mutant peptide
+        span_starts: Index of the first mutant residue in each peptide
+        span_ends: Index after the last mutant residue; equal to the start
+            for a deletion, whose k-mers must span the junction instead
+        lengths: k-mer lengths
+
+    Returns:
+        (peptide indices, starts, lengths) arrays, ordered by peptide, length and start
+    """
+    peptide_lengths = np.asarray(peptide_lengths, dtype=np.int64)[:, None]
+    span_starts = np.asarray(span_starts, dtype=np.int64)[:, None]
+    span_ends = np.asarray(span_ends, dtype=np.int64)[:, None]
+    k = np.asarray(lengths, dtype=np.int64)[None, :]
+
+    # Ends past the first mutant residue and starts before the last one; an
+    # empty span turns these into "both sides of the junction"
+    lo = np.maximum(0, span_starts + 1 - k)
+    hi = np.minimum(span_ends - 1, peptide_lengths - k)
+    counts = np.maximum(0, hi - lo + 1).ravel()
+    peptides = np.repeat(np.arange(len(peptide_lengths)), k.shape[1])
+    # Start offsets within each (peptide, length) run, added to its lowest start
+    runs = np.cumsum(counts) - counts
+    starts = np.arange(counts.sum()) - np.repeat(runs, counts) + np.repeat(lo.ravel(), counts)
+    return (np.repeat(peptides, counts), starts,
+            np.repeat(np.broadcast_to(k, lo.shape).ravel(), counts))
+
+
+def tile_bounds(peptide_length: int, span_start: int, span_end: int,
+                lengths: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start positions and lengths of the k-mers that contain one peptide's mutant span
+
+    Returns:
+        (starts, lengths) arrays, ordered by length then start (see ``kmer_bounds``)
+    """
+    _, starts, tile_lengths = kmer_bounds([peptide_length], [span_start], [span_end], lengths)
+    return starts, tile_lengths
+
+
+def mutant_span(record) -> Tuple[int, int]:
+    """Start and end of the mutant residues of a PeptideRecord within its peptide"""
+    return record.mutant_offset, record.mutant_offset + len(record.mutant_aa.rstrip("*"))
+
+
+def tile_record(record, lengths: Sequence[int], wildtype: bool = False) -> Iterator[Tile]:
+    """
+    Cut the mutant k-mers of one PeptideRecord
+
+    Args:
+        record: PeptideRecord, whose ``mutant_offset`` locates the change in its peptide
+        lengths: k-mer lengths
+        wildtype: Pair each k-mer with its reference k-mer when the change keeps the length
+    """
+    peptide = record.peptide.encode("ascii")
+    span_start, span_end = mutant_span(record)
+    starts, tile_lengths = tile_bounds(len(peptide), span_start, span_end, lengths)
+
+    reference = None
+    if wildtype and span_end > span_start and len(record.original_aa) == span_end - span_start:
+        reference = peptide[:span_start] + record.original_aa.encode("ascii") + peptide[span_end:]
+
+    for start, length in zip(starts.tolist(), tile_lengths.tolist()):
+        yield Tile(start, length, peptide[start:start + length],
+                   reference[start:start + length] if reference is not None else None)
+
+
+def tiles_to_fasta(record, tiles: Sequence[Tile], self_tiles: Optional[Sequence[bool]] = None) -> str:
+    """
+    FASTA entries for the tiles of one record; wild-type k-mers follow their mutant k-mer
+
+    Args:
+        record: PeptideRecord the tiles were cut from
+        tiles: Its tiles
+        self_tiles: Whether each tile occurs in the self proteome; those get a ``|self`` tag
+    """
+    lines = []
+    prefix = f">{record.transcript_id}|{record.mutation}|pos:{record.position}"
+    for i, tile in enumerate(tiles):
+        location = f"len:{tile.length}|start:{tile.start + 1}"
+        tag = "|self" if self_tiles is not None and self_tiles[i] else ""
+        lines.append(f"{prefix}|{location}{tag}|mutant\n{tile.peptide.decode('ascii')}\n")
+        if tile.wildtype is not None:
+            lines.append(f"{prefix}|{location}|wildtype\n{tile.wildtype.decode('ascii')}\n")
+    return "".join(lines)
@@ -1,32 +1,36 @@
+from collections.abc import Mapping
+from itertools import groupby
+from datetime import datetime
 from typing import List, Tuple, Dict, Set
 import logging
-from models.utils import dTime
+import numpy as np
 import pandas as pd
 import re
 import os
 
+try:
+    from models.utils import dTime
+except ImportError:
+    # models is not part of this tree; stamp log file names with the local time
+    def dTime() -> str:
+        return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+from blocks import block_range
+from metrics import COUNTERS, MetricsRegistry
+from seqdb import ALIAS_PREFIX, write_index
+
 logger = logging.getLogger(__name__)
-# Constants
-INIT_VARIABLES: Dict[str, int] = {
-    'MAIN_counter': 0,
-    'FILE_ERROR_counter': 0,
-    'FILE_SUCCESS_counter': 0,
-    'TRANSCRIPT_FOUND_counter': 0,
-    'TRANSCRIPT_NOT_FOUND_counter': 0,
-    'SUBSTITUTION_FOUND_counter': 0,
-    'SUBSTITUTION_NOT_FOUND_counter': 0,
-    'SUBSTITUTION_SUCCESS_counter': 0,
-    'SUBSTITUTION_ERROR_counter': 0,
-    'POSITION_FOUND_counter': 0,    
-    'POSITION_2ND_ATTEMPT_FOUND_counter': 0,
-    'POSITION_3RD_ATTEMPT_FOUND_counter': 0,
-    'POSITION_NOT_FOUND_counter': 0,
-    'UNIPROTtoGRch38_NOT_FOUND_counter': 0,
-    'MULTI_SEQ_FOUND_counter': 0,
-    'MULTI_SEQ_POSITION_FOUND_counter': 0,
-    'SUBSTITUTION_FOUND_2ND_ATTEMPT_counter': 0,
-    'SUBSTITUTION_FOUND_3RD_ATTEMPT_counter': 0,
-}
+
+# Unversioned ENST ID in group 1; the whole match keeps the version
+_ENST_PATTERN = re.compile(r'(ENST\d+)(?:\.\d+)?')
+# Rows read to detect the Ensembl ID and sequence columns
+DETECTION_ROWS = 100
+# Rows per chunk when converting a UniProt export to FASTA
+CONVERT_CHUNK_ROWS = 20000
+# Compression suffixes pandas recognises, stripped before looking at the table extension
+COMPRESSION_EXTENSIONS = ['.gz', '.bz2', '.xz', '.zip', '.zst']
+# Pipeline counters; MetricsRegistry tracks and exports them
+INIT_VARIABLES: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
 
 class Files_Manager:
     def __init__(self):
@@ -35,28 +39,16 @@ class Files_Manager:
         return self.file
     #https://stackoverflow.com/questions/40745686/python-process-file-using-multiple-cores
     @staticmethod
-    def file_block(fp, number_of_blocks, block):
+    def file_block(fp, number_of_blocks, block, marker=None):
         '''
         A generator that splits a file into blocks and iterates
         over the lines of one of the blocks.
 
+        Blocks start on a line boundary, or on a line starting with ``marker``.
         '''
 
-        assert 0 <= block and block < number_of_blocks
-        assert 0 < number_of_blocks
-
-        fp.seek(0,2)
-        file_size = fp.tell()
-
-        ini = file_size * block / number_of_blocks
-        end = file_size * (1 + block) / number_of_blocks
-
-        if ini <= 0:
-            fp.seek(0)
-        else:
-            fp.seek(ini-1)
-            fp.readline()
-
+        begin, end = block_range(fp, number_of_blocks, block, marker=marker)
+        fp.seek(begin)
         while fp.tell() < end:
             yield fp.readline()
             
@@ -112,6 +104,31 @@ class logs:
     def _add_debug(self, debug):
         logging.debug(debug)
 
+class SharedSequences(Mapping):
+    """
+    Read-only ENST -> sequence view over a UniProtParser's sequence table
+    
+    Every ENST ID of a UniProt entry maps to the same table slot, so a
+    protein listed for many isoforms is held once.
+    """
+    
+    def __init__(self, table, slots):
+        self._table = table
+        self._slots = slots
+    
+    def __getitem__(self, enst_id):
+        return self._table[self._slots[enst_id]]
+    
+    def __iter__(self):
+        return iter(self._slots)
+    
+    def __len__(self):
+        return len(self._slots)
+    
+    def __contains__(self, enst_id):
+        return enst_id in self._slots
+
+
 class UniProtParser:
     """
     Parser for UniProt database format to extract Ensembl transcript IDs
@@ -125,9 +142,19 @@ class UniProtParser:
         Args:
             log_callback: Function to call for logging messages
         """
-        self.sequences = {}
+        # Each unique sequence once, and the table slot of every ENST ID
+        self.sequence_table: List[str] = []
+        self.sequence_slots: Dict[str, int] = {}
+        self._slot_of: Dict[str, int] = {}
+        # UNIPROT_NO_ENST_counter: entries with a sequence but no ENST ID
+        self.metrics = MetricsRegistry()
         self.log = log_callback if log_callback else print
     
+    @property
+    def sequences(self):
+        """ENST ID -> sequence mapping (a view over the shared sequence table)"""
+        return SharedSequences(self.sequence_table, self.sequence_slots)
+    
     def parse_file(self, file_path):
         """
         Parse a UniProt format file and extract Ensembl IDs and sequences
@@ -141,72 +168,22 @@ class UniProtParser:
         self.log(f"Parsing UniProt format file: {file_path}")
         
         try:
-            # Determine delimiter based on file extension
-            file_ext = os.path.splitext(file_path)[1].lower()
-            if file_ext in ['.tsv', '.txt']:
-                delimiter = '\t'
-            else:  # .csv
-                delimiter = ','
-            
-            # Read the file
-            df = pd.read_csv(file_path, delimiter=delimiter, low_memory=False)
-            
-            # First, identify the relevant columns
-            ensembl_col = self._find_ensembl_column(df)
-            sequence_col = self._find_sequence_column(df)
-            
-            if not ensembl_col:
-                # Look for a column containing Ensembl IDs in the data
-                for col in df.columns:
-                    sample = df[col].dropna().astype(str).head(10)
-                    if any('ENST' in str(val) for val in sample):
-                        ensembl_col = col
-                        break
+            delimiter = self._delimiter(file_path)
             
+            # Detect the columns on a sample, then read only those two
+            sample = pd.read_csv(file_path, delimiter=delimiter, nrows=DETECTION_ROWS, dtype=str)
+            ensembl_col, sequence_col = self._detect_columns(sample)
             if not ensembl_col:
                 self.log("No column containing Ensembl IDs found")
                 return self.sequences
-            
-            if not sequence_col:
-                # Try to find the sequence column by checking for long string content
-                for col in df.columns:
-                    if col != ensembl_col:  # Skip the Ensembl column
-                        sample = df[col].dropna().astype(str).head(5)
-                        if any(len(str(val)) > 50 and self._is_likely_protein_sequence(str(val)) for val in sample):
-                            sequence_col = col
-                            break
-            
             if not sequence_col:
                 self.log("No sequence column found")
                 return self.sequences
             
             self.log(f"Using column '{ensembl_col}' for Ensembl IDs and '{sequence_col}' for sequences")
             
-            # Process each row
-            count = 0
-            for idx, row in df.iterrows():
-                if pd.isna(row[ensembl_col]) or pd.isna(row[sequence_col]):
-                    continue
-                
-                # Get the sequence
-                sequence = str(row[sequence_col]).strip()
-                
-                # Parse Ensembl IDs from the Ensembl column
-                ensembl_text = str(row[ensembl_col])
-                
-                # For UniProt format, Ensembl IDs are often in quotes and semicolon-separated
-                # Example: "ENST00000436697.3; ENSP00000484893.1; ENSG00000225973.4.";"ENST00000567948.1; ...
-                
-                # Extract all ENST IDs
-                enst_ids = self._extract_all_enst_ids(ensembl_text)
-                
-                if enst_ids:
-                    for enst_id in enst_ids:
-                        # Remove version number if present
-                        if "." in enst_id:
-                            enst_id = enst_id.split(".")[0]
-                        self.sequences[enst_id] = sequence
-                        count += 1
+            df = pd.read_csv(file_path, delimiter=delimiter, usecols=[ensembl_col, sequence_col], dtype=str)
+            count = self._add_sequences(df[ensembl_col], df[sequence_col])
             
             self.log(f"Successfully mapped {count} ENST IDs to sequences from UniProt format")
             
@@ -216,6 +193,143 @@ class UniProtParser:
         
         return self.sequences
     
+    def convert_to_fasta(self, file_path, output_path, chunksize=CONVERT_CHUNK_ROWS, aliases=False):
+        """
+        Stream a UniProt export straight into a FASTA file
+
+        With ``aliases`` the ENST IDs of an entry are written as one record,
+        ``>ENST1 aliases=ENST2,ENST3``. An ID listed by several entries is
+        written once, with the first entry's sequence (``parse_file`` keeps
+        the last, which would mean holding every ID's sequence until the end).
+
+        Args:
+            file_path: UniProt TSV/CSV export, optionally compressed
+            output_path: Destination FASTA file
+            chunksize: Rows read at a time
+            aliases: Write one record per entry with its other IDs as aliases
+            
+        Returns:
+            Number of ENST IDs written
+        """
+        self.log(f"Converting UniProt format file: {file_path}")
+        
+        delimiter = self._delimiter(file_path)
+        sample = pd.read_csv(file_path, delimiter=delimiter, nrows=DETECTION_ROWS, dtype=str)
+        ensembl_col, sequence_col = self._detect_columns(sample)
+        if not ensembl_col or not sequence_col:
+            raise ValueError(f"No Ensembl ID and sequence columns found in {os.path.basename(file_path)}")
+        self.log(f"Using column '{ensembl_col}' for Ensembl IDs and '{sequence_col}' for sequences")
+        
+        count = 0
+        written = set()
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            chunks = pd.read_csv(file_path, delimiter=delimiter, usecols=[ensembl_col, sequence_col],
+                                 dtype=str, chunksize=chunksize)
+            for chunk in chunks:
+                enst_ids, sequences = self._sequence_pairs(chunk[ensembl_col], chunk[sequence_col])
+                # Only the first occurrence of each ID, in this chunk or any earlier one
+                ids = pd.Series(enst_ids)
+                first = (~ids.duplicated() & ~ids.isin(written)).to_numpy()
+                enst_ids, sequences = enst_ids[first], sequences[first]
+                written.update(enst_ids)
+                if aliases:
+                    # Pairs are in row order, so an entry's IDs are adjacent
+                    groups = groupby(zip(enst_ids, sequences), key=lambda pair: pair[1])
+                    f.write("".join(self._fasta_record([enst_id for enst_id, _ in pairs], sequence)
+                                    for sequence, pairs in groups))
+                else:
+                    f.write("".join(f">{enst_id}\n{sequence}\n" for enst_id, sequence in zip(enst_ids, sequences)))
+                count += len(enst_ids)
+        os.replace(tmp_path, output_path)
+        
+        self.log(f"Wrote {count} ENST sequences to {output_path}")
+        return count
+    
+    @staticmethod
+    def _delimiter(file_path):
+        """Tab for .tsv/.txt files (compressed or not), comma otherwise"""
+        root, file_ext = os.path.splitext(file_path.lower())
+        if file_ext in COMPRESSION_EXTENSIONS:
+            file_ext = os.path.splitext(root)[1]
+        return '\t' if file_ext in ['.tsv', '.txt'] else ','
+    
+    def _detect_columns(self, sample):
+        """
+        Find the Ensembl ID and sequence columns of a UniProt table
+        
+        Columns are matched by name first, then by content: the first column
+        mentioning an ENST ID, and the first other column holding long
+        protein-like strings.
+        
+        Args:
+            sample: DataFrame with the first rows of the file
+            
+        Returns:
+            Tuple of (Ensembl column, sequence column); either may be None
+        """
+        ensembl_col = self._find_ensembl_column(sample)
+        sequence_col = self._find_sequence_column(sample)
+        
+        if not ensembl_col:
+            # Look for a column containing Ensembl IDs in the data
+            for col in sample.columns:
+                values = sample[col].dropna().astype(str).head(10)
+                if any('ENST' in val for val in values):
+                    ensembl_col = col
+                    break
+        
+        if ensembl_col and not sequence_col:
+            # Try to find the sequence column by checking for long string content
+            for col in sample.columns:
+                if col != ensembl_col:  # Skip the Ensembl column
+                    values = sample[col].dropna().astype(str).head(5)
+                    if any(len(val) > 50 and self._is_likely_protein_sequence(val) for val in values):
+                        sequence_col = col
+                        break
+        
+        return ensembl_col, sequence_col
+    
+    def _sequence_pairs(self, ensembl, sequences):
+        """
+        Pair every ENST ID listed in an Ensembl column with the sequence on its row
+
+        Args:
+            ensembl: Series of Ensembl cross-reference text
+            sequences: Series of protein sequences, aligned with ``ensembl``
+            
+        Returns:
+            Tuple of (unversioned ENST IDs, sequences) arrays, in row order
+        """
+        present = ensembl.notna() & sequences.notna()
+        ids = ensembl[present].str.extractall(_ENST_PATTERN)[0].droplevel("match")
+        self.metrics.increment("UNIPROT_NO_ENST_counter", int(sequences.notna().sum()) - ids.index.nunique())
+        pairs = pd.DataFrame({"row": ids.index, "enst_id": ids.to_numpy()}).drop_duplicates()
+        row_sequences = sequences.loc[pairs["row"]].str.strip()
+        return pairs["enst_id"].to_numpy(), row_sequences.to_numpy()
+    
+    def _add_sequences(self, ensembl, sequences):
+        """
+        Map every ENST ID listed in an Ensembl column to the sequence on its row
+        
+        Later rows win, as when the file was read row by row. Each distinct
+        sequence is added to the sequence table once and the IDs store its slot.
+        
+        Returns:
+            Number of ENST IDs mapped
+        """
+        enst_ids, row_sequences = self._sequence_pairs(ensembl, sequences)
+        codes, uniques = pd.factorize(row_sequences)
+        slots = np.empty(len(uniques), dtype=np.int64)
+        for i, sequence in enumerate(uniques):
+            slot = self._slot_of.get(sequence)
+            if slot is None:
+                slot = self._slot_of[sequence] = len(self.sequence_table)
+                self.sequence_table.append(sequence)
+            slots[i] = slot
+        self.sequence_slots.update(zip(enst_ids, slots[codes].tolist()))
+        return len(enst_ids)
+    
     def _find_ensembl_column(self, df):
         """Find the column containing Ensembl IDs"""
         ensembl_keywords = ['ensembl', 'enst', 'transcript']
@@ -239,25 +353,8 @@ class UniProtParser:
         return None
     
     def _extract_all_enst_ids(self, text):
-        """Extract all ENST IDs from text"""
-        # Handle UniProt format with quotes and semicolons
-        # First, find all quoted sections
-        quoted_sections = re.findall(r'"([^"]*)"', text)
-        
-        # For each section, find ENST IDs
-        enst_ids = []
-        
-        # Process quoted sections
-        for section in quoted_sections:
-            matches = re.findall(r'(ENST\d+(?:\.\d+)?)', section)
-            enst_ids.extend(matches)
-        
-        # Also look for ENSTs not in quotes
-        matches = re.findall(r'(ENST\d+(?:\.\d+)?)', text)
-        enst_ids.extend(matches)
-        
-        # Remove duplicates
-        return list(set(enst_ids))
+        """Extract all (versioned) ENST IDs from text, quoted or not, without duplicates"""
+        return list(dict.fromkeys(match.group(0) for match in _ENST_PATTERN.finditer(text)))
     
     def _is_likely_protein_sequence(self, text):
         """Check if a string is likely to be a protein sequence"""
@@ -274,16 +371,60 @@ class UniProtParser:
         amino_acid_count = sum(1 for char in text if char in amino_acids)
         return amino_acid_count / len(text) >= 0.8
     
-    def save_to_fasta(self, output_path):
-        """Save the parsed sequences to a FASTA file"""
+    def _shared_records(self):
+        """(ENST IDs, sequence) for every table sequence still mapped to by an ID"""
+        slot_ids = [[] for _ in self.sequence_table]
+        for enst_id, slot in self.sequence_slots.items():
+            slot_ids[slot].append(enst_id)
+        for enst_ids, sequence in zip(slot_ids, self.sequence_table):
+            if enst_ids:
+                yield enst_ids, sequence
+    
+    @staticmethod
+    def _fasta_record(enst_ids, sequence):
+        """FASTA record for IDs sharing one sequence; the first is the record ID"""
+        if len(enst_ids) == 1:
+            return f">{enst_ids[0]}\n{sequence}\n"
+        return f">{enst_ids[0]} {ALIAS_PREFIX}{','.join(enst_ids[1:])}\n{sequence}\n"
+    
+    def save_to_fasta(self, output_path, aliases=False):
+        """
+        Save the parsed sequences to a FASTA file
+        
+        Args:
+            output_path: Destination FASTA file
+            aliases: Write each unique sequence once, listing the other ENST
+                IDs that share it as ``aliases=`` in its header
+        """
         with open(output_path, 'w') as f:
-            for enst_id, sequence in self.sequences.items():
-                f.write(f">{enst_id}\n{sequence}\n")
+            if aliases:
+                for enst_ids, sequence in self._shared_records():
+                    f.write(self._fasta_record(enst_ids, sequence))
+            else:
+                for enst_id, sequence in self.sequences.items():
+                    f.write(f">{enst_id}\n{sequence}\n")
                 
-        self.log(f"Saved {len(self.sequences)} sequences to {output_path}")
+        self.log(f"Saved {len(self.sequence_slots)} sequences to {output_path}")
+    
+    def save_to_index(self, output_path):
+        """
+        Save the parsed sequences to an indexed ``.mpdb`` sequence database
+        
+        Each unique sequence is stored once and all of its ENST IDs point at it.
+        
+        Returns:
+            Number of ENST IDs written
+        """
+        count = write_index(output_path, self._shared_records())
+        self.log(f"Indexed {count} ENST IDs ({len(set(self.sequence_slots.values()))} unique sequences) "
+                 f"into {output_path}")
+        return count
 
 
 if __name__ == "__main__":
-    parser = UniProtParser()
-    sequences = parser.parse_file("uniprot_data.tsv")
-    parser.save_to_fasta("uniprot_sequences.fasta")
\ No newline at end of file
+    import sys
+    
+    # python utills.py [uniprot_export.tsv[.gz] [output.fasta]]
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "uniprot_data.tsv"
+    output_path = sys.argv[2] if len(sys.argv) > 2 else "uniprot_sequences.fasta"
+    UniProtParser().convert_to_fasta(input_path, output_path)
\ No newline at end of file
@@ -0,0 +1,311 @@
+"""Streaming VCF readers with threaded bgzip decompression"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+import gzip
+import os
+import re
+import struct
+import zlib
+
+import pandas as pd
+
+from readers import DEFAULT_STREAM_CHUNKSIZE
+
+VCF_EXTENSIONS = (".vcf", ".vcf.gz", ".vcf.bgz")
+
+# bgzip blocks inflated per thread pool batch; two batches are kept in flight
+BGZF_BATCH_BLOCKS = 256
+
+# INFO keys holding transcript annotations, in order of preference, with the
+# names of their transcript, protein change and coding change fields
+ANNOTATION_FIELDS = {
+    "CSQ": ("Feature", "HGVSp", "HGVSc"),
+    "ANN": ("Feature_ID", "HGVS.p", "HGVS.c"),
+}
+
+_GZIP_MAGIC = b"\x1f\x8b"
+# ID1, ID2, CM, FLG, MTIME, XFL, OS, XLEN
+_BGZF_HEADER = struct.Struct("<BBBBIBBH")
+_INFO_HEADER_PATTERN = re.compile(r'^##INFO=<ID=(?P<id>[^,>]+).*?Description="(?P<description>[^"]*)"')
+
+
+def is_vcf_path(path: str) -> bool:
+    return path.lower().endswith(VCF_EXTENSIONS)
+
+
+def is_bgzf(path: str) -> bool:
+    """Whether a file starts with a bgzip block (gzip member with a ``BC`` extra field)"""
+    with open(path, 'rb') as f:
+        header = f.read(_BGZF_HEADER.size + 4)
+    if len(header) < _BGZF_HEADER.size + 4:
+        return False
+    id1, id2, _, flags = header[:4]
+    return bytes((id1, id2)) == _GZIP_MAGIC and bool(flags & 4) and header[12:14] == b"BC"
+
+
+def _iter_bgzf_blocks(f) -> Iterator[bytes]:
+    """Raw deflate payloads of the bgzip blocks in a file"""
+    while True:
+        header = f.read(_BGZF_HEADER.size)
+        if not header:
+            return
+        if len(header) < _BGZF_HEADER.size:
+            raise ValueError("Truncated bgzip block header")
+        id1, id2, _, _, _, _, _, extra_length = _BGZF_HEADER.unpack(header)
+        if bytes((id1, id2)) != _GZIP_MAGIC:
+            raise ValueError("Not a bgzip block")
+        extra = f.read(extra_length)
+        block_size = None
+        offset = 0
+        while offset + 4 <= len(extra):
+            subfield_length = struct.unpack_from("<H", extra, offset + 2)[0]
+            if extra[offset:offset + 2] == b"BC":
+                block_size = struct.unpack_from("<H", extra, offset + 4)[0] + 1
+            offset += 4 + subfield_length
+        if block_size is None:
+            raise ValueError("gzip member without a bgzip block size")
+        # Compressed data, then CRC32 and uncompressed size
+        payload = f.read(block_size - _BGZF_HEADER.size - extra_length)
+        yield payload[:-8]
+
+
+def _inflate(payload: bytes) -> bytes:
+    return zlib.decompress(payload, -15)
+
+
+def iter_bgzf_data(path: str, threads: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Decompressed contents of a bgzip file, block by block and in order
+
+    Args:
+        path: bgzip-compressed file
+        threads: Inflating threads (default: CPU count)
+    """
+    threads = threads or os.cpu_count() or 1
+    with open(path, 'rb') as f, ThreadPoolExecutor(max_workers=threads) as pool:
+        blocks = _iter_bgzf_blocks(f)
+        pending = deque()
+        while True:
+            while len(pending) < 2:
+                batch = list(islice(blocks, BGZF_BATCH_BLOCKS))
+                if not batch:
+                    break
+                pending.append(pool.map(_inflate, batch))
+            if not pending:
+                return
+            yield from pending.popleft()
+
+
+def iter_vcf_lines(path: str, threads: Optional[int] = None) -> Iterator[str]:
+    """Lines of a plain, gzip or bgzip VCF, without line terminators"""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == _GZIP_MAGIC
+
+    if compressed and is_bgzf(path):
+        rest = b""
+        for data in iter_bgzf_data(path, threads):
+            data = rest + data
+            cut = data.rfind(b"\n")
+            if cut < 0:
+                rest = data
+                continue
+            rest = data[cut + 1:]
+            text = data[:cut].decode("utf-8")
+            yield from (text.replace("\r", "") if "\r" in text else text).split("\n")
+        if rest:
+            yield rest.decode("utf-8").rstrip("\r")
+        return
+
+    opener = gzip.open if compressed else open
+    with opener(path, 'rt') as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def annotation_layout(header_lines: List[str]) -> Optional[Tuple[str, List[str]]]:
+    """
+    Find the transcript annotation field declared in a VCF header
+
+    Returns:
+        (INFO key, field names) for ``CSQ`` or ``ANN``, or None when the VCF is not annotated
+    """
+    layouts: Dict[str, List[str]] = {}
+    for line in header_lines:
+        match = _INFO_HEADER_PATTERN.match(line)
+        if match is None or match["id"] not in ANNOTATION_FIELDS:
+            continue
+        description = match["description"]
+        if match["id"] == "CSQ":
+            # "Consequence annotations from Ensembl VEP. Format: Allele|Consequence|..."
+            names = description.split("Format:", 1)[-1]
+        else:
+            # "Functional annotations: 'Allele | Annotation | ...' "
+            quoted = re.search(r"'([^']*)'", description)
+            names = quoted.group(1) if quoted else description.split(":", 1)[-1]
+        layouts[match["id"]] = [name.strip() for name in names.split("|")]
+
+    for key in ANNOTATION_FIELDS:
+        if key in layouts:
+            return key, layouts[key]
+    return None
+
+
+def _split_header(lines: Iterator[str]) -> Tuple[List[str], Iterator[str]]:
+    """Read the ``##``/``#CHROM`` header; returns it and the iterator positioned on the records"""
+    header = []
+    for line in lines:
+        if not line.startswith("#"):
+            return header, chain([line], lines)
+        header.append(line)
+    return header, iter(())
+
+
+def read_vcf_annotation(path: str, threads: Optional[int] = None) -> Optional[Tuple[str, List[str]]]:
+    """Annotation layout of a VCF file (see ``annotation_layout``), reading only its header"""
+    lines = iter_vcf_lines(path, threads)
+    try:
+        header, _ = _split_header(lines)
+    finally:
+        lines.close()
+    return annotation_layout(header)
+
+
+def iter_vcf_mutations(path: str, chunksize: int = DEFAULT_STREAM_CHUNKSIZE, coding: bool = False,
+                       pass_only: bool = False, threads: Optional[int] = None,
+                       stats: Optional[Dict[str, int]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream (transcript ID, change) pairs from the CSQ/ANN annotations of a VCF
+
+    Args:
+        path: .vcf, .vcf.gz or .vcf.bgz file annotated by VEP or SnpEff
+        chunksize: Pairs per yielded DataFrame
+        coding: Use the ``c.`` change (for a CDS database) instead of ``p.``
+        pass_only: Skip records whose FILTER is not PASS or ``.``
+        threads: bgzip inflating threads
+        stats: Optional dictionary whose ``vcf_records`` and ``vcf_skipped``
+            (filtered or without a change) counts are updated as records are read
+
+    Yields:
+        DataFrames with transcript_id and mutation columns
+
+    Raises:
+        ValueError: The VCF has no CSQ or ANN annotation
+    """
+    lines = iter_vcf_lines(path, threads)
+    header, records = _split_header(lines)
+    layout = annotation_layout(header)
+    if layout is None:
+        lines.close()
+        raise ValueError(f"{os.path.basename(path)} has no VEP CSQ or SnpEff ANN annotation")
+    key, names = layout
+    transcript_name, protein_name, coding_name = ANNOTATION_FIELDS[key]
+    change_name = coding_name if coding else protein_name
+    if transcript_name not in names or change_name not in names:
+        lines.close()
+        raise ValueError(f"{key} annotation of {os.path.basename(path)} has no "
+                         f"{transcript_name} and {change_name} fields")
+    transcript_field = names.index(transcript_name)
+    change_field = names.index(change_name)
+    min_fields = max(transcript_field, change_field) + 1
+    prefix = f";{key}="
+
+    transcripts: List[str] = []
+    mutations: List[str] = []
+    read = emitted = 0
+    try:
+        for line in records:
+            read += 1
+            fields = line.split("\t", 8)
+            if len(fields) < 8 or (pass_only and fields[6] not in ("PASS", ".")):
+                continue
+            info = ";" + fields[7]
+            start = info.find(prefix)
+            if start < 0:
+                continue
+            start += len(prefix)
+            end = info.find(";", start)
+            value = info[start:] if end < 0 else info[start:end]
+
+            seen = set()
+            for annotation in value.split(","):
+                parts = annotation.split("|")
+                if len(parts) < min_fields or not parts[change_field]:
+                    continue
+                change = parts[change_field]
+                if ":" in change:
+                    change = change.split(":", 1)[1]
+                if "%" in change:
+                    change = unquote(change)
+                pair = (parts[transcript_field], change)
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                transcripts.append(pair[0])
+                mutations.append(change)
+            emitted += bool(seen)
+
+            if len(transcripts) >= chunksize:
+                yield pd.DataFrame({"transcript_id": transcripts, "mutation": mutations})
+                transcripts, mutations = [], []
+    finally:
+        lines.close()
+        _count_records(stats, read, emitted)
+    if transcripts:
+        yield pd.DataFrame({"transcript_id": transcripts, "mutation": mutations})
+
+
+def iter_vcf_variants(path: str, chunksize: int = DEFAULT_STREAM_CHUNKSIZE, pass_only: bool = False,
+                      threads: Optional[int] = None, stats: Optional[Dict[str, int]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream the alleles of a VCF as chromosome, position, reference, alternate DataFrames
+
+    Multi-allelic records give one row per ALT allele; symbolic (``<DEL>``),
+    breakend and ``*`` alleles are skipped. The frames can be passed to
+    ``genome.iter_coding_changes``. ``stats`` is updated as for ``iter_vcf_mutations``.
+    """
+    lines = iter_vcf_lines(path, threads)
+    _, records = _split_header(lines)
+    columns: Dict[str, List] = {"chromosome": [], "position": [], "reference": [], "alternate": []}
+    read = emitted = 0
+    try:
+        for line in records:
+            read += 1
+            fields = line.split("\t", 8)
+            if len(fields) < 5 or (pass_only and len(fields) > 6 and fields[6] not in ("PASS", ".")):
+                continue
+            chromosome, position, _, reference, alternates = fields[:5]
+            alleles = len(columns["chromosome"])
+            for alternate in alternates.split(","):
+                if alternate in (".", "*") or "<" in alternate or "[" in alternate or "]" in alternate:
+                    continue
+                columns["chromosome"].append(chromosome)
+                columns["position"].append(int(position))
+                columns["reference"].append(reference)
+                columns["alternate"].append(alternate)
+            emitted += len(columns["chromosome"]) > alleles
+            if len(columns["chromosome"]) >= chunksize:
+                yield pd.DataFrame(columns)
+                columns = {name: [] for name in columns}
+    finally:
+        lines.close()
+        _count_records(stats, read, emitted)
+    if columns["chromosome"]:
+        yield pd.DataFrame(columns)
+
+
+def _count_records(stats: Optional[Dict[str, int]], read: int, emitted: int) -> None:
+    if stats is not None:
+        stats["vcf_records"] = stats.get("vcf_records", 0) + read
+        stats["vcf_skipped"] = stats.get("vcf_skipped", 0) + read - emitted
+
+
+def read_vcf_preview(path: str, rows: int = 100, coding: bool = False) -> pd.DataFrame:
+    """First ``rows`` transcript/change pairs of an annotated VCF, for display"""
+    chunks = iter_vcf_mutations(path, chunksize=rows, coding=coding, threads=1)
+    try:
+        return next(chunks, pd.DataFrame(columns=["transcript_id", "mutation"])).head(rows)
+    finally:
+        chunks.close()
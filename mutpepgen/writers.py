@@ -0,0 +1,173 @@
+"""Peptide record writers (JSON Lines or Parquet)"""
+from typing import Dict, Iterator, List, Optional
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = None
+    pq = None
+
+RECORDS_FILENAME = "mutation_peptides.jsonl"
+PARQUET_RECORDS_FILENAME = "mutation_peptides.parquet"
+RECORD_FORMATS = ("jsonl", "parquet")
+
+# Peptides buffered per Parquet row group
+DEFAULT_ROW_GROUP_SIZE = 100000
+
+RECORD_FIELDS = ("transcript_id", "mutation", "position", "peptide", "original_aa", "mutant_aa")
+
+
+class JsonLinesWriter:
+    """Write peptide records as one JSON object per line"""
+
+    def __init__(self, path: str, append: bool = False):
+        """
+        Open the output file
+
+        Args:
+            path: Destination .jsonl file
+            append: Continue an existing file instead of overwriting it
+        """
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'a' if append else 'w')
+
+    def write(self, record) -> None:
+        """Append one PeptideRecord"""
+        self._file.write(json.dumps(record.to_dict()))
+        self._file.write("\n")
+        self.count += 1
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def tell(self) -> int:
+        """Current size of the output in bytes"""
+        return self._file.tell()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ParquetRecordWriter:
+    """
+    Write peptide records to Parquet, one row group per ``row_group_size`` records
+    """
+
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE, self_kmers: bool = False):
+        """
+        Open the output file
+
+        Args:
+            path: Destination .parquet file (overwritten)
+            row_group_size: Records per row group
+            self_kmers: Add the ``self_kmers`` column of self-filtered runs
+        """
+        if pa is None:
+            raise ImportError("Parquet output requires the 'pyarrow' package (pip install pyarrow)")
+        self.path = path
+        self.row_group_size = row_group_size
+        self.count = 0
+        self.schema = pa.schema([
+            ("transcript_id", pa.dictionary(pa.int32(), pa.string())),
+            ("mutation", pa.string()),
+            ("position", pa.int32()),
+            ("peptide", pa.string()),
+            ("original_aa", pa.string()),
+            ("mutant_aa", pa.string()),
+        ])
+        self._fields = RECORD_FIELDS
+        if self_kmers:
+            self.schema = self.schema.append(pa.field("self_kmers", pa.int32()))
+            self._fields = RECORD_FIELDS + ("self_kmers",)
+        self._columns: Dict[str, list] = {field: [] for field in self._fields}
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, record) -> None:
+        """Append one PeptideRecord"""
+        columns = self._columns
+        for field in self._fields:
+            columns[field].append(getattr(record, field))
+        self.count += 1
+        if len(columns["peptide"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered records as one row group"""
+        if not self._columns["peptide"]:
+            return
+        table = pa.Table.from_pydict(self._columns, schema=self.schema)
+        self._writer.write_table(table)
+        self._columns = {field: [] for field in self._fields}
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_record_writer(output_dir: str, record_format: str = "jsonl", append: bool = False,
+                       self_kmers: bool = False):
+    """
+    Open the peptide record sidecar for a run
+
+    Args:
+        output_dir: Results directory
+        record_format: ``jsonl`` or ``parquet``
+        append: Continue an existing sidecar (``jsonl`` only)
+        self_kmers: Records carry ``self_kmers`` (JSON Lines writes it whenever it is set)
+
+    Returns:
+        Tuple of (writer, file name relative to output_dir)
+    """
+    if record_format == "jsonl":
+        return JsonLinesWriter(os.path.join(output_dir, RECORDS_FILENAME), append=append), RECORDS_FILENAME
+    elif record_format == "parquet":
+        if append:
+            raise ValueError("Parquet record files cannot be appended to")
+        return (ParquetRecordWriter(os.path.join(output_dir, PARQUET_RECORDS_FILENAME), self_kmers=self_kmers),
+                PARQUET_RECORDS_FILENAME)
+    raise ValueError(f"Unknown record format: {record_format} (expected one of {', '.join(RECORD_FORMATS)})")
+
+
+def iter_records(path: str) -> Iterator[Dict[str, object]]:
+    """Stream peptide records back from a .jsonl or .parquet sidecar"""
+    if path.endswith(".parquet"):
+        if pq is None:
+            raise ImportError("Reading Parquet records requires the 'pyarrow' package (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_records(path: str, limit: Optional[int] = None) -> List[Dict[str, object]]:
+    """Read up to ``limit`` peptide records from a .jsonl or .parquet sidecar"""
+    records = []
+    for record in iter_records(path):
+        if limit is not None and len(records) >= limit:
+            break
+        records.append(record)
+    return records
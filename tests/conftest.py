@@ -0,0 +1,34 @@
+import os
+import random
+import sys
+
+import pytest
+
+# The modules are imported by bare name, as mutpepgen.py and cli.py do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mutpepgen"))
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+KRAS = "MTEYKLVVVGAGGVGKSALTIQLIQNHFVDEYDPTIEDSYRKQVVIDGETCLLDILDTAGQEEYSAMRDQYMRTGEGFLCVFAINNTKSFEDIHHYREQIKRVKDSDDVPMVLVGNKCDLPSRTVDTKQAQDLARSYGIPFIETSAKTRQGVDDAFYTLVREIRKHKEKMSKDGKKKKKKSKTKCVIM"
+
+
+@pytest.fixture
+def sequence_db():
+    random.seed(7)
+    db = {f"ENST{i:011d}": "".join(random.choices(AMINO_ACIDS, k=random.randint(40, 300))) for i in range(50)}
+    db["ENST00000311936"] = KRAS
+    return db
+
+
+@pytest.fixture
+def mutations(sequence_db):
+    """Substitutions, with some unknown transcripts and unparsable changes mixed in"""
+    random.seed(11)
+    ids = sorted(sequence_db)
+    rows = []
+    for _ in range(12000):
+        transcript_id = random.choice(ids) if random.random() < 0.95 else "ENST99999999999"
+        sequence = sequence_db.get(transcript_id, "A" * 40)
+        position = random.randrange(len(sequence))
+        change = f"p.{sequence[position]}{position+1}{random.choice(AMINO_ACIDS)}" if random.random() < 0.97 else "xyz"
+        rows.append((transcript_id, change))
+    return rows
@@ -0,0 +1,56 @@
+import pandas as pd
+
+from blocks import block_ranges, map_blocks, read_block
+from readers import data_offset, iter_mutation_file, iter_variant_file
+
+
+def _lines(path, begin, end):
+    return read_block(path, begin, end).splitlines()
+
+
+def test_block_ranges_cover_the_file(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(b"".join(b"line %d%s\n" % (i, b"x" * (i % 13)) for i in range(500)))
+    for number_of_blocks in (1, 2, 7, 64, 1000):
+        ranges = block_ranges(str(path), number_of_blocks)
+        assert ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+        assert all(end == begin for (_, end), (begin, _) in zip(ranges, ranges[1:]))
+        # Every block starts on a line
+        assert all(begin == 0 or path.read_bytes()[begin - 1:begin] == b"\n" for begin, _ in ranges)
+    assert [line for begin, end in block_ranges(str(path), block_bytes=100) for line in _lines(str(path), begin, end)] \
+        == path.read_bytes().splitlines()
+
+
+def test_block_ranges_marker(tmp_path):
+    path = tmp_path / "records.fasta"
+    path.write_bytes(b"".join(b">r%d\nMKT\nAVL\n" % i for i in range(50)))
+    ranges = block_ranges(str(path), 8, marker=b">")
+    assert len(ranges) > 1
+    assert all(read_block(str(path), begin, end).startswith(b">") for begin, end in ranges)
+
+
+def test_map_blocks_keeps_file_order(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(b"header\n" + b"".join(b"%d\n" % i for i in range(2000)))
+    start = len(b"header\n")
+    blocks = list(map_blocks(_lines, str(path), 3, start=start, block_bytes=512))
+    assert len(blocks) > 3
+    assert [int(line) for block in blocks for line in block] == list(range(2000))
+
+
+def test_parallel_mutation_file_matches_sequential(tmp_path):
+    path = tmp_path / "sample.maf"
+    rows = "".join(f"ENST{i:011d}\tp.G{i + 1}V\t{i % 22 + 1}\t{i * 10 + 1}\tG\tT\n" for i in range(3000))
+    path.write_text("#version 2.4\n#comment\nTranscript\tMutation\tChromosome\tPosition\tRef\tAlt\n" + rows)
+    path = str(path)
+    assert read_block(path, data_offset(path), data_offset(path) + 4) == b"ENST"
+
+    sequential = pd.concat(iter_mutation_file(path, "Transcript", "Mutation", chunksize=1000))
+    parallel = list(iter_mutation_file(path, "Transcript", "Mutation", chunksize=1000, processes=2))
+    assert all(len(chunk) <= 1000 for chunk in parallel)
+    pd.testing.assert_frame_equal(pd.concat(parallel).reset_index(drop=True), sequential.reset_index(drop=True))
+
+    columns = ["Chromosome", "Position", "Ref", "Alt"]
+    pd.testing.assert_frame_equal(
+        pd.concat(iter_variant_file(path, columns, processes=2)).reset_index(drop=True),
+        pd.concat(iter_variant_file(path, columns)).reset_index(drop=True))
@@ -0,0 +1,33 @@
+import pytest
+
+from cds import CdsPeptide, apply_cdna_change, cds_peptides, translate_batch
+from hgvs_parser import parse_cdna_change
+
+# M A W K P G F stop
+CDS = "ATGGCTTGGAAACCCGGGTTTTAA"
+
+
+def test_translate_batch():
+    assert translate_batch(["ATGGCTTGG", "atggct", "ATGTAAGCT", "ATGNNNGC", ""]) == ["MAW", "MA", "M", "MX", ""]
+
+
+def test_apply_cdna_change():
+    assert apply_cdna_change(CDS, parse_cdna_change("4G>T")) == ("ATGTCTTGGAAACCCGGGTTTTAA", 3)
+    assert apply_cdna_change(CDS, parse_cdna_change("5del")) == ("ATGGTTGGAAACCCGGGTTTTAA", 4)
+    assert apply_cdna_change(CDS, parse_cdna_change("3_4insC"))[0] == "ATGCGCTTGGAAACCCGGGTTTTAA"
+    with pytest.raises(ValueError):
+        apply_cdna_change(CDS, parse_cdna_change("4A>T"))
+    with pytest.raises(ValueError):
+        apply_cdna_change(CDS, parse_cdna_change("30A>T"))
+
+
+def test_cds_peptides():
+    changes = ["4G>T", "5del", "7_9del", "8G>A", "6T>C"]
+    results = cds_peptides({"ENST1": CDS}, [("ENST1", parse_cdna_change(c)) for c in changes], 3)
+    assert results[0] == CdsPeptide("MSWKP", 1, "A", "S", False, 1)
+    # Frameshift: the whole novel tail up to the new stop
+    assert results[1] == CdsPeptide("MVGNPGF", 1, "A", "VGNPGF", True, 1)
+    assert results[2] == CdsPeptide("MAKPG", 2, "W", "", False, 2)
+    # Stop gained and synonymous changes have no mutant peptide
+    assert results[3] == "Stop gained: no mutant residues"
+    assert results[4] == "cDNA change does not alter the protein"
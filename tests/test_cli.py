@@ -0,0 +1,58 @@
+import os
+
+from conftest import KRAS
+from cli import main, output_dir_for
+from dedup import UNIQUE_FASTA_FILENAME
+from engine import FASTA_FILENAME
+from metrics import load_metrics
+
+MUTATIONS = (
+    "Gene,ENST_ID,Mutation\n"
+    "KRAS,ENST00000311936,p.G12V\n"
+    "KRAS,ENST00000311936,p.G13D\n"
+    "KRAS,ENST99999999999,p.G12V\n"
+    "KRAS,ENST00000311936,xyz\n"
+)
+
+
+def _inputs(tmp_path):
+    database = tmp_path / "db.fasta"
+    database.write_text(f">ENST00000311936.8 gene_symbol:KRAS\n{KRAS}\n")
+    first, second = tmp_path / "first.csv", tmp_path / "second.tsv"
+    first.write_text(MUTATIONS)
+    second.write_text(MUTATIONS.replace(",", "\t"))
+    return str(database), str(first), str(second)
+
+
+def test_batch_run(tmp_path):
+    database, first, second = _inputs(tmp_path)
+    output = str(tmp_path / "results")
+    assert main([first, second, "-d", database, "-o", output, "-w", "11", "-j", "2", "--dedup"]) == 0
+
+    for path in (first, second):
+        with open(os.path.join(output_dir_for(path, output), FASTA_FILENAME)) as f:
+            assert f.read().count(">") == 2
+    with open(os.path.join(output, UNIQUE_FASTA_FILENAME)) as f:
+        assert f.read().count(">") == 2
+
+    counters = load_metrics(output)["counters"]
+    assert counters["MAIN_counter"] == 8
+    assert counters["TRANSCRIPT_NOT_FOUND_counter"] == 2
+    assert counters["FILE_SUCCESS_counter"] == 2
+    assert counters["DEDUP_ROW_counter"] == 4 and counters["DEDUP_UNIQUE_counter"] == 2
+
+
+def test_invalid_arguments(tmp_path):
+    database, first, _ = _inputs(tmp_path)
+    assert main([str(tmp_path / "missing.csv"), "-d", database, "-o", str(tmp_path)]) == 2
+    assert main([first, "-d", str(tmp_path / "missing.fasta"), "-o", str(tmp_path)]) == 2
+
+
+def test_unreadable_database(tmp_path, caplog):
+    database, first, _ = _inputs(tmp_path)
+    with open(database, "a", encoding="utf-8") as f:
+        f.write(">ENST00000000001.1\nMKT\u00c4Y\n")
+    assert main([first, "-d", database, "-o", str(tmp_path / "results")]) == 2
+    assert "Cannot read" in caplog.text and "ENST00000000001.1" in caplog.text
+    # No partial cache left behind
+    assert sorted(os.listdir(tmp_path)) == ["db.fasta", "first.csv", "second.tsv"]
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from dedup import PeptideDeduplicator
+
+
+def _rows():
+    random.seed(5)
+    peptides = ["".join(random.choices("ACDEFGHIKLMNPQRSTVWY", k=9)) for _ in range(40)]
+    return [(random.choice(peptides), f"S{random.randrange(4)}", f"ENST{random.randrange(10)}", f"p.V{i}E")
+            for i in range(500)]
+
+
+def _read(output_dir):
+    with open(output_dir / "unique_peptides_provenance.tsv") as f:
+        next(f)
+        return {peptide: (int(occurrences), int(samples), provenance)
+                for _, peptide, occurrences, samples, provenance in (line.rstrip("\n").split("\t") for line in f)}
+
+
+@pytest.mark.parametrize("max_peptides", [5, 39])
+def test_spill_matches_in_memory(tmp_path, max_peptides):
+    rows = _rows()
+    with PeptideDeduplicator(work_dir=str(tmp_path)) as in_memory:
+        for row in rows:
+            in_memory.add(*row)
+        counts = in_memory.write(tmp_path / "memory")
+        assert not in_memory.spilled
+    with PeptideDeduplicator(max_peptides=max_peptides, partitions=3, work_dir=str(tmp_path)) as spilling:
+        for row in rows:
+            spilling.add(*row)
+        assert spilling.write(tmp_path / "spill") == counts
+        assert spilling.spilled
+
+    assert counts == {"rows": 500, "unique_peptides": len({row[0] for row in rows})}
+    expected = _read(tmp_path / "memory")
+    assert _read(tmp_path / "spill") == expected
+    peptide = rows[0][0]
+    provenance = [f"{sample}|{transcript}|{mutation}" for p, sample, transcript, mutation in rows if p == peptide]
+    assert expected[peptide] == (len(provenance), len({row.split("|")[0] for row in provenance}), ";".join(provenance))
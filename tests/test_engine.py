@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+
+import pytest
+
+from conftest import KRAS
+from engine import (FASTA_FILENAME, SUMMARY_FILENAME, PeptideConfig, PeptideGenerator, RunCancelled,
+                    apply_protein_change)
+from hgvs_parser import parse_protein_change
+from metrics import load_metrics
+from writers import RECORDS_FILENAME
+
+KRAS_ID = "ENST00000311936"
+
+
+def _generator(sequence_db, **config):
+    return PeptideGenerator(sequence_db, PeptideConfig(**config), log_callback=lambda message, tag=None: None)
+
+
+@pytest.mark.parametrize("mutation, peptide, original, mutant", [
+    ("p.G12V", "VVVGAVGVGKS", "G", "V"),
+    ("p.Gly12Val", "VVVGAVGVGKS", "G", "V"),
+    ("p.G12del", "VVVGAGVGKS", "G", ""),
+    ("p.G12_G13insAV", "VVGAGAVGVGKS", "", "AV"),
+    ("p.G12_G13delinsAV", "VVVGAAVVGKSA", "GG", "AV"),
+    # Nothing after a frameshift's first new residue, or after an inserted stop, is known
+    ("p.G12Vfs*5", "VVVGAV", "G", "V"),
+    ("p.G12_G13delinsA*", "VVVGAA", "GG", "A"),
+])
+def test_peptide_for(sequence_db, mutation, peptide, original, mutant):
+    record = _generator(sequence_db, window_size=11).peptide_for(KRAS_ID, mutation)
+    assert (record.peptide, record.original_aa, record.mutant_aa, record.mutant_offset) == \
+        (peptide, original, mutant, 5)
+
+
+@pytest.mark.parametrize("mutation", ["p.G12*", "p.G12X", "p.Gly12Ter", "p.G12fs*5", "p.G12Xfs",
+                                      "p.G12_G13ins*", "p.G12=", "p.Gly12Foo"])
+def test_no_mutant_peptide(sequence_db, mutation):
+    generator = _generator(sequence_db, window_size=11)
+    with pytest.raises(ValueError):
+        generator.peptide_for(KRAS_ID, mutation)
+    assert list(generator.generate([(KRAS_ID, mutation)])) == []
+    assert generator.stats["invalid_mutations"] == 1
+
+
+def test_apply_protein_change_cuts_at_stop():
+    change = parse_protein_change("G12_G13delinsAV*G")
+    assert apply_protein_change({KRAS_ID: KRAS}, KRAS_ID, change, len(KRAS), 5) == ("VVVGAAV", "GG", "AV", 5)
+
+
+def test_reference_fallback(sequence_db):
+    generator = _generator(sequence_db, window_size=11)
+    # Residue 12 is G; the A named in the change is found one residue earlier
+    record = generator.peptide_for(KRAS_ID, "p.A12V")
+    assert (record.position, record.peptide) == (11, "LVVVGVGGVGK")
+    with pytest.raises(ValueError):
+        generator.peptide_for(KRAS_ID, "p.W12V")
+
+
+def _outputs(output_dir):
+    with open(os.path.join(output_dir, FASTA_FILENAME)) as f:
+        fasta = f.read()
+    with open(os.path.join(output_dir, RECORDS_FILENAME)) as f:
+        records = f.read()
+    with open(os.path.join(output_dir, SUMMARY_FILENAME)) as f:
+        summary = json.load(f)
+    return fasta, records, summary
+
+
+def test_resume_matches_uninterrupted_run(sequence_db, mutations, tmp_path):
+    full_dir, resumed_dir = str(tmp_path / "full"), str(tmp_path / "resumed")
+    _generator(sequence_db, tile_lengths=(8, 9)).run(mutations, full_dir)
+
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(RunCancelled) as cancelled:
+        _generator(sequence_db, tile_lengths=(8, 9)).run(mutations, resumed_dir, cancel_event=cancel)
+    assert 0 < cancelled.value.rows < len(mutations)
+    _generator(sequence_db, tile_lengths=(8, 9)).run(mutations, resumed_dir, resume=True)
+
+    full_fasta, full_records, full_summary = _outputs(full_dir)
+    fasta, records, summary = _outputs(resumed_dir)
+    assert fasta == full_fasta
+    assert records == full_records
+    for key in ("stats", "peptide_lengths", "tiles"):
+        assert summary[key] == full_summary[key]
+    assert load_metrics(resumed_dir)["counters"] == load_metrics(full_dir)["counters"]
+    assert not os.path.exists(os.path.join(resumed_dir, "run_checkpoint.json"))
+
+
+def test_cancel_after_last_batch_finishes(sequence_db, tmp_path):
+    cancel = threading.Event()
+    cancel.set()
+    results = _generator(sequence_db).run([(KRAS_ID, "p.G12V")] * 10, str(tmp_path), cancel_event=cancel)
+    assert results["stats"]["successful_peptides"] == 10
+    assert os.path.exists(os.path.join(str(tmp_path), SUMMARY_FILENAME))
+
+
+def test_parallel_matches_sequential(sequence_db, mutations):
+    sequential = _generator(sequence_db)
+    expected = [record.to_dict() for record in sequential.generate(mutations)]
+    parallel = _generator(sequence_db)
+    records = [record.to_dict() for record in parallel.generate_parallel(mutations, workers=2, chunk_size=2000)]
+    assert records == expected
+    assert parallel.stats == sequential.stats
+    assert parallel.metrics.snapshot()["counters"] == sequential.metrics.snapshot()["counters"]
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from genome import iter_coding_changes, load_gtf, normalize_alleles
+
+GTF = """#header
+1\tens\tCDS\t101\t130\t.\t+\t0\tgene_id "G"; transcript_id "ENST01.3";
+1\tens\tCDS\t201\t260\t.\t+\t0\tgene_id "G"; transcript_id "ENST01.3";
+1\tens\tstop_codon\t261\t263\t.\t+\t0\tgene_id "G"; transcript_id "ENST01.3";
+1\tens\tCDS\t1500\t1530\t.\t-\t0\tgene_id "G"; transcript_id "ENST02.1";
+1\tens\tCDS\t1401\t1430\t.\t-\t0\tgene_id "G"; transcript_id "ENST02.1";
+1\tens\tstop_codon\t1398\t1400\t.\t-\t0\tgene_id "G"; transcript_id "ENST02.1";
+"""
+
+
+def _index(tmp_path):
+    path = tmp_path / "model.gtf"
+    path.write_text(GTF)
+    return load_gtf(str(path))
+
+
+def test_normalize_alleles():
+    assert normalize_alleles(100, "AT", "A") == (101, "T", "")
+    assert normalize_alleles(100, "-", "G") == (100, "", "G")
+
+
+def test_plus_strand(tmp_path):
+    rows, transcripts, changes = _index(tmp_path).map_variants(
+        ["1", "chr1", "1", "1"], [105, 201, 105, 150], ["A", "G", "A", "A"], ["C", "T", "AT", "C"])
+    # The intronic variant (row 3) has no entry; the first base of exon 2 is c.31
+    assert list(rows) == [0, 1, 2]
+    assert transcripts == ["ENST01", "ENST01", "ENST01"]
+    assert changes == ["c.5A>C", "c.31G>T", "c.5_6insT"]
+
+
+def test_minus_strand(tmp_path):
+    rows, transcripts, changes = _index(tmp_path).map_variants(
+        ["1", "1", "1", "1"], [1530, 1430, 1500, 1529], ["A", "C", "AT", "A"], ["G", "T", "A", "AG"])
+    # CDS positions count from the segment end; bases are complemented
+    assert list(rows) == [0, 1, 2, 3]
+    assert transcripts == ["ENST02"] * 4
+    assert changes == ["c.1T>C", "c.32G>A", "c.30delA", "c.1_2insC"]
+
+
+def test_iter_coding_changes_stats(tmp_path):
+    frame = pd.DataFrame({"chromosome": ["1", "1", "2"], "position": [105, 150, 105],
+                          "reference": ["A", "A", "A"], "alternate": ["C", "C", "C"]})
+    stats = {}
+    chunks = list(iter_coding_changes([frame], _index(tmp_path), stats))
+    assert chunks[0].values.tolist() == [["ENST01", "c.5A>C"]]
+    assert stats == {"variants": 3, "coding_variants": 1, "not_in_cds": 2}
@@ -0,0 +1,65 @@
+import pytest
+
+from hgvs_parser import (DELETION, DELINS, DUPLICATION, FRAMESHIFT, INSERTION, NONSENSE, SUBSTITUTION,
+                         SYNONYMOUS, parse_cdna_change, parse_protein_change)
+
+
+@pytest.mark.parametrize("notation, kind, start, end, reference, inserted", [
+    ("V600E", SUBSTITUTION, 599, 599, "V", "E"),
+    ("Val600Glu", SUBSTITUTION, 599, 599, "V", "E"),
+    ("(V600E)", SUBSTITUTION, 599, 599, "V", "E"),
+    ("R1450*", NONSENSE, 1449, 1449, "R", "*"),
+    ("Arg1450Ter", NONSENSE, 1449, 1449, "R", "*"),
+    ("R1450X", NONSENSE, 1449, 1449, "R", "*"),
+    ("V600=", SYNONYMOUS, 599, 599, "V", "V"),
+    ("G12_G13del", DELETION, 11, 12, "GG", ""),
+    ("Gly12_Gly13insAla", INSERTION, 11, 12, "GG", "A"),
+    ("G12dup", DUPLICATION, 11, 11, "G", ""),
+    ("G12_G13delinsAV", DELINS, 11, 12, "GG", "AV"),
+    ("G12_G13delinsA*", DELINS, 11, 12, "GG", "A*"),
+])
+def test_parse_protein_change(notation, kind, start, end, reference, inserted):
+    change = parse_protein_change(notation)
+    assert (change.kind, change.start, change.end, change.reference, change.inserted) == \
+        (kind, start, end, reference, inserted)
+
+
+@pytest.mark.parametrize("notation, inserted, stop_offset", [
+    ("K120fs*5", "", 5),
+    ("K120Rfs*5", "R", 5),
+    ("Lys120ArgfsTer5", "R", 5),
+    ("K120Xfs", "*", None),
+    ("K120fs*?", "", None),
+])
+def test_parse_frameshift(notation, inserted, stop_offset):
+    change = parse_protein_change(notation)
+    assert change.kind == FRAMESHIFT
+    assert (change.inserted, change.stop_offset) == (inserted, stop_offset)
+
+
+@pytest.mark.parametrize("notation", ["", "V", "600E", "V600", "G12_G13E", "G12_G14insA", "V0E",
+                                      "V600Foo", "Foo600E", "Gly12_Abc13del", "G12_G13insAlaXyz"])
+def test_parse_protein_change_rejects(notation):
+    with pytest.raises(ValueError):
+        parse_protein_change(notation)
+
+
+@pytest.mark.parametrize("notation, kind, start, end, reference, inserted", [
+    ("358A>G", SUBSTITUTION, 357, 357, "A", "G"),
+    ("358del", DELETION, 357, 357, "", ""),
+    ("358delA", DELETION, 357, 357, "A", ""),
+    ("358_360del", DELETION, 357, 359, "", ""),
+    ("358dup", DUPLICATION, 357, 357, "", ""),
+    ("358_359insT", INSERTION, 357, 358, "", "T"),
+    ("358_360delinsTT", DELINS, 357, 359, "", "TT"),
+])
+def test_parse_cdna_change(notation, kind, start, end, reference, inserted):
+    change = parse_cdna_change(notation)
+    assert (change.kind, change.start, change.end, change.reference, change.inserted) == \
+        (kind, start, end, reference, inserted)
+
+
+@pytest.mark.parametrize("notation", ["358+1G>A", "-14A>G", "*5del", "358_360A>G", "358_360insT"])
+def test_parse_cdna_change_rejects(notation):
+    with pytest.raises(ValueError):
+        parse_cdna_change(notation)
@@ -0,0 +1,34 @@
+from isoforms import build_gene_index
+from seqdb import build_index, open_cached
+
+FASTA = (
+    ">ENST00000000001.1 pep chromosome:GRCh38:7 gene:ENSG00000157764.14 gene_symbol:BRAF caf\xe9\nMKTAY\n"
+    ">ENST00000000002.2 gene:ENSG00000157764.14 gene_symbol:BRAF\nMKTAW\n"
+    ">ENST00000000003.1 KRAS-201\nMTEYK\n"
+    ">ENST00000000004.1 no gene\nMAAAA\n"
+    ">ENST00000000005.1 gene:ENSG00000133703\nMTEYR\n"
+)
+
+
+def _genes(index):
+    return {transcript_id: index.gene(transcript_id) for transcript_id in (f"ENST{i:011d}" for i in range(1, 6))}
+
+
+def test_gene_index_from_fasta_and_cache(tmp_path):
+    fasta = tmp_path / "db.fasta"
+    fasta.write_bytes(FASTA.encode("latin-1"))
+    from_fasta = build_gene_index(str(fasta))
+    assert _genes(from_fasta) == {"ENST00000000001": "BRAF", "ENST00000000002": "BRAF", "ENST00000000003": "KRAS",
+                                  "ENST00000000004": None, "ENST00000000005": "ENSG00000133703"}
+    assert from_fasta.isoforms("ENST00000000001") == ("ENST00000000002",)
+
+    db = open_cached(str(fasta))
+    from_cache = build_gene_index(db.path)
+    assert db.genes() == [("ENST00000000001", "BRAF"), ("ENST00000000002", "BRAF"), ("ENST00000000003", "KRAS"),
+                          ("ENST00000000005", "ENSG00000133703")]
+    db.close()
+    assert from_cache.genes == from_fasta.genes
+
+    parallel = str(tmp_path / "parallel.mpdb")
+    build_index(str(fasta), parallel, processes=2)
+    assert build_gene_index(parallel).genes == from_fasta.genes
@@ -0,0 +1,34 @@
+from logsink import QueueLogSink
+
+
+def test_repeats_are_coalesced():
+    sink = QueueLogSink(max_repeats=2)
+    for i in range(5):
+        sink(f"Warning: Transcript ENST{i:011d} not found in database", "warning")
+    sink("Loaded 3 sequences", "info")
+    messages, _ = sink.drain()
+    assert messages == [
+        ("Warning: Transcript ENST00000000000 not found in database", "warning"),
+        ("Warning: Transcript ENST00000000001 not found in database", "warning"),
+        ("Loaded 3 sequences", "info"),
+        ("... 3 more transcripts not found in database (total 5)", "warning"),
+    ]
+
+    sink("Warning: Transcript ENST00000000009 not found in database", "warning")
+    assert sink.drain()[0] == [("... 1 more transcripts not found in database (total 6)", "warning")]
+    sink.reset()
+    sink("Warning: Transcript ENST00000000009 not found in database", "warning")
+    assert sink.drain()[0] == [("Warning: Transcript ENST00000000009 not found in database", "warning")]
+
+
+def test_callbacks_wait_for_backlog():
+    sink = QueueLogSink()
+    for i in range(4):
+        sink(f"message {i}")
+    sink.call_soon(print, "done")
+    messages, callbacks = sink.drain(max_messages=3)
+    assert [message for message, _ in messages] == ["message 0", "message 1", "message 2"]
+    assert callbacks == []
+    messages, callbacks = sink.drain(max_messages=3)
+    assert messages == [("message 3", None)]
+    assert callbacks == [(print, ("done",))]
@@ -0,0 +1,45 @@
+import io
+import json
+
+from metrics import MetricsRegistry
+from progress import STAGES, JsonEventWriter, ProgressTracker, format_progress
+
+
+def test_progress_events():
+    events = []
+    tracker = ProgressTracker(total=100, callback=events.append, min_interval=0)
+    tracker.skip(20)
+    tracker.advance(30)
+    assert events[-1]["event"] == "progress"
+    assert (events[-1]["rows"], events[-1]["total"], events[-1]["fraction"]) == (50, 100, 0.5)
+    final = tracker.finish()
+    assert events[-1] is final and final["event"] == "done"
+    assert set(final["stage_seconds"]) == set(STAGES)
+    assert format_progress(final).startswith("50/100 rows")
+
+
+def test_unknown_total():
+    event = ProgressTracker().snapshot()
+    assert (event["total"], event["fraction"], event["eta_seconds"]) == (None, None, None)
+    assert format_progress(event).startswith("0 rows |")
+
+
+def test_stage_times():
+    metrics = MetricsRegistry()
+    tracker = ProgressTracker(metrics=metrics)
+    with tracker.stage("lookup"):
+        pass
+    tracker.add_stage_time("window", 1.5)
+    tracker.merge_stage_times({"window": 0.5, "write": 2.0})
+    assert tracker.stage_seconds["window"] == 2.0 and tracker.stage_seconds["write"] == 2.0
+    # Merged worker timings arrive with the worker's own metrics, so only the local ones are timed here
+    assert metrics.snapshot()["timers"]["window"] == {"count": 1, "seconds": 1.5}
+    assert metrics.snapshot()["timers"]["lookup"]["count"] == 1
+
+
+def test_json_event_writer():
+    stream = io.StringIO()
+    tracker = ProgressTracker(total=10, callback=JsonEventWriter(stream, file="sample.maf"))
+    tracker.finish()
+    event = json.loads(stream.getvalue())
+    assert (event["file"], event["event"], event["total"]) == ("sample.maf", "done", 10)
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from readers import iter_mutation_file, iter_variant_file
+
+ROWS = [(f"ENST{i:011d}", f"p.G{i + 1}V", str(i % 22 + 1), i * 10 + 1) for i in range(250)]
+
+
+@pytest.fixture
+def maf(tmp_path):
+    path = tmp_path / "sample.maf"
+    lines = ["#version 2.4", "Mutation\tChromosome\tTranscript\tPosition\tRef\tAlt"]
+    lines += [f"{change}\t{chromosome}\t{transcript}\t{position}\tG\tT"
+              for transcript, change, chromosome, position in ROWS]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_iter_mutation_file_chunks(maf):
+    chunks = list(iter_mutation_file(maf, "Transcript", "Mutation", chunksize=100))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    frame = pd.concat(chunks)
+    assert list(frame.columns) == ["Transcript", "Mutation"]
+    assert list(frame.itertuples(index=False, name=None)) == [(transcript, change) for transcript, change, _, _ in ROWS]
+
+
+def test_iter_variant_file(maf):
+    frame = pd.concat(iter_variant_file(maf, ["Chromosome", "Position", "Ref", "Alt"], chunksize=64))
+    assert list(frame.columns) == ["Chromosome", "Position", "Ref", "Alt"]
+    assert frame["Position"].tolist() == [position for _, _, _, position in ROWS]
+    assert frame["Chromosome"].tolist()[:2] == ["1", "2"]
@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+from conftest import AMINO_ACIDS, KRAS
+from engine import PeptideConfig, PeptideGenerator
+from selfindex import SelfKmerIndex, build_self_index, open_self_index, self_kmer_counts
+
+KRAS_ID = "ENST00000311936"
+
+
+def test_find_matches_brute_force(sequence_db, tmp_path):
+    path = str(tmp_path / "db.selfkmers")
+    counts = build_self_index(sequence_db.values(), path, (8, 9))
+    expected = {k: {sequence[i:i + k] for sequence in sequence_db.values() for i in range(len(sequence) - k + 1)}
+                for k in (8, 9)}
+    assert counts == {k: len(kmers) for k, kmers in expected.items()}
+
+    random.seed(3)
+    queries = [sequence[i:i + k] for sequence in list(sequence_db.values())[:10] for k in (8, 9, 10)
+               for i in range(0, len(sequence) - k, 17)]
+    queries += ["".join(random.choices(AMINO_ACIDS, k=random.choice((8, 9)))) for _ in range(500)]
+    index = SelfKmerIndex(path)
+    assert index.find(queries).tolist() == [query in expected.get(len(query), ()) for query in queries]
+    index.close()
+
+
+def test_self_kmer_counts(tmp_path):
+    path = str(tmp_path / "kras.selfkmers")
+    build_self_index([KRAS], path, (8,))
+    index = SelfKmerIndex(path)
+    peptides = [KRAS[6:17], KRAS[6:11] + "V" + KRAS[12:17]]
+    self_counts, kmer_counts = self_kmer_counts(index, peptides, np.array([5, 5]), np.array([6, 6]))
+    # Every 8-mer covering residue 5 of an 11-mer: 4 of them, all self for the wild type only
+    assert kmer_counts.tolist() == [4, 4]
+    assert self_counts.tolist() == [4, 0]
+    index.close()
+
+
+def test_open_self_index_rebuilds_when_lengths_change(sequence_db, tmp_path):
+    database = tmp_path / "db.fasta"
+    database.write_text("".join(f">{enst_id}\n{sequence}\n" for enst_id, sequence in sequence_db.items()))
+    index = open_self_index(str(database), sequence_db, (8,))
+    assert index.lengths == (8,)
+    index.close()
+    index = open_self_index(str(database), sequence_db, (8, 9))
+    assert index.lengths == (8, 9)
+    index.close()
+
+
+def test_generator_drops_self_peptides(sequence_db, tmp_path):
+    path = str(tmp_path / "db.selfkmers")
+    build_self_index(sequence_db.values(), path, (8, 9))
+    index = SelfKmerIndex(path)
+    mutations = [(KRAS_ID, "p.G12V"), (KRAS_ID, "p.M188del")]
+    generator = PeptideGenerator(sequence_db, PeptideConfig(window_size=11, self_filter="flag"), self_index=index,
+                                 log_callback=lambda message, tag=None: None)
+    records = list(generator.generate(mutations))
+    assert [record.self_kmers for record in records] == [0, 0]
+    # A C-terminal deletion leaves only reference residues
+    assert generator.stats["self_peptides"] == 1
+
+    generator = PeptideGenerator(sequence_db, PeptideConfig(window_size=11, self_filter="drop"), self_index=index,
+                                 log_callback=lambda message, tag=None: None)
+    assert [record.mutation for record in generator.generate(mutations)] == ["G12V"]
+    index.close()
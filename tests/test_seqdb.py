@@ -0,0 +1,62 @@
+import os
+
+from seqdb import build_index, iter_fasta_records, open_cached
+
+FASTA = ">ENST00000000001.1 gene:G1\nMKTAYIAKQR\nQISFVK\n>ENST00000000002.3 aliases=ENST00000000003.1\nMSTNPKPQRK\n"
+
+
+def _write(path, text, mtime_ns=None):
+    path.write_bytes(text.encode("latin-1"))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _contents(db):
+    return {enst_id: db[enst_id] for enst_id in db}
+
+
+def test_index_matches_fasta(tmp_path):
+    fasta = tmp_path / "db.fasta"
+    _write(fasta, FASTA)
+    assert build_index(str(fasta), str(tmp_path / "db.mpdb")) == 3
+    db = open_cached(str(fasta), str(tmp_path / "db.mpdb"))
+    assert _contents(db) == {"ENST00000000001": "MKTAYIAKQRQISFVK", "ENST00000000002": "MSTNPKPQRK",
+                             "ENST00000000003": "MSTNPKPQRK"}
+    assert db.length("ENST00000000001") == 16
+    assert db.window("ENST00000000001", 14, 30).tobytes() == b"VK"
+    db.close()
+
+
+def test_cache_invalidation(tmp_path):
+    fasta = tmp_path / "db.fasta"
+    cache = str(tmp_path / "db.fasta.mpdb")
+    _write(fasta, FASTA, mtime_ns=1_000_000_000)
+    open_cached(str(fasta)).close()
+    built = os.stat(cache).st_mtime_ns
+
+    # Touched but unchanged: the digest still matches, so the cache is reused
+    os.utime(fasta, ns=(2_000_000_000, 2_000_000_000))
+    db = open_cached(str(fasta))
+    assert os.stat(cache).st_mtime_ns == built
+    db.close()
+
+    # Same size, different residues
+    _write(fasta, FASTA.replace("MKTAY", "MKTAW"), mtime_ns=3_000_000_000)
+    db = open_cached(str(fasta))
+    assert db["ENST00000000001"] == "MKTAWIAKQRQISFVK"
+    db.close()
+
+    # Different size
+    _write(fasta, FASTA + ">ENST00000000004\nMA\n")
+    db = open_cached(str(fasta))
+    assert db["ENST00000000004"] == "MA" and len(db) == 4
+    db.close()
+
+
+def test_parallel_fasta_blocks_match_sequential(tmp_path):
+    fasta = tmp_path / "db.fasta"
+    # Non-ASCII header bytes, including 0x85 (a line break for str.splitlines)
+    _write(fasta, "".join(f">ENST{i:011d}.1 caf\xe9 \x85 note\r\nMKT\r\nAV{i % 7}\r\n" for i in range(300)))
+    sequential = list(iter_fasta_records(str(fasta)))
+    assert sequential[0] == (["ENST00000000000.1"], "MKTAV0")
+    assert list(iter_fasta_records(str(fasta), processes=2)) == sequential
@@ -0,0 +1,53 @@
+import pytest
+
+from engine import PeptideRecord
+from tiling import kmer_bounds, parse_tile_lengths, tile_record, tiles_to_fasta
+
+
+def _brute_force(peptide_length, span_start, span_end, lengths):
+    bounds = []
+    for k in lengths:
+        for start in range(peptide_length - k + 1):
+            if span_end > span_start:
+                hit = start < span_end and start + k > span_start
+            else:
+                # A deletion's k-mers must hold residues on both sides of the junction
+                hit = start < span_start < start + k
+            if hit:
+                bounds.append((start, k))
+    return bounds
+
+
+def test_kmer_bounds_brute_force():
+    spans = [(25, 12, 13), (25, 0, 1), (25, 24, 25), (25, 12, 12), (25, 10, 15), (6, 2, 3), (25, 0, 25)]
+    peptides, starts, lengths = kmer_bounds(*zip(*spans), lengths=(8, 9, 11))
+    for i, span in enumerate(spans):
+        selected = peptides == i
+        assert list(zip(starts[selected].tolist(), lengths[selected].tolist())) == _brute_force(*span, (8, 9, 11))
+
+
+def test_tile_record():
+    record = PeptideRecord("ENST00000311936", "G12V", 12, "VVVGAVGVGKS", "G", "V", mutant_offset=5)
+    tiles = list(tile_record(record, (10,), wildtype=True))
+    assert [(tile.start, tile.peptide, tile.wildtype) for tile in tiles] == [
+        (0, b"VVVGAVGVGK", b"VVVGAGGVGK"), (1, b"VVGAVGVGKS", b"VVGAGGVGKS")]
+    assert tiles_to_fasta(record, tiles[:1], self_tiles=[True]) == (
+        ">ENST00000311936|G12V|pos:12|len:10|start:1|self|mutant\nVVVGAVGVGK\n"
+        ">ENST00000311936|G12V|pos:12|len:10|start:1|wildtype\nVVVGAGGVGK\n")
+
+    # No wild-type pairing when the change alters the length
+    deletion = PeptideRecord("ENST00000311936", "G12del", 12, "VVVGAGVGKS", "G", "", mutant_offset=5)
+    tiles = list(tile_record(deletion, (8,), wildtype=True))
+    assert [tile.peptide for tile in tiles] == [b"VVVGAGVG", b"VVGAGVGK", b"VGAGVGKS"]
+    assert all(tile.wildtype is None for tile in tiles)
+
+
+@pytest.mark.parametrize("text, lengths", [("8-11", (8, 9, 10, 11)), ("15,8, 9", (8, 9, 15)), ("9,8-9", (8, 9))])
+def test_parse_tile_lengths(text, lengths):
+    assert parse_tile_lengths(text) == lengths
+
+
+@pytest.mark.parametrize("text", ["", "0-3", "x", ","])
+def test_parse_tile_lengths_rejects(text):
+    with pytest.raises(ValueError):
+        parse_tile_lengths(text)
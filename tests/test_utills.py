@@ -0,0 +1,87 @@
+import re
+
+import pandas as pd
+import pytest
+
+from engine import load_sequence_database
+from seqdb import IndexedSequenceDB
+from utills import UniProtParser
+
+EXPORT = (
+    "Entry\tEnsembl\tSequence\n"
+    'P1\t"ENST00000000001.2; ENSP00000000001.1; ENSG00000000001.3.";"ENST00000000002.1; ENSP2.";\tMKTAYIAKQRQISFVKSHFSRQ\n'
+    "P2\t\tMKTAYIAKQRQISFVKSHFSRA\n"
+    "P3\tENST00000000003\t\n"
+    "P4\tENST00000000004.5; ENST00000000004.6;\tMSTNPKPQRKTKRNTNRRPQDV\n"
+    # Listed again by a later entry: parse_file keeps the later sequence, convert_to_fasta the first
+    "P5\tENST00000000002.4;\tMAAAAAAAAAAAAAAAAAAAAA\n"
+)
+
+
+def _reference_parse(path):
+    """The row-by-row parser UniProtParser.parse_file replaced"""
+    df = pd.read_csv(path, delimiter="\t", low_memory=False)
+    sequences = {}
+    for _, row in df.iterrows():
+        if pd.isna(row["Ensembl"]) or pd.isna(row["Sequence"]):
+            continue
+        for enst_id in set(re.findall(r"(ENST\d+(?:\.\d+)?)", str(row["Ensembl"]))):
+            sequences[enst_id.split(".")[0]] = str(row["Sequence"]).strip()
+    return sequences
+
+
+@pytest.fixture
+def export(tmp_path):
+    path = tmp_path / "uniprot.tsv"
+    path.write_text(EXPORT)
+    return str(path)
+
+
+def _parser():
+    return UniProtParser(log_callback=lambda message: None)
+
+
+def test_parse_file_matches_reference(export):
+    expected = _reference_parse(export)
+    assert expected == {"ENST00000000001": "MKTAYIAKQRQISFVKSHFSRQ", "ENST00000000002": "MAAAAAAAAAAAAAAAAAAAAA",
+                        "ENST00000000004": "MSTNPKPQRKTKRNTNRRPQDV"}
+    parser = _parser()
+    assert dict(parser.parse_file(export)) == expected
+    assert parser.metrics.counters["UNIPROT_NO_ENST_counter"] == 1
+
+
+@pytest.mark.parametrize("aliases", [False, True])
+def test_save_to_fasta_round_trip(export, tmp_path, aliases):
+    parser = _parser()
+    parser.parse_file(export)
+    fasta = str(tmp_path / "out.fasta")
+    parser.save_to_fasta(fasta, aliases=aliases)
+    assert load_sequence_database(fasta, use_cache=False) == _reference_parse(export)
+
+
+def test_aliases_share_one_record(tmp_path):
+    path = tmp_path / "shared.tsv"
+    path.write_text("Entry\tEnsembl\tSequence\nP1\tENST01.1; ENST02.1; ENST03.2\tMKTAYIAKQR\n")
+    parser = _parser()
+    parser.parse_file(str(path))
+    fasta = tmp_path / "out.fasta"
+    parser.save_to_fasta(str(fasta), aliases=True)
+    assert fasta.read_text() == ">ENST01 aliases=ENST02,ENST03\nMKTAYIAKQR\n"
+
+    index = str(tmp_path / "out.mpdb")
+    assert parser.save_to_index(index) == 3
+    db = IndexedSequenceDB(index)
+    assert {enst_id: db[enst_id] for enst_id in db} == dict.fromkeys(["ENST01", "ENST02", "ENST03"], "MKTAYIAKQR")
+    assert db.window("ENST03", 2, 5).tobytes() == b"TAY"
+    db.close()
+
+
+@pytest.mark.parametrize("aliases", [False, True])
+def test_convert_to_fasta(export, tmp_path, aliases):
+    fasta = tmp_path / "out.fasta"
+    assert _parser().convert_to_fasta(export, str(fasta), chunksize=2, aliases=aliases) == 3
+    # Each ID is written once, with the sequence of the first entry listing it
+    ids = re.findall(r"ENST\d+", fasta.read_text())
+    assert len(ids) == len(set(ids))
+    assert load_sequence_database(str(fasta), use_cache=False) == \
+        dict(_reference_parse(export), ENST00000000002="MKTAYIAKQRQISFVKSHFSRQ")
@@ -0,0 +1,96 @@
+import gzip
+import struct
+import zlib
+
+import pandas as pd
+import pytest
+
+from vcf import is_bgzf, iter_vcf_lines, iter_vcf_mutations, iter_vcf_variants, read_vcf_annotation
+
+CSQ_HEADER = ('##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence annotations from Ensembl VEP. '
+              'Format: Allele|Consequence|Feature|HGVSc|HGVSp">')
+ANN_HEADER = ('##INFO=<ID=ANN,Number=.,Type=String,Description="Functional annotations: '
+              "'Allele | Annotation | Feature_ID | HGVS.c | HGVS.p' \">")
+COLUMNS = "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"
+RECORDS = [
+    "12\t25398284\t.\tC\tA\t.\tPASS\tDP=9;CSQ=A|missense|ENST00000311936|ENST00000311936.8:c.35G>T|"
+    "ENSP00000308495.3:p.Gly12Val,A|missense|ENST00000256078|ENST00000256078.9:c.35G>T|"
+    "ENSP00000256078.5:p.Gly12Val",
+    # Filtered, and only the protein change URL-escaped
+    "7\t140453136\t.\tA\tT,G\t.\tlowQ\tCSQ=T|missense|ENST00000288602|c.1799T>A|p.Val600Glu%3D",
+    # No change in the annotation
+    "1\t100\t.\tG\t<DEL>\t.\t.\tCSQ=<DEL>|intron|ENST00000000001||",
+]
+
+
+def _vcf(header=CSQ_HEADER, records=RECORDS):
+    return "\n".join(["##fileformat=VCFv4.2", header, COLUMNS] + records) + "\n"
+
+
+def _bgzip(data: bytes, block_size: int = 64) -> bytes:
+    blocks = []
+    for start in range(0, len(data), block_size):
+        chunk = data[start:start + block_size]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        payload = compressor.compress(chunk) + compressor.flush()
+        header = struct.pack("<BBBBIBBHBBHH", 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, 66, 67, 2, 18 + len(payload) + 8 - 1)
+        blocks.append(header + payload + struct.pack("<II", zlib.crc32(chunk), len(chunk)))
+    return b"".join(blocks)
+
+
+@pytest.fixture(params=["plain", "gzip", "bgzip"])
+def vcf_path(request, tmp_path):
+    data = _vcf().encode()
+    if request.param == "plain":
+        path = tmp_path / "sample.vcf"
+        path.write_bytes(data)
+    elif request.param == "gzip":
+        path = tmp_path / "sample.vcf.gz"
+        path.write_bytes(gzip.compress(data))
+    else:
+        path = tmp_path / "sample.vcf.bgz"
+        path.write_bytes(_bgzip(data))
+        assert is_bgzf(str(path))
+    return str(path)
+
+
+def test_iter_vcf_lines(vcf_path):
+    assert list(iter_vcf_lines(vcf_path, threads=2)) == _vcf().splitlines()
+
+
+def test_iter_vcf_mutations(vcf_path):
+    assert read_vcf_annotation(vcf_path)[0] == "CSQ"
+    stats = {}
+    frame = pd.concat(iter_vcf_mutations(vcf_path, chunksize=1, stats=stats))
+    assert list(frame.itertuples(index=False, name=None)) == [
+        ("ENST00000311936", "p.Gly12Val"), ("ENST00000256078", "p.Gly12Val"), ("ENST00000288602", "p.Val600Glu=")]
+    assert stats == {"vcf_records": 3, "vcf_skipped": 1}
+
+    stats = {}
+    frame = pd.concat(iter_vcf_mutations(vcf_path, coding=True, pass_only=True, stats=stats))
+    assert frame["mutation"].tolist() == ["c.35G>T", "c.35G>T"]
+    assert stats == {"vcf_records": 3, "vcf_skipped": 2}
+
+
+def test_snpeff_annotation(tmp_path):
+    path = tmp_path / "snpeff.vcf"
+    path.write_text(_vcf(ANN_HEADER, [RECORDS[0].replace("CSQ=", "ANN=")]))
+    frame = pd.concat(iter_vcf_mutations(str(path)))
+    assert frame["transcript_id"].tolist() == ["ENST00000311936", "ENST00000256078"]
+
+
+def test_unannotated_vcf(tmp_path):
+    path = tmp_path / "plain.vcf"
+    path.write_text(_vcf("##source=test"))
+    assert read_vcf_annotation(str(path)) is None
+    with pytest.raises(ValueError):
+        next(iter_vcf_mutations(str(path)))
+
+
+def test_iter_vcf_variants(vcf_path):
+    stats = {}
+    frame = pd.concat(iter_vcf_variants(vcf_path, stats=stats))
+    assert list(frame.itertuples(index=False, name=None)) == [
+        ("12", 25398284, "C", "A"), ("7", 140453136, "A", "T"), ("7", 140453136, "A", "G")]
+    assert stats == {"vcf_records": 3, "vcf_skipped": 1}
+    assert len(pd.concat(iter_vcf_variants(vcf_path, pass_only=True))) == 1
@@ -0,0 +1,57 @@
+import pytest
+
+from engine import PeptideRecord
+from writers import (PARQUET_RECORDS_FILENAME, RECORDS_FILENAME, JsonLinesWriter, iter_records, open_record_writer,
+                     read_records)
+
+RECORDS = [PeptideRecord(f"ENST{i % 3:011d}", f"G{i}V", i, "VVVGAVGVGKS", "G", "V") for i in range(1, 26)]
+
+
+def _dicts(records):
+    return [record.to_dict() for record in records]
+
+
+def test_json_lines_round_trip(tmp_path):
+    writer, name = open_record_writer(str(tmp_path))
+    assert name == RECORDS_FILENAME
+    with writer:
+        for record in RECORDS[:10]:
+            writer.write(record)
+    with JsonLinesWriter(str(tmp_path / name), append=True) as writer:
+        for record in RECORDS[10:]:
+            writer.write(record)
+    path = str(tmp_path / name)
+    assert list(iter_records(path)) == _dicts(RECORDS)
+    assert read_records(path, limit=3) == _dicts(RECORDS[:3])
+
+
+def test_unknown_record_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_record_writer(str(tmp_path), "csv")
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    from writers import ParquetRecordWriter
+
+    writer, name = open_record_writer(str(tmp_path), "parquet")
+    assert name == PARQUET_RECORDS_FILENAME
+    writer.close()
+    path = str(tmp_path / name)
+    with ParquetRecordWriter(path, row_group_size=10) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    assert list(iter_records(path)) == _dicts(RECORDS)
+    assert read_records(path, limit=12) == _dicts(RECORDS[:12])
+
+
+def test_parquet_self_kmers(tmp_path):
+    pytest.importorskip("pyarrow")
+    from writers import ParquetRecordWriter
+
+    path = str(tmp_path / PARQUET_RECORDS_FILENAME)
+    with ParquetRecordWriter(path, self_kmers=True) as writer:
+        writer.write(PeptideRecord("ENST00000000001", "G12V", 12, "VVVGAVGVGKS", "G", "V", 5, self_kmers=2))
+    assert read_records(path)[0]["self_kmers"] == 2
+    with pytest.raises(ValueError):
+        open_record_writer(str(tmp_path), "parquet", append=True)